@@ -10,6 +10,8 @@ For each component, you can choose between different linker variants or omit
 the component from the pipeline.
 The result is written to a given output file in jsonl format with one article
 per line.
+With --workers, the articles of all given benchmarks are linked concurrently by
+worker processes that share a single loaded linking system.
 """
 
 import argparse
@@ -18,6 +20,7 @@ import os
 import json
 import time
 from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple, Iterator
 from tqdm import tqdm
 
 from elevant import settings
@@ -27,9 +30,157 @@ from elevant.evaluation.benchmark import get_available_benchmarks, Benchmark
 from elevant.evaluation.benchmark_iterator import get_benchmark_iterator
 from elevant.linkers.oracle_linker import link_entities_with_oracle
 from elevant.utils.utils import convert_to_filename
+from elevant.models.article import Article, article_from_json
 
 from wiki_entity_linker.linkers.linkers import Linkers, HyperlinkLinkers, CoreferenceLinkers, PredictionFormats
-from wiki_entity_linker.linkers.linking_system import LinkingSystem
+from wiki_entity_linker.linkers.linking_system import LinkingSystem, DEFAULT_PIPE_BATCH_SIZE
+from wiki_entity_linker.models.entity_database import DEFAULT_LAZY_CACHE_SIZE
+from wiki_entity_linker.linkers.linking_worker_pool import LinkingWorkerPool
+from wiki_entity_linker.utils.batching import batches, AdaptiveChunker, DEFAULT_MAX_CHUNK_CHARS, MIN_CHUNK_CHARS
+from wiki_entity_linker.utils.stage_timer import StageTimer
+
+
+def decode_article(line: bytes, _: int) -> Article:
+    return article_from_json(line.decode("utf8"))
+
+
+def encode_article(article: Article) -> bytes:
+    return f"{article.to_json()}\n".encode("utf8")
+
+
+def get_output_filenames(args, benchmark: str) -> Tuple[str, str]:
+    """
+    Return the filenames of the linked articles and of the metadata for the given benchmark
+    and create the output directory if necessary.
+    """
+    prediction_name_dir = convert_to_filename(args.prediction_name)
+    linker_dir = args.linker_name if args.linker_name else prediction_name_dir
+    output_dir = args.evaluation_dir.rstrip("/") + "/" + linker_dir
+    experiment_filename = convert_to_filename(args.experiment_name)
+    output_filename = output_dir + "/" + experiment_filename + "." + benchmark + ".linked_articles.jsonl"
+    metadata_filename = output_filename[:-len(".linked_articles.jsonl")] + ".metadata.json"
+    if output_dir and not os.path.exists(output_dir):
+        logger.info(f"Creating directory {output_dir}")
+        os.makedirs(output_dir)
+    return output_filename, metadata_filename
+
+
+def write_metadata(args,
+                   linking_system: Optional[LinkingSystem],
+                   metadata_filename: str,
+                   linking_time: float,
+                   stage_timings: Optional[Dict[str, Any]]):
+    with open(metadata_filename, "w", encoding="utf8") as metadata_file:
+        linker_config = linking_system.get_linker_config() if linking_system else {}
+        exp_name = args.experiment_name
+        exp_description = None
+        if args.description:
+            exp_description = args.description
+        elif "experiment_description" in linker_config:
+            exp_description = linker_config["experiment_description"]
+        linker_name = None
+        if "linker_name" in linker_config:
+            linker_name = linker_config["linker_name"]
+        elif args.linker_name:
+            linker_name = args.linker_name
+        elif args.prediction_name:
+            linker_name = args.prediction_name
+        metadata = {"experiment_name": exp_name,
+                    "experiment_description": exp_description,
+                    "linker_name": linker_name,
+                    "timestamp": datetime.now().strftime("%Y/%m/%d %H:%M"),
+                    "linking_time": linking_time if args.linker_name else None}
+        if stage_timings:
+            metadata["stage_timings"] = stage_timings
+        metadata_file.write(json.dumps(metadata))
+
+
+def link_benchmarks_in_parallel(args, linking_system: LinkingSystem, benchmarks: List[str]):
+    """
+    Link the articles of all given benchmarks with args.workers worker processes that share the loaded
+    linking system. The articles of all benchmarks are fed into a single worker pool, so that workers don't
+    idle at the end of small benchmarks. The linked articles are received in input order and written to the
+    output file of their benchmark.
+
+    A chunk of articles that is linked by a worker never contains articles of different benchmarks. The linking
+    time of a benchmark is the sum of the times the workers spent linking its chunks, i.e. the time linking the
+    benchmark would take in a single process, not the wall-clock time. Likewise, the stage timings of a
+    benchmark are merged from the stage timings of its chunks.
+    """
+    # Number of articles of each benchmark. The reader thread appends the number of a benchmark
+    # before it yields the first article of the next benchmark.
+    benchmark_sizes = []
+    # Index of the benchmark of each article
+    article_benchmarks = []
+
+    def article_lines() -> Iterator[Tuple[bytes, Tuple[int, int]]]:
+        index = 0
+        for benchmark_index, benchmark in enumerate(benchmarks):
+            n_articles = 0
+            for article in get_benchmark_iterator(benchmark).iterate():
+                article_benchmarks.append(benchmark_index)
+                yield encode_article(article), (index, index + 1)
+                n_articles += 1
+                index += 1
+            benchmark_sizes.append(n_articles)
+
+    def get_benchmark_index(line_info: Tuple[int, int]) -> int:
+        return article_benchmarks[line_info[0]]
+
+    benchmark_index = -1
+    output_file = None
+    output_filename = metadata_filename = None
+    n_written = 0
+    linking_time = 0
+    stage_timer = None
+    start_time = time.time()
+
+    def finish_benchmark():
+        output_file.close()
+        write_metadata(args, linking_system, metadata_filename, linking_time, stage_timer.to_dict())
+        logger.info(f"Wrote {n_written} linked articles of {Colors.BLUE}{benchmarks[benchmark_index]}{Colors.END} "
+                    f"to {Colors.BOLD}{output_filename}{Colors.END}")
+
+    def next_benchmark():
+        nonlocal benchmark_index, output_file, output_filename, metadata_filename, n_written, linking_time, \
+            stage_timer
+        benchmark_index += 1
+        output_filename, metadata_filename = get_output_filenames(args, benchmarks[benchmark_index])
+        output_file = open(output_filename, "w", encoding="utf8")
+        n_written = 0
+        linking_time = 0
+        stage_timer = StageTimer()
+
+    next_benchmark()
+    chunker = AdaptiveChunker(DEFAULT_MAX_CHUNK_CHARS, MIN_CHUNK_CHARS, args.batch_size)
+    logger.info(f"Linking entities in {len(benchmarks)} benchmarks using {args.workers} processes ...")
+    with LinkingWorkerPool(linking_system, args.workers, chunker, decode_article, encode_article,
+                           args.uppercase, args.only_pronouns, evaluation_span=args.evaluation_span) as pool:
+        progress = tqdm(desc="Linking progress", unit=" articles")
+        for output_lines, _, _, chunk_statistics in pool.run(article_lines(), group=get_benchmark_index):
+            # Skip to the benchmark of the chunk. Benchmark sizes are known for all completed benchmarks.
+            while benchmark_index < len(benchmark_sizes) and n_written == benchmark_sizes[benchmark_index]:
+                finish_benchmark()
+                next_benchmark()
+            for line in output_lines:
+                output_file.write(line.decode("utf8"))
+            n_written += len(output_lines)
+            linking_time += chunk_statistics.busy_time
+            stage_timer.merge(chunk_statistics.stage_timer)
+            progress.update(len(output_lines))
+        progress.close()
+    while True:
+        finish_benchmark()
+        if benchmark_index == len(benchmarks) - 1:
+            break
+        next_benchmark()
+
+    logger.info(f"Linked all benchmarks in {time.time() - start_time:.1f}s.")
+    pool.log_worker_statistics()
+    linking_system.stage_timer.log_summary()
+    if linking_system.doc_cache:
+        # The doc cache is used in the worker processes, whose counts were added to it at the exit of the pool
+        linking_system.doc_cache.log_statistics()
 
 
 def main(args):
@@ -41,7 +192,9 @@ def main(args):
         exit(1)
 
     linking_system = None
-    if not args.linker_name == "oracle":
+    if args.load_snapshot and not args.linker_name == "oracle":
+        linking_system = LinkingSystem.load_snapshot(args.load_snapshot)
+    elif not args.linker_name == "oracle":
         linking_system = LinkingSystem(args.linker_name,
                                        args.linker_config,
                                        args.prediction_file,
@@ -52,67 +205,71 @@ def main(args):
                                        args.minimum_score,
                                        args.type_mapping,
                                        args.custom_kb,
-                                       args.api_url)
+                                       args.api_url,
+                                       lazy_mappings=args.lazy_mappings,
+                                       mapping_cache_size=args.mapping_cache_size * 1024 ** 2)
+        if args.save_snapshot:
+            linking_system.save_snapshot(args.save_snapshot)
+    if linking_system:
+        if args.profile_every:
+            linking_system.enable_profiling(args.profile_every, args.profile_dir)
+        if args.doc_cache:
+            linking_system.enable_doc_cache(args.doc_cache)
 
     benchmarks = get_available_benchmarks() if "ALL" in args.benchmark else args.benchmark
 
-    for benchmark in benchmarks:
-        benchmark_iterator = get_benchmark_iterator(benchmark)
-
-        prediction_name_dir = convert_to_filename(args.prediction_name)
-        linker_dir = args.linker_name if args.linker_name else prediction_name_dir
-        output_dir = args.evaluation_dir.rstrip("/") + "/" + linker_dir
-        experiment_filename = convert_to_filename(args.experiment_name)
-        output_filename = output_dir + "/" + experiment_filename + "." + benchmark + ".linked_articles.jsonl"
-        metadata_filename = output_filename[:-len(".linked_articles.jsonl")] + ".metadata.json"
-        if output_dir and not os.path.exists(output_dir):
-            logger.info(f"Creating directory {output_dir}")
-            os.makedirs(output_dir)
+    if args.workers > 1 and not linking_system:
+        logger.warning("The oracle linker does not support --workers. Linking with a single process.")
+    elif args.workers > 1 and (linking_system.prediction_reader or linking_system.coref_prediction_iterator):
+        # Predictions are read in the order of the articles, which can't be shared between worker processes
+        logger.warning("Linking with a prediction reader does not support --workers. Linking with a single process.")
+    elif args.workers > 1:
+        link_benchmarks_in_parallel(args, linking_system, benchmarks)
+        return
 
+    for benchmark in benchmarks:
+        output_filename, metadata_filename = get_output_filenames(args, benchmark)
         output_file = open(output_filename, 'w', encoding='utf8')
 
         logger.info(f"Linking entities in {Colors.BLUE}{benchmark}{Colors.END} benchmark ...")
 
+        if linking_system:
+            linking_system.stage_timer.reset()
         n_articles = 0
         start_time = time.time()
-        for i, article in enumerate(tqdm(benchmark_iterator.iterate(), desc="Linking progress", unit=" articles")):
-            evaluation_span = article.evaluation_span if args.evaluation_span else None
+        article_iterator = tqdm(get_benchmark_iterator(benchmark).iterate(), desc="Linking progress",
+                                unit=" articles")
+        for articles in batches(article_iterator, args.batch_size):
             if args.linker_name == "oracle":
-                link_entities_with_oracle(article)
+                for article in articles:
+                    link_entities_with_oracle(article)
             else:
-                linking_system.link_entities(article, args.uppercase, args.only_pronouns, evaluation_span)
-            output_file.write(article.to_json() + '\n')
-            n_articles = i+1
+                evaluation_spans = [article.evaluation_span for article in articles] if args.evaluation_span else None
+                linking_system.link_entities_batch(articles,
+                                                   args.uppercase,
+                                                   args.only_pronouns,
+                                                   evaluation_spans,
+                                                   batch_size=args.batch_size,
+                                                   n_process=args.parse_processes)
+            for article in articles:
+                serialization_start_time = time.perf_counter()
+                output_file.write(article.to_json() + '\n')
+                if linking_system:
+                    linking_system.stage_timer.add("serialization", time.perf_counter() - serialization_start_time)
+            n_articles += len(articles)
         linking_time = time.time() - start_time
 
         output_file.close()
 
-        # Write metadata to metadata file
-        with open(metadata_filename, "w", encoding="utf8") as metadata_file:
-            linker_config = linking_system.get_linker_config() if linking_system else {}
-            exp_name = args.experiment_name
-            exp_description = None
-            if args.description:
-                exp_description = args.description
-            elif "experiment_description" in linker_config:
-                exp_description = linker_config["experiment_description"]
-            linker_name = None
-            if "linker_name" in linker_config:
-                linker_name = linker_config["linker_name"]
-            elif args.linker_name:
-                linker_name = args.linker_name
-            elif args.prediction_name:
-                linker_name = args.prediction_name
-            metadata = {"experiment_name": exp_name,
-                        "experiment_description": exp_description,
-                        "linker_name": linker_name,
-                        "timestamp": datetime.now().strftime("%Y/%m/%d %H:%M"),
-                        "linking_time": linking_time if args.linker_name else None}
-            metadata_file.write(json.dumps(metadata))
+        stage_timings = linking_system.stage_timer.to_dict() if linking_system else None
+        write_metadata(args, linking_system, metadata_filename, linking_time, stage_timings)
 
         logger.info(f"Wrote metadata to {Colors.BOLD}{metadata_filename}{Colors.END}")
         logger.info(f"Wrote {n_articles} linked articles to {Colors.BOLD}{output_filename}{Colors.END}")
 
+    if linking_system and linking_system.doc_cache:
+        linking_system.doc_cache.log_statistics()
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -156,6 +313,35 @@ if __name__ == "__main__":
                         help="Set to remove all predictions on snippets which do not contain an uppercase character.")
     parser.add_argument("--type_mapping", type=str, default=settings.QID_TO_WHITELIST_TYPES_DB,
                         help="For pure prior linker: Map predicted entities to types using the given mapping.")
+    parser.add_argument("-bs", "--batch_size", type=int, default=DEFAULT_PIPE_BATCH_SIZE,
+                        help="Number of articles that are processed by the spaCy model as a single batch.")
+    parser.add_argument("--parse_processes", type=int, default=1,
+                        help="Number of processes the spaCy model uses for processing a batch of articles. "
+                             "Only used without --workers.")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of worker processes that link the articles of all benchmarks concurrently, "
+                             "sharing the loaded linking system. Default is 1, i.e. the benchmarks are linked one "
+                             "after the other in a single process.")
+
+    parser.add_argument("--save_snapshot", "--save-snapshot", type=str,
+                        help="Write the initialized linking system to this snapshot directory, such that later runs "
+                             "can load it with --load_snapshot within seconds.")
+    parser.add_argument("--load_snapshot", "--load-snapshot", type=str,
+                        help="Load the linking system from this snapshot directory instead of initializing it. The "
+                             "linker, hyperlink linker and coreference linker of the snapshot are used.")
+    parser.add_argument("--lazy_mappings", action="store_true",
+                        help="Don't load the mappings needed for hyperlink and alias lookups into memory, but query "
+                             "their on-disk databases on demand. Needs the databases created by "
+                             "scripts/create_lazy_databases.py.")
+    parser.add_argument("--mapping_cache_size", type=int, default=DEFAULT_LAZY_CACHE_SIZE // 1024 ** 2,
+                        help="Memory budget in MB for the values cached from lazily loaded mappings.")
+    parser.add_argument("--doc_cache", type=str,
+                        help="Directory of a cache for processed spaCy docs. Benchmark articles that were processed "
+                             "before with the same spaCy pipeline are not processed again.")
+    parser.add_argument("--profile_every", type=int,
+                        help="Profile the linking of every n-th article with cProfile.")
+    parser.add_argument("--profile_dir", type=str, default="profiles",
+                        help="Directory to which the profiles are written if --profile_every is set.")
 
     parser.add_argument("--description", "-desc", type=str,
                         help="A description for the experiment. This will be displayed in the webapp.")
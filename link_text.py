@@ -11,10 +11,14 @@ The linker pipeline consists of three main components:
 
 For each component, you can choose between different linker variants or omit
 the component from the pipeline.
-The result is written to a given output file in jsonl format with one article
-per line.
+The result is written to a given output file (or to several output shards) in
+jsonl format with one article per line. The progress is recorded in a file
+<output_file>.progress.json such that an interrupted job can be resumed with
+--resume.
 
 About 55GB of RAM are required when using the full linker pipeline.
+With multiprocessing, the linking system is loaded only once and shared by all
+worker processes.
 """
 
 import argparse
@@ -22,7 +26,6 @@ import json
 import os
 import sys
 import time
-import multiprocessing
 
 from elevant import settings
 from elevant.utils import log
@@ -30,44 +33,47 @@ from elevant.models.article import Article, article_from_json
 from elevant.helpers.wikipedia_dump_reader import WikipediaDumpReader
 
 from wiki_entity_linker.linkers.linkers import Linkers, HyperlinkLinkers, CoreferenceLinkers
+from wiki_entity_linker.linkers.linking_system import LinkingSystem, DEFAULT_PIPE_BATCH_SIZE
+from wiki_entity_linker.models.entity_database import DEFAULT_LAZY_CACHE_SIZE
+from wiki_entity_linker.linkers.linking_worker_pool import LinkingWorkerPool
+from wiki_entity_linker.utils.batching import batches, AdaptiveChunker, DEFAULT_MAX_CHUNK_CHARS, MIN_CHUNK_CHARS
+from wiki_entity_linker.utils.resumable_output_writer import ResumableOutputWriter
 
 # Don't show dependencygraph UserWarning: "The graph doesn't contain a node that depends on the root element."
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning)
 
-# Importing the linking_system has to happen here, otherwise a linking_system is not defined error is thrown.
-# In order to not load several GB of mappings twice, only do a fake loading such that the name is imported,
-# but no mappings are loaded
-config = {"no_loading": True}
-with open(settings.TMP_FORKSERVER_CONFIG_FILE, "w", encoding="utf8") as config_file:
-    json.dump(config, config_file)
-from wiki_entity_linker.linkers.forkserver_linking_system import linking_system
 
+def decode_line(line: bytes, index: int) -> Article:
+    """
+    Create an article from a raw input line. index is the line number of the input line.
+    """
+    line = line.decode("utf8")
+    if args.raw_input:
+        return Article(id=index, title="", text=line[:-1])
+    elif args.article_format:
+        return article_from_json(line)
+    else:
+        return WikipediaDumpReader.json2article(line)
 
-CHUNK_SIZE = 10  # Number of articles submitted to one process as a single task
-MAX_TASKS_PER_CHILD = 5
 
+def encode_article(article: Article) -> bytes:
+    return f"{article.to_json(evaluation_format=False)}\n".encode("utf8")
 
-def link_entities_tuple_argument(args_tuple):
+
+def line_iterator(filename, start_offset, start_index):
     """
-    Helper function for ProcessPoolExecutor.map that takes a single argument.
+    Yield the raw input lines as tuples (line, (line_index, byte_offset_after_line)).
+    Reading starts at the given byte offset, start_index is the index of the first line that is read.
     """
-    linking_system.link_entities(args_tuple[0], args_tuple[1], args_tuple[2])
-    return args_tuple[0]
-
-
-def article_iterator(filename):
-    with open(filename, 'r', encoding='utf8') as file:
-        for i, line in enumerate(file):
+    with open(filename, 'rb') as file:
+        file.seek(start_offset)
+        offset = start_offset
+        for i, line in enumerate(file, start=start_index):
             if i == args.n_articles:
                 break
-            if args.raw_input:
-                article = Article(id=i, title="", text=line[:-1])
-            elif args.article_format:
-                article = article_from_json(line)
-            else:
-                article = WikipediaDumpReader.json2article(line)
-            yield article, args.uppercase, args.only_pronouns
+            offset += len(line)
+            yield line, (i, offset)
 
 
 def main():
@@ -82,52 +88,80 @@ def main():
         logger.info("Creating directory %s" % out_dir)
         os.makedirs(out_dir)
 
-    output_file = open(args.output_file, 'w', encoding='utf8')
+    writer = ResumableOutputWriter(args.output_file, args.input_file, args.shard_size, args.resume)
+
+    # The linking system is loaded only once. With multiprocessing, the worker processes share it with the
+    # parent process.
+    if args.load_snapshot:
+        ls = LinkingSystem.load_snapshot(args.load_snapshot)
+    else:
+        ls = LinkingSystem(args.linker_name,
+                           args.linker_config,
+                           hyperlink_linker=args.hyperlink_linker,
+                           coref_linker=args.coreference_linker,
+                           min_score=args.minimum_score,
+                           type_mapping_file=args.type_mapping,
+                           lazy_mappings=args.lazy_mappings,
+                           mapping_cache_size=args.mapping_cache_size * 1024 ** 2)
+        if args.save_snapshot:
+            ls.save_snapshot(args.save_snapshot)
+    if args.profile_every:
+        ls.enable_profiling(args.profile_every, args.profile_dir)
 
     i = 0
-    iterator = article_iterator(args.input_file)
+    start_index = writer.n_articles
+    iterator = line_iterator(args.input_file, writer.input_offset, start_index)
     if args.multiprocessing > 1:
-        logger.info("Loading linking system...")
-        multiprocessing.set_start_method('forkserver')
-        multiprocessing.set_forkserver_preload(["wiki_entity_linker.linkers.forkserver_linking_system"])
         start = time.time()
         last_time = start
-        with multiprocessing.Pool(processes=args.multiprocessing, maxtasksperchild=MAX_TASKS_PER_CHILD) as executor:
+        chunker = AdaptiveChunker(args.max_chunk_chars, MIN_CHUNK_CHARS, args.batch_size)
+        with LinkingWorkerPool(ls, args.multiprocessing, chunker, decode_line, encode_article,
+                               args.uppercase, args.only_pronouns, args.queue_size) as pool:
             logger.info("Start linking using %d processes." % args.multiprocessing)
-            for article in executor.imap(link_entities_tuple_argument, iterator, chunksize=CHUNK_SIZE):
-                output_file.write(f"{article.to_json(evaluation_format=False)}\n")
-                i += 1
-                if i % 100 == 0:
-                    total_time = time.time() - start
-                    avg_time = total_time / i
-                    avg_last_time = (time.time() - last_time) / 100
-                    print(f"\r{i} articles, {avg_time:.5f} s per article, "
-                          f"{avg_last_time:.2f} s per article for the last 100 articles, "
-                          f"{int(total_time)} s total time.", end='')
-                    last_time = time.time()
+            for output_lines, last_article_id, end_offset, _ in pool.run(iterator):
+                writer.write_batch(output_lines, last_article_id, end_offset)
+                for _ in output_lines:
+                    i += 1
+                    if i % 100 == 0:
+                        total_time = time.time() - start
+                        avg_time = total_time / i
+                        avg_last_time = (time.time() - last_time) / 100
+                        print(f"\r{i} articles, {avg_time:.5f} s per article, "
+                              f"{avg_last_time:.2f} s per article for the last 100 articles, "
+                              f"{int(total_time)} s total time.", end='')
+                        last_time = time.time()
         i -= 1  # So final log reports correct number of linked articles with and without multiprocessing
     else:
-        from wiki_entity_linker.linkers.linking_system import LinkingSystem
-        ls = LinkingSystem(args.linker_name,
-                           args.linker_config,
-                           hyperlink_linker=args.hyperlink_linker,
-                           coref_linker=args.coreference_linker,
-                           min_score=args.minimum_score,
-                           type_mapping_file=args.type_mapping)
         logger.info("Start linking with a single process.")
         start = time.time()
-        for i, tupl in enumerate(iterator):
-            article, uppercase, only_pronouns = tupl
-            ls.link_entities(article, uppercase, only_pronouns)
-            output_file.write(f"{article.to_json(evaluation_format=False)}\n")
+        i = -1
+        for batch in batches(iterator, args.batch_size):
+            articles = [decode_line(line, line_index) for line, (line_index, _) in batch]
+            ls.link_entities_batch(articles, args.uppercase, args.only_pronouns, n_process=args.parse_processes)
+            end_offset = batch[-1][1][1]
+            output_lines = []
+            for article in articles:
+                with ls.stage_timer.measure("serialization"):
+                    output_lines.append(encode_article(article))
+            writer.write_batch(output_lines, articles[-1].id, end_offset)
+            i += len(articles)
             total_time = time.time() - start
             time_per_article = total_time / (i + 1)
             print("\r%i articles, %f s per article, %f s total time." % (i + 1, time_per_article, total_time), end='')
 
     print()
+    if args.multiprocessing > 1:
+        pool.log_worker_statistics()
+    writer.close()
+    ls.stage_timer.log_summary()
+    if args.timings_file:
+        with open(args.timings_file, "w", encoding="utf8") as timings_file:
+            json.dump(ls.stage_timer.to_dict(), timings_file)
+        logger.info("Stage timings written to %s" % args.timings_file)
     logger.info("Linked %d articles in %fs" % (i+1, time.time() - start))
-    logger.info("Linked articles written to %s" % args.output_file)
-    output_file.close()
+    if start_index:
+        logger.info("%d articles were linked before resuming." % start_index)
+    logger.info("Linked articles written to %s" % ", ".join(writer.output_files()))
 
 
 if __name__ == "__main__":
@@ -162,6 +196,45 @@ if __name__ == "__main__":
                         help="For pure prior linker: Map predicted entities to types using the given mapping.")
     parser.add_argument("-m", "--multiprocessing", type=int, default=1,
                         help="Number of processes to use. Default is 1, i.e. no multiprocessing.")
+    parser.add_argument("-bs", "--batch_size", type=int, default=DEFAULT_PIPE_BATCH_SIZE,
+                        help="Number of articles that are processed by the spaCy model as a single batch. With "
+                             "multiprocessing, this is the maximum number of articles submitted to a worker process "
+                             "as a single task.")
+    parser.add_argument("--max_chunk_chars", type=int, default=DEFAULT_MAX_CHUNK_CHARS,
+                        help="With multiprocessing, articles are submitted to the worker processes in chunks of at "
+                             "most this many input characters. The chunk size is reduced dynamically when workers "
+                             "run out of work.")
+    parser.add_argument("--parse_processes", type=int, default=1,
+                        help="Number of processes the spaCy model uses for processing a batch of articles. "
+                             "Only used without multiprocessing (-m).")
+    parser.add_argument("--shard_size", type=int, default=0,
+                        help="Number of articles per output shard. The shards are named <output_file_root>.<shard_index>"
+                             "<output_file_extension>. Default is 0, i.e. a single output file.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume an interrupted linking job from the progress file written next to the output "
+                             "file. Input lines that were already linked are skipped.")
+    parser.add_argument("--queue_size", type=int,
+                        help="Maximum number of batches waiting in the input and in the output queue of the worker "
+                             "processes. Default is twice the number of processes.")
+    parser.add_argument("--save_snapshot", "--save-snapshot", type=str,
+                        help="Write the initialized linking system to this snapshot directory, such that later runs "
+                             "can load it with --load_snapshot within seconds.")
+    parser.add_argument("--load_snapshot", "--load-snapshot", type=str,
+                        help="Load the linking system from this snapshot directory instead of initializing it. The "
+                             "linker, hyperlink linker and coreference linker of the snapshot are used.")
+    parser.add_argument("--lazy_mappings", action="store_true",
+                        help="Don't load the mappings needed for hyperlink and alias lookups into memory, but query "
+                             "their on-disk databases on demand. Needs the databases created by "
+                             "scripts/create_lazy_databases.py.")
+    parser.add_argument("--mapping_cache_size", type=int, default=DEFAULT_LAZY_CACHE_SIZE // 1024 ** 2,
+                        help="Memory budget in MB for the values cached from lazily loaded mappings.")
+    parser.add_argument("--timings_file", type=str,
+                        help="Write the timings of the linking stages (parse, hyperlink, linker, coref, "
+                             "serialization) to this file in JSON format.")
+    parser.add_argument("--profile_every", type=int,
+                        help="Profile the linking of every n-th article with cProfile.")
+    parser.add_argument("--profile_dir", type=str, default="profiles",
+                        help="Directory to which the profiles are written if --profile_every is set.")
 
     args = parser.parse_args()
 
@@ -170,16 +243,4 @@ if __name__ == "__main__":
     logger = log.setup_logger(sys.argv[0], write_to_file=False)
     logger.debug(' '.join(sys.argv))
 
-    # Write command line arguments to temporary config file which is then read by the forkserver_linking_system module.
-    # This is not mega pretty, but I don't see a better solution where the user can still use command line arguments to
-    # configure the linking_system.
-    config = {"linker_name": args.linker_name,
-              "linker_config": args.linker_config,
-              "hyperlink_linker": args.hyperlink_linker,
-              "coreference_linker": args.coreference_linker,
-              "minimum_score": args.minimum_score,
-              "type_mapping": args.type_mapping}
-    with open(settings.TMP_FORKSERVER_CONFIG_FILE, "w", encoding="utf8") as config_file:
-        json.dump(config, config_file)
-
     main()
@@ -14,6 +14,7 @@ from elevant.models.article import Article, article_from_json
 
 from wiki_entity_linker.linkers.linkers import Linkers, HyperlinkLinkers, CoreferenceLinkers, PredictionFormats
 from wiki_entity_linker.linkers.linking_system import LinkingSystem
+from wiki_entity_linker.models.entity_database import DEFAULT_LAZY_CACHE_SIZE
 
 app = Flask(__name__)
 
@@ -88,6 +89,18 @@ if __name__ == "__main__":
     parser.add_argument("--type_mapping", type=str, default=settings.QID_TO_WHITELIST_TYPES_DB,
                         help="For pure prior linker: Map predicted entities to types using the given mapping.")
 
+    parser.add_argument("--save_snapshot", "--save-snapshot", type=str,
+                        help="Write the initialized linking system to this snapshot directory, such that later runs "
+                             "can load it with --load_snapshot within seconds.")
+    parser.add_argument("--load_snapshot", "--load-snapshot", type=str,
+                        help="Load the linking system from this snapshot directory instead of initializing it. The "
+                             "linker, hyperlink linker and coreference linker of the snapshot are used.")
+    parser.add_argument("--lazy_mappings", action="store_true",
+                        help="Don't load the mappings needed for hyperlink and alias lookups into memory, but query "
+                             "their on-disk databases on demand. Needs the databases created by "
+                             "scripts/create_lazy_databases.py.")
+    parser.add_argument("--mapping_cache_size", type=int, default=DEFAULT_LAZY_CACHE_SIZE // 1024 ** 2,
+                        help="Memory budget in MB for the values cached from lazily loaded mappings.")
     parser.add_argument("-wd", "--wikidata_annotations", action="store_true",
                         help="Resulting entity ids will not be mapped to Wikipedia.")
     parser.add_argument("-p", "--port", type=int, default=8080,
@@ -111,17 +124,25 @@ if __name__ == "__main__":
                                    "One article will be overwritten" % first_characters)
                 article_dict[first_characters] = article
 
-    linking_system = LinkingSystem(args.linker_name,
-                                   args.linker_config,
-                                   args.prediction_file,
-                                   args.prediction_format,
-                                   args.prediction_name,
-                                   args.hyperlink_linker,
-                                   args.coreference_linker,
-                                   args.minimum_score,
-                                   args.type_mapping)
+    if args.load_snapshot:
+        linking_system = LinkingSystem.load_snapshot(args.load_snapshot)
+    else:
+        linking_system = LinkingSystem(args.linker_name,
+                                       args.linker_config,
+                                       args.prediction_file,
+                                       args.prediction_format,
+                                       args.prediction_name,
+                                       args.hyperlink_linker,
+                                       args.coreference_linker,
+                                       args.minimum_score,
+                                       args.type_mapping,
+                                       lazy_mappings=args.lazy_mappings,
+                                       mapping_cache_size=args.mapping_cache_size * 1024 ** 2)
 
     if not args.wikidata_annotations and not linking_system.entity_db.is_wikidata_to_wikipedia_mapping_loaded():
         linking_system.entity_db.load_wikidata_to_wikipedia_mapping()
 
+    if args.save_snapshot:
+        linking_system.save_snapshot(args.save_snapshot)
+
     app.run(host="::", port=args.port, threaded=True)
@@ -0,0 +1,57 @@
+import argparse
+import time
+import sys
+
+sys.path.append(".")
+
+from elevant.utils import log
+from wiki_entity_linker.helpers import entity_database_reader
+from wiki_entity_linker.linkers.prefix_trie_linker import get_best_entity_items, get_alias_candidate_items
+from wiki_entity_linker.models.entity_database import EntityDatabase
+from wiki_entity_linker.models.qid_mappings import StringToQidMapping, StringToQidSetMapping
+
+
+def main(args):
+    entity_db = EntityDatabase()
+    entity_db.load_name_to_entities()
+    entity_db.load_alias_to_entities()
+    entity_db.load_family_name_aliases()
+    entity_db.load_entity_to_aliases()
+    entity_db.load_entity_to_family_name()
+    entity_db.load_demonyms()
+    entity_db.load_sitelink_counts()
+
+    output_dir = entity_database_reader.CANDIDATE_TABLE_DIR
+    logger.info("Collecting the candidates of each alias ...")
+    start = time.time()
+    candidate_table = StringToQidSetMapping.from_pairs(get_alias_candidate_items(entity_db))
+    candidate_table.save(output_dir)
+    logger.info(f"Wrote candidates of {len(candidate_table)} aliases to {output_dir} in {time.time() - start} s")
+
+    for min_score in args.min_score:
+        output_dir = entity_database_reader.BEST_ENTITY_TABLE_DIR % min_score
+        logger.info(f"Selecting the best entity of each alias for min score {min_score} ...")
+        start = time.time()
+        table = StringToQidMapping.from_pairs(get_best_entity_items(entity_db, min_score))
+        table.save(output_dir)
+        logger.info(f"Wrote best entities of {len(table)} aliases to {output_dir} in {time.time() - start} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description="Build the best entity table of the prefix trie linker, in which "
+                                                 "each entity name, alias, family name and demonym is mapped to the "
+                                                 "entity that the linker selects for it for a given min score, and "
+                                                 "write it in a memory-mappable format. If the table for the "
+                                                 "linker's min score exists, the linker links named entities with a "
+                                                 "single lookup in the table and the alias mappings are not loaded. "
+                                                 "The candidates of each alias, which the linker adds to its "
+                                                 "predictions, are written to a separate table.")
+
+    parser.add_argument("--min_score", type=int, nargs="+", default=[15],
+                        help="Min scores (minimum sitelink count of a selected entity) for which to build a table.")
+
+    logger = log.setup_logger(sys.argv[0])
+    logger.debug(' '.join(sys.argv))
+
+    main(parser.parse_args())
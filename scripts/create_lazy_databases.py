@@ -0,0 +1,93 @@
+import argparse
+import time
+import lmdb
+import sys
+from typing import Dict, Set
+
+sys.path.append(".")
+
+from elevant.utils import log
+from wiki_entity_linker.helpers import entity_database_reader
+from wiki_entity_linker.helpers.entity_database_reader import EntityDatabaseReader
+from wiki_entity_linker.models.entity_database import EntityDatabase, get_given_names
+from wiki_entity_linker.models.lazy_database import encode_key
+from wiki_entity_linker.models.qid_mappings import QidToStringMapping
+
+
+def write_to_dbm(d: Dict[str, str], filename: str):
+    logger.info(f"Writing database to file {filename} ...")
+    start = time.time()
+    # Set max map size to 40 GB. There is allegedly no penalty for making this huge on 64 bit systems.
+    env = lmdb.open(filename, map_size=42949672960)
+    max_key_size = env.max_key_size()
+    n_skipped = 0
+    with env.begin(write=True) as db:
+        for key, value in d.items():
+            encoded_key = encode_key(key, env)
+            if encoded_key is None:
+                # Empty keys and keys longer than the maximum key size can't be stored. They are never found.
+                n_skipped += 1
+                continue
+            try:
+                db.put(encoded_key, value.encode("utf-8"))
+            except lmdb.BadValsizeError:
+                logger.error(f"Failed to write key \"{key}\" with value \"{value}\".")
+    env.close()
+    if n_skipped:
+        logger.warning(f"Skipped {n_skipped} keys that are empty or longer than {max_key_size} bytes.")
+    logger.info(f"Done. Took {time.time() - start} s")
+
+
+def invert_title_mapping(alias_to_titles: Dict[str, Set[str]], entity_db: EntityDatabase) -> Dict[str, str]:
+    """
+    Turn a mapping from alias to Wikipedia titles into a mapping from QID to tab-separated aliases.
+    """
+    entity_to_aliases = {}
+    for alias, titles in alias_to_titles.items():
+        for title in titles:
+            entity_id = entity_db.link2id(title)
+            if entity_id is not None:
+                if entity_id not in entity_to_aliases:
+                    entity_to_aliases[entity_id] = set()
+                entity_to_aliases[entity_id].add(alias)
+    return {entity_id: "\t".join(sorted(aliases)) for entity_id, aliases in entity_to_aliases.items()}
+
+
+def main(args):
+    logger.info("Reading human names ...")
+    human_names = list(EntityDatabaseReader.read_human_names())
+    family_names = {entity_id: name.split()[-1] for entity_id, name in human_names if " " in name}
+    given_names = QidToStringMapping.from_pairs(get_given_names(human_names))
+    logger.info(f"Writing given names of {len(given_names)} entities to {entity_database_reader.GIVEN_NAMES_DIR} ...")
+    given_names.save(entity_database_reader.GIVEN_NAMES_DIR)
+    write_to_dbm(family_names, entity_database_reader.QID_TO_FAMILY_NAME_DB)
+
+    entity_db = EntityDatabase()
+    entity_db.load_resolved_links()
+
+    if not args.skip_title_synonyms:
+        title_synonyms = invert_title_mapping(EntityDatabaseReader.get_title_synonyms(), entity_db)
+        write_to_dbm(title_synonyms, entity_database_reader.QID_TO_TITLE_SYNONYMS_DB)
+
+    if not args.skip_akronyms:
+        akronyms = invert_title_mapping(EntityDatabaseReader.get_akronyms(), entity_db)
+        write_to_dbm(akronyms, entity_database_reader.QID_TO_AKRONYMS_DB)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description="Create the entity-keyed databases that are queried on demand "
+                                                 "when the entity database is used in lazy mode "
+                                                 "(option --lazy_mappings): QID to family name, QID to title "
+                                                 "synonyms and QID to akronyms. Also create the memory-mapped "
+                                                 "given names, which are used in both modes.")
+
+    parser.add_argument("--skip_title_synonyms", action="store_true",
+                        help="Don't create the title synonyms database, e.g. if title synonyms were not extracted.")
+    parser.add_argument("--skip_akronyms", action="store_true",
+                        help="Don't create the akronyms database, e.g. if akronyms were not extracted.")
+
+    logger = log.setup_logger(sys.argv[0])
+    logger.debug(' '.join(sys.argv))
+
+    main(parser.parse_args())
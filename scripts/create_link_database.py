@@ -0,0 +1,88 @@
+import argparse
+import time
+import lmdb
+import sys
+from typing import Dict, Optional
+
+sys.path.append(".")
+
+from elevant.utils import log
+from wiki_entity_linker.helpers import entity_database_reader
+from wiki_entity_linker.models.lazy_database import LazyDatabase, encode_key
+
+MAX_REDIRECT_CHAIN_LENGTH = 10
+
+
+def resolve_link(link_target: str, title_to_qid: Dict[str, str], redirects: Dict[str, str]) -> Optional[str]:
+    """
+    Follow the redirects starting from the given link target until a title with a QID is reached.
+    Return None for redirect cycles, chains that end in a title without a QID and overly long chains.
+    """
+    visited = set()
+    while link_target not in title_to_qid:
+        if link_target not in redirects or link_target in visited or len(visited) >= MAX_REDIRECT_CHAIN_LENGTH:
+            return None
+        visited.add(link_target)
+        link_target = redirects[link_target]
+    return title_to_qid[link_target]
+
+
+def main(args):
+    logger.info(f"Reading Wikipedia title to QID mapping from {entity_database_reader.WIKIPEDIA_NAME_TO_QID_DB} ...")
+    title_to_qid = dict(LazyDatabase(entity_database_reader.WIKIPEDIA_NAME_TO_QID_DB).items())
+    logger.info(f"Reading redirects from {entity_database_reader.REDIRECTS_DB} ...")
+    redirects = dict(LazyDatabase(entity_database_reader.REDIRECTS_DB).items())
+
+    link_to_qid = dict(title_to_qid)
+    n_chains = 0
+    for link_target, redirect_target in redirects.items():
+        if link_target in link_to_qid:
+            # As in EntityDatabase.link2id(), a title with a QID is not redirected
+            continue
+        entity_id = resolve_link(link_target, title_to_qid, redirects)
+        if entity_id is not None:
+            link_to_qid[link_target] = entity_id
+            if redirect_target not in title_to_qid:
+                n_chains += 1
+    logger.info(f"Resolved {len(link_to_qid) - len(title_to_qid)} of {len(redirects)} redirects, "
+                f"{n_chains} of them via redirect chains.")
+
+    logger.info(f"Writing {len(link_to_qid)} link targets to {args.output_file} ...")
+    start = time.time()
+    # Set max map size to 40 GB. There is allegedly no penalty for making this huge on 64 bit systems.
+    env = lmdb.open(args.output_file, map_size=42949672960)
+    entries = []
+    for key, value in link_to_qid.items():
+        encoded_key = encode_key(key, env)
+        # Empty keys and keys longer than the maximum key size can't be stored. They are never found.
+        if encoded_key is not None:
+            entries.append((encoded_key, value.encode("utf-8")))
+    if len(entries) < len(link_to_qid):
+        logger.warning(f"Skipped {len(link_to_qid) - len(entries)} link targets that are empty or longer than "
+                       f"{env.max_key_size()} bytes.")
+    with env.begin(write=True) as db:
+        # Keys are written in the database order, which is considerably faster than random inserts
+        for key, value in sorted(entries):
+            try:
+                db.put(key, value, append=True)
+            except lmdb.BadValsizeError:
+                logger.error(f"Failed to write link target \"{key.decode('utf-8')}\".")
+    env.close()
+    logger.info(f"Done. Took {time.time() - start} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description="Create a flattened mapping from link target (Wikipedia title or "
+                                                 "redirect) to QID in which redirect chains are already resolved. "
+                                                 "If the resulting database exists, the hyperlink linkers map a "
+                                                 "link target to its QID with a single lookup and the Wikipedia to "
+                                                 "Wikidata mapping and the redirects are not loaded.")
+
+    parser.add_argument("-o", "--output_file", type=str, default=entity_database_reader.LINK_TO_QID_DB,
+                        help="File name of the generated DB.")
+
+    logger = log.setup_logger(sys.argv[0])
+    logger.debug(' '.join(sys.argv))
+
+    main(parser.parse_args())
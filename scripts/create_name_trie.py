@@ -0,0 +1,48 @@
+import argparse
+import time
+import spacy
+import sys
+
+sys.path.append(".")
+
+from elevant import settings
+from elevant.utils import log
+from wiki_entity_linker.helpers import entity_database_reader
+from wiki_entity_linker.linkers.prefix_trie_linker import get_name_trie_items
+from wiki_entity_linker.models.entity_database import EntityDatabase
+from wiki_entity_linker.utils.token_trie import TokenTrie
+
+
+def main(args):
+    entity_db = EntityDatabase()
+    entity_db.load_name_to_entities()
+    entity_db.load_sitelink_counts()
+    # The names are tokenized like the articles that the linker processes
+    tokenizer = spacy.load(settings.LARGE_MODEL_NAME).tokenizer
+
+    for min_score in args.min_score:
+        output_dir = entity_database_reader.NAME_TRIE_DIR % min_score
+        logger.info(f"Building name trie for min score {min_score} ...")
+        start = time.time()
+        trie = TokenTrie.from_items(get_name_trie_items(entity_db, min_score, tokenizer))
+        trie.save(output_dir)
+        logger.info(f"Wrote name trie with {len(trie)} names to {output_dir} in {time.time() - start} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description="Build the name trie of the prefix trie linker, in which each "
+                                                 "entity name is mapped to its winning entity for a given min "
+                                                 "score, and write it in a memory-mappable format. Names are "
+                                                 "keyed by the IDs of their spaCy tokens. If the trie for the "
+                                                 "linker's min score exists, the linker loads it instead of "
+                                                 "building the trie at startup.")
+
+    parser.add_argument("--min_score", type=int, nargs="+", default=[15],
+                        help="Min scores (minimum sitelink count of the winning entity of a name with several "
+                             "entities) for which to build a trie.")
+
+    logger = log.setup_logger(sys.argv[0])
+    logger.debug(' '.join(sys.argv))
+
+    main(parser.parse_args())
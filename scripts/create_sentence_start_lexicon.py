@@ -0,0 +1,81 @@
+import argparse
+import sys
+
+import spacy
+from collections import Counter
+from itertools import islice
+
+sys.path.append(".")
+
+from elevant import settings
+from elevant.utils import log
+from elevant.helpers.wikipedia_dump_reader import WikipediaDumpReader
+from wiki_entity_linker.linkers.hyperlink_reference_linker import is_likely_entity_at_sentence_start, \
+    SENTENCE_START_LEXICON_FILE
+import elevant.utils.custom_sentencizer  # import is needed so Python finds the custom component
+
+
+def main(args):
+    model = spacy.load(settings.LARGE_MODEL_NAME, disable=["ner", "lemmatizer"])
+    model.add_pipe("custom_sentencizer", before="parser")
+
+    n_accepted = Counter()
+    n_total = Counter()
+    logger.info(f"Parsing {args.n_articles} articles from {args.input_file} ...")
+    with open(args.input_file, "r", encoding="utf8") as file:
+        texts = (WikipediaDumpReader.json2article(line).text for line in islice(file, args.n_articles))
+        for i, doc in enumerate(model.pipe(texts, batch_size=32)):
+            for sentence in doc.sents:
+                token = sentence[0]
+                if token.i == 0 or token.text.islower():
+                    # The hyperlink reference linker does not check the first word of an article
+                    # and does not search for lowercase synonyms
+                    continue
+                n_total[token.text] += 1
+                if is_likely_entity_at_sentence_start(token):
+                    n_accepted[token.text] += 1
+            if (i + 1) % 1000 == 0:
+                print(f"\rParsed {i + 1} articles.", end="")
+        print()
+
+    n_words = 0
+    with open(args.output_file, "w", encoding="utf8") as file:
+        for word, total in sorted(n_total.items()):
+            if total < args.min_count:
+                continue
+            accepted_ratio = n_accepted[word] / total
+            if accepted_ratio >= args.min_agreement:
+                file.write(f"{word}\t1\n")
+            elif accepted_ratio <= 1 - args.min_agreement:
+                file.write(f"{word}\t0\n")
+            else:
+                # Ambiguous words are left out, so their sentences are parsed
+                continue
+            n_words += 1
+    logger.info(f"Wrote {n_words} of {len(n_total)} sentence start words to {args.output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description="Create the sentence start lexicon for the fast mode of the "
+                                                 "hyperlink reference linker (-hl hyperlink-reference-fast). "
+                                                 "For each word at the beginning of a sentence in the given "
+                                                 "articles, the lexicon records whether the full spaCy model "
+                                                 "(almost) always considers it a likely entity mention (1) or "
+                                                 "(almost) never (0).")
+
+    parser.add_argument("input_file", type=str,
+                        help="Input file with articles in the JSON format of the extracted Wikipedia dump.")
+    parser.add_argument("-o", "--output_file", type=str, default=SENTENCE_START_LEXICON_FILE,
+                        help="Output TSV file with one word and its decision per line.")
+    parser.add_argument("-n", "--n_articles", type=int, default=100000,
+                        help="Number of articles to parse.")
+    parser.add_argument("--min_count", type=int, default=5,
+                        help="Minimum number of occurrences at sentence start for a word to be included.")
+    parser.add_argument("--min_agreement", type=float, default=0.95,
+                        help="Minimum fraction of occurrences with the same decision for a word to be included.")
+
+    logger = log.setup_logger(sys.argv[0])
+    logger.debug(' '.join(sys.argv))
+
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+import argparse
+import time
+import lmdb
+import sys
+
+sys.path.append(".")
+
+from elevant.utils import log
+from wiki_entity_linker.helpers import entity_database_reader
+from wiki_entity_linker.linkers.hyperlink_reference_linker import compute_synonym_bundle, encode_synonym_bundle
+from wiki_entity_linker.models.entity_database import EntityDatabase
+
+
+def main(args):
+    entity_db = EntityDatabase()
+    entity_db.load_all_entities_in_wikipedia(minimum_sitelink_count=0)
+    entity_db.load_entity_types()
+    entity_db.load_entity_names()
+    entity_db.load_resolved_links()
+    entity_db.load_entity_to_aliases()
+    entity_db.load_entity_to_family_name()
+    entity_db.load_title_synonyms()
+    entity_db.load_akronyms()
+
+    entity_ids = set(entity_db.entity_name_db)
+    for mapping in (entity_db.entity_to_aliases_db, entity_db.entity_to_family_name, entity_db.title_synonyms,
+                    entity_db.akronyms):
+        entity_ids.update(mapping)
+
+    logger.info(f"Writing synonym bundles of {len(entity_ids)} entities to {args.output_file} ...")
+    start = time.time()
+    count = 0
+    # Set max map size to 40 GB. There is allegedly no penalty for making this huge on 64 bit systems.
+    env = lmdb.open(args.output_file, map_size=42949672960)
+    with env.begin(write=True) as db:
+        for entity_id in sorted(entity_ids):
+            bundle = compute_synonym_bundle(entity_db, entity_id)
+            if not bundle[0] and not bundle[1]:
+                continue
+            value = encode_synonym_bundle(bundle)
+            try:
+                db.put(entity_id.encode("utf-8"), value.encode("utf-8"))
+            except lmdb.BadValsizeError:
+                logger.error(f"Failed to write synonym bundle of entity {entity_id}.")
+            count += 1
+            if count % 100000 == 0:
+                print(f"\rWrote {count} synonym bundles.", end="")
+        print()
+    env.close()
+    logger.info(f"Wrote {count} synonym bundles in {time.time() - start} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description="Precompute the synonyms that the hyperlink reference linker "
+                                                 "searches for when an entity is hyperlinked in an article: the "
+                                                 "entity's aliases, family name, title synonyms and akronyms "
+                                                 "without lowercase aliases, and the middle name variants of its "
+                                                 "name. If the resulting database exists, the linker reads the "
+                                                 "synonyms from it and the alias mappings are not loaded.")
+
+    parser.add_argument("-o", "--output_file", type=str, default=entity_database_reader.QID_TO_SYNONYM_BUNDLE_DB,
+                        help="File name of the generated DB.")
+
+    logger = log.setup_logger(sys.argv[0])
+    logger.debug(' '.join(sys.argv))
+
+    main(parser.parse_args())
@@ -1,3 +1,4 @@
+import argparse
 import pickle
 import sys
 import re
@@ -7,11 +8,14 @@ sys.path.append(".")
 from elevant import settings
 from elevant.utils import log
 from elevant.helpers.wikipedia_corpus import WikipediaCorpus
+from wiki_entity_linker.helpers import entity_database_reader
+from wiki_entity_linker.models.entity_database import EntityDatabase
+from wiki_entity_linker.models.qid_mappings import QidToStringSetMapping
 
 _akronym_re = re.compile(r" \(([A-Z]+)\).*")
 
 
-def main():
+def main(args):
     logger.info("Extracting akronyms from Wikipedia training articles ...")
 
     akronyms = {}
@@ -39,9 +43,26 @@ def main():
 
     logger.info("Wrote %d akronyms to %s" % (len(akronyms), settings.AKRONYMS_FILE))
 
+    if args.entity_mapping:
+        entity_db = EntityDatabase()
+        entity_db.load_resolved_links()
+        entity_to_akronyms = QidToStringSetMapping.from_pairs(entity_db.invert_title_mapping(akronyms))
+        entity_to_akronyms.save(entity_database_reader.QID_TO_AKRONYMS_DIR)
+        logger.info("Wrote akronyms of %d entities to %s" % (len(entity_to_akronyms),
+                                                             entity_database_reader.QID_TO_AKRONYMS_DIR))
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description="Extract akronyms (e.g. \"German People's Party (DVP)\") of "
+                                                 "hyperlink targets from the Wikipedia training articles.")
+
+    parser.add_argument("--entity_mapping", action="store_true",
+                        help="Also write the mapping from QID to akronyms, with hyperlink targets mapped to QIDs "
+                             "via redirects, in a memory-mappable format. The entity database then loads it "
+                             "instead of inverting the akronyms at startup.")
+
     logger = log.setup_logger(sys.argv[0])
     logger.debug(' '.join(sys.argv))
 
-    main()
+    main(parser.parse_args())
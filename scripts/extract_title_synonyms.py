@@ -1,3 +1,4 @@
+import argparse
 import pickle
 import sys
 
@@ -6,9 +7,12 @@ sys.path.append(".")
 from elevant import settings
 from elevant.utils import log
 from elevant.helpers.wikipedia_corpus import WikipediaCorpus
+from wiki_entity_linker.helpers import entity_database_reader
+from wiki_entity_linker.models.entity_database import EntityDatabase
+from wiki_entity_linker.models.qid_mappings import QidToStringSetMapping
 
 
-def main():
+def main(args):
     logger.info("Extracting title synonyms from Wikipedia training articles ...")
 
     title_synonyms = {}
@@ -32,9 +36,26 @@ def main():
         pickle.dump(title_synonyms, f)
     logger.info("Wrote %d title synonyms to %s" % (len(title_synonyms), settings.TITLE_SYNONYMS_FILE))
 
+    if args.entity_mapping:
+        entity_db = EntityDatabase()
+        entity_db.load_resolved_links()
+        entity_to_title_synonyms = QidToStringSetMapping.from_pairs(entity_db.invert_title_mapping(title_synonyms))
+        entity_to_title_synonyms.save(entity_database_reader.QID_TO_TITLE_SYNONYMS_DIR)
+        logger.info("Wrote title synonyms of %d entities to %s" % (len(entity_to_title_synonyms),
+                                                                   entity_database_reader.QID_TO_TITLE_SYNONYMS_DIR))
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     description="Extract title synonyms (bold text at the beginning of an article) "
+                                                 "from the Wikipedia training articles.")
+
+    parser.add_argument("--entity_mapping", action="store_true",
+                        help="Also write the mapping from QID to title synonyms, with article titles mapped to QIDs "
+                             "via redirects, in a memory-mappable format. The entity database then loads it "
+                             "instead of inverting the title synonyms at startup.")
+
     logger = log.setup_logger(sys.argv[0])
     logger.debug(' '.join(sys.argv))
 
-    main()
+    main(parser.parse_args())
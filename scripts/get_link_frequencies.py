@@ -7,7 +7,7 @@ sys.path.append(".")
 from elevant import settings
 from elevant.utils import log
 from elevant.helpers.wikipedia_corpus import WikipediaCorpus
-from elevant.models.entity_database import EntityDatabase
+from wiki_entity_linker.models.entity_database import EntityDatabase
 
 
 def main():
@@ -15,8 +15,7 @@ def main():
 
     logger.info("Loading entity database...")
     entity_db = EntityDatabase()
-    entity_db.load_wikipedia_to_wikidata_db()
-    entity_db.load_redirects()
+    entity_db.load_resolved_links()
 
     links = {}
 
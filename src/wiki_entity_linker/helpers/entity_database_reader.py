@@ -9,6 +9,47 @@ from elevant import settings
 
 logger = logging.getLogger("main." + __name__.split(".")[-1])
 
+WIKIDATA_MAPPINGS_DIR = settings.DATA_DIRECTORY + "wikidata_mappings/"
+WIKIPEDIA_MAPPINGS_DIR = settings.DATA_DIRECTORY + "wikipedia_mappings/"
+
+# Databases that are queried on demand when the entity database is used in lazy mode.
+# The first three are created by the Makefile target generate_databases, the others by
+# scripts/create_lazy_databases.py
+WIKIPEDIA_NAME_TO_QID_DB = WIKIDATA_MAPPINGS_DIR + "wikipedia_name_to_qid.db"
+REDIRECTS_DB = WIKIPEDIA_MAPPINGS_DIR + "redirects.db"
+QID_TO_ALIASES_DB = WIKIDATA_MAPPINGS_DIR + "qid_to_aliases.db"
+QID_TO_FAMILY_NAME_DB = WIKIDATA_MAPPINGS_DIR + "qid_to_family_name.db"
+QID_TO_TITLE_SYNONYMS_DB = WIKIPEDIA_MAPPINGS_DIR + "qid_to_title_synonyms.db"
+QID_TO_AKRONYMS_DB = WIKIPEDIA_MAPPINGS_DIR + "qid_to_akronyms.db"
+
+# Memory-mapped given names (see QidToStringMapping), created by scripts/create_lazy_databases.py and used in both modes
+GIVEN_NAMES_DIR = WIKIDATA_MAPPINGS_DIR + "given_names/"
+
+# Memory-mapped title synonyms and akronyms of each entity (see QidToStringSetMapping), created by
+# scripts/extract_title_synonyms.py and scripts/extract_akronyms.py with option --entity_mapping
+QID_TO_TITLE_SYNONYMS_DIR = WIKIPEDIA_MAPPINGS_DIR + "qid_to_title_synonyms/"
+QID_TO_AKRONYMS_DIR = WIKIPEDIA_MAPPINGS_DIR + "qid_to_akronyms/"
+
+# Flattened mapping from Wikipedia title or redirect to QID with resolved redirect chains, created by
+# scripts/create_link_database.py
+LINK_TO_QID_DB = WIKIPEDIA_MAPPINGS_DIR + "link_to_qid.db"
+
+# Name tries of the prefix trie linker with the winning entity of each name for a given min score, created by
+# scripts/create_name_trie.py
+NAME_TRIE_DIR = WIKIDATA_MAPPINGS_DIR + "name_trie_min_score_%d/"
+
+# Tables of the prefix trie linker with the best entity of each alias, name and demonym for a given min score,
+# created by scripts/create_best_entity_table.py
+BEST_ENTITY_TABLE_DIR = WIKIDATA_MAPPINGS_DIR + "best_entity_min_score_%d/"
+
+# Table of the prefix trie linker with the candidate entities of each alias, name and demonym, created by
+# scripts/create_best_entity_table.py
+CANDIDATE_TABLE_DIR = WIKIDATA_MAPPINGS_DIR + "alias_candidates/"
+
+# Precomputed synonyms of each entity for the hyperlink reference linker, created by
+# scripts/create_synonym_bundles.py
+QID_TO_SYNONYM_BUNDLE_DB = WIKIPEDIA_MAPPINGS_DIR + "qid_to_synonym_bundle.db"
+
 
 class EntityDatabaseReader(elevant.helpers.entity_database_reader.EntityDatabaseReader):
     @staticmethod
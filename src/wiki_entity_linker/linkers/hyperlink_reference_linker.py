@@ -1,6 +1,7 @@
+import os
 import re
-from typing import Dict, Optional, Tuple, Set
-from spacy.tokens import Doc
+from typing import Dict, Optional, Set, Tuple, List
+from spacy.tokens import Doc, Token
 from spacy.language import Language
 
 import spacy
@@ -8,36 +9,132 @@ import logging
 
 from elevant.evaluation.groundtruth_label import GroundtruthLabel
 from elevant.models.entity_mention import EntityMention
-from elevant.utils.offset_converter import OffsetConverter
 from elevant.utils.pronoun_finder import PronounFinder
 from elevant.models.article import Article
 from elevant import settings
 import elevant.utils.custom_sentencizer  # import is needed so Python finds the custom component
 
 from wiki_entity_linker.models.entity_database import EntityDatabase
+from wiki_entity_linker.models.lazy_database import LazyDatabase, LRUCache
+from wiki_entity_linker.utils.pattern_matcher import PatternMatcher, get_word_start_positions
+from wiki_entity_linker.utils.span_coverage import SpanCoverage
+from wiki_entity_linker.utils.token_index import TokenIndex, get_token_index
 
 
 logger = logging.getLogger("main." + __name__.split(".")[-1])
 
 
-def is_overlapping_span(covered_positions: Set[int], span: Tuple[int, int]) -> bool:
+DEFAULT_SYNONYM_CACHE_SIZE = 256 * 1024 ** 2  # Memory budget in bytes for cached synonym bundles
+
+# Words for which the sentence start check of the fast mode is decided without parsing,
+# created by scripts/create_sentence_start_lexicon.py
+SENTENCE_START_LEXICON_FILE = settings.DATA_DIRECTORY + "wikipedia_mappings/sentence_start_lexicon.tsv"
+
+SynonymBundle = Tuple[List[str], List[str]]
+EMPTY_SYNONYM_BUNDLE = ([], [])
+
+
+def get_middle_name_synonyms(entity_db: EntityDatabase, entity_id: str) -> Set[str]:
+    """
+    For names that include middle names, e.g. "Habern William Archibald Freeman"
+    add the following name variants as synonyms:
+    "Habern Freeman", "Habern W. A. Freeman", "Habern W.A. Freeman", "Habern W A Freeman"
+    """
+    whitelist_types = entity_db.get_entity_types(entity_id)
+    middle_name_synonyms = set()
+    if (settings.TYPE_PERSON_QID in whitelist_types or settings.TYPE_FICTIONAL_CHARACTER_QID in whitelist_types) \
+            and settings.TYPE_ORGANIZATION_QID not in whitelist_types:
+        # Don't do this if the entity also has type organization, since sometimes e.g. bands are
+        # of type person and organization and then something like this happens:
+        # The Blackeyed Susans: {'The B. Susans', 'The B Susans', 'The Susans'}
+        entity_name = entity_db.get_entity_name(entity_id)
+        name_parts = entity_name.split(" ")
+        if len(name_parts) > 2 and all([n[0].isupper() for n in name_parts if n]):
+            # Don't add name variants if the potential middle names are lowercase,
+            # since this is typically something like
+            # "Karl I of Austria" or "William Howe, 5th Viscount Howe"
+            middle_name_synonyms.add(" ".join([n[0] for n in name_parts[1:-1] if n]) + " ")
+            middle_name_synonyms.add("".join([n[0] + "." for n in name_parts[1:-1] if n]) + " ")
+            middle_name_synonyms.add(" ".join([n[0] + "." for n in name_parts[1:-1] if n]) + " ")
+            middle_name_synonyms.add("")
+            middle_name_synonyms = [name_parts[0] + " " + m + name_parts[-1] for m in middle_name_synonyms]
+    return middle_name_synonyms
+
+
+def compute_synonym_bundle(entity_db: EntityDatabase, entity_id: str) -> SynonymBundle:
     """
-    Check if the given span overlaps with an already linked mention in covered_positions.
+    Compute the synonyms of the given entity that the hyperlink reference linker searches for:
+    A list of the entity's aliases without lowercase aliases (e.g. "it" for Italy) and a list of
+    the middle name variants of the entity's name.
+    """
+    aliases = [syn for syn in entity_db.get_entity_aliases(entity_id) if not syn.islower()]
+    return aliases, list(get_middle_name_synonyms(entity_db, entity_id))
+
 
-    :param covered_positions: Set of character indices in the text that belong to an already linked mention.
-    :param span: Span (start, end) for which to check for overlaps with already linked mentions.
-    :return: Boolean indicating whether the given span overlaps with an already linked mention.
+def is_likely_entity_at_sentence_start(token: Token) -> bool:
+    """
+    Case information can't be used at the beginning of a sentence. A word at sentence start is likely an entity
+    if it is a noun or adjective or if it is the subject of the sentence but not a pronoun.
     """
-    for i in range(span[0], span[1]):
-        if i in covered_positions:
-            return True
-    return False
+    return token.tag_.startswith("NN") or token.tag_.startswith("JJ") or \
+        (token.dep_.startswith("nsubj") and not PronounFinder.is_pronoun(token.text))
+
+
+def read_sentence_start_lexicon(filename: str) -> Dict[str, bool]:
+    lexicon = {}
+    with open(filename, "r", encoding="utf8") as file:
+        for line in file:
+            word, decision = line.rstrip("\n").split("\t")
+            lexicon[word] = decision == "1"
+    logger.info("Loaded %d words of the sentence start lexicon from %s" % (len(lexicon), filename))
+    return lexicon
+
+
+def encode_synonym_bundle(bundle: SynonymBundle) -> str:
+    aliases, middle_name_synonyms = bundle
+    return "\t".join(aliases) + "\n" + "\t".join(middle_name_synonyms)
+
+
+def decode_synonym_bundle(value: str) -> SynonymBundle:
+    aliases, middle_name_synonyms = value.split("\n")
+    return aliases.split("\t") if aliases else [], middle_name_synonyms.split("\t") if middle_name_synonyms else []
 
 
 class HyperlinkReferenceLinker:
     LINKER_IDENTIFIER = "Hyperlink Reference Linker"
 
-    def __init__(self, entity_db: EntityDatabase, model: Optional[Language] = None):
+    def __init__(self,
+                 entity_db: EntityDatabase,
+                 model: Optional[Language] = None,
+                 synonym_bundles_file: Optional[str] = None,
+                 fast: Optional[bool] = False):
+        """
+        If a synonym_bundles_file is given, the synonyms of hyperlinked entities are read from this database,
+        which is created by scripts/create_synonym_bundles.py. Then, the entity database does not need
+        the alias mappings. Otherwise, they are computed from the alias mappings of the entity database.
+        Either way, the synonyms of the most recently used entities are kept in an LRU cache.
+
+        In fast mode, articles are only tokenized and split into sentences. The tagger and the parser are only
+        needed to decide whether a single word at the beginning of a sentence is linked. This is looked up in the
+        sentence start lexicon if it exists. Only sentences that start with an ambiguous word are parsed with the
+        full model.
+        """
+        self.fast = fast
+        self.full_model = None
+        self.sentence_start_lexicon = {}
+        if fast:
+            self.full_model = spacy.load(settings.LARGE_MODEL_NAME, disable=["ner", "lemmatizer"])
+            self.full_model.add_pipe("custom_sentencizer", before="parser")
+            if model is None:
+                model = spacy.blank("en")
+                model.add_pipe("sentencizer")
+                model.add_pipe("custom_sentencizer")
+            if os.path.exists(SENTENCE_START_LEXICON_FILE):
+                self.sentence_start_lexicon = read_sentence_start_lexicon(SENTENCE_START_LEXICON_FILE)
+            else:
+                logger.warning("Sentence start lexicon %s not found. All sentences that start with a possible "
+                               "mention are parsed." % SENTENCE_START_LEXICON_FILE)
+
         if model is None:
             self.model = spacy.load(settings.LARGE_MODEL_NAME)
             self.model.add_pipe("custom_sentencizer", before="parser")
@@ -46,47 +143,51 @@ class HyperlinkReferenceLinker:
 
         self.entity_db = entity_db
 
+        # In lazy mode, the synonym bundles count towards the memory budget of the entity database
+        self.synonym_cache = entity_db.lazy_cache if entity_db.lazy else LRUCache(DEFAULT_SYNONYM_CACHE_SIZE)
+        self.synonym_bundles = None
+        if synonym_bundles_file:
+            logger.info("Using precomputed synonyms from %s" % synonym_bundles_file)
+            self.synonym_bundles = LazyDatabase(synonym_bundles_file, self.synonym_cache, decode_synonym_bundle)
+
+    def get_synonym_bundle(self, entity_id: str) -> SynonymBundle:
+        if self.synonym_bundles is not None:
+            return self.synonym_bundles.get(entity_id, EMPTY_SYNONYM_BUNDLE)
+        cache_key = ("synonym_bundle", entity_id)
+        bundle = self.synonym_cache.get(cache_key)
+        if bundle is None:
+            bundle = compute_synonym_bundle(self.entity_db, entity_id)
+            self.synonym_cache.put(cache_key, bundle)
+        return bundle
+
     def add_synonyms(self, entity_id: str, synonym_dict: Dict):
         """
         Add all aliases of the given entity to the given synonym dictionary.
         """
-        synonyms = self.entity_db.get_entity_aliases(entity_id)
+        aliases, middle_name_synonyms = self.get_synonym_bundle(entity_id)
 
-        for syn in synonyms:
-            # Do not append lowercase synonyms (e.g. "it" for Italy)
-            if not syn.islower() and syn not in synonym_dict:
+        for syn in aliases:
+            if syn not in synonym_dict:
                 synonym_dict[syn] = entity_id
 
-        middle_name_synonyms = self.get_middle_name_synonyms(entity_id)
-        if middle_name_synonyms:
-            for middle_name_synonym in middle_name_synonyms:
-                synonym_dict[middle_name_synonym] = entity_id
+        for middle_name_synonym in middle_name_synonyms:
+            synonym_dict[middle_name_synonym] = entity_id
 
     def get_middle_name_synonyms(self, entity_id: str) -> Set[str]:
-        """
-        For names that include middle names, e.g. "Habern William Archibald Freeman"
-        add the following name variants as synonyms:
-        "Habern Freeman", "Habern W. A. Freeman", "Habern W.A. Freeman", "Habern W A Freeman"
-        """
-        whitelist_types = self.entity_db.get_entity_types(entity_id)
-        middle_name_synonyms = set()
-        if (settings.TYPE_PERSON_QID in whitelist_types or settings.TYPE_FICTIONAL_CHARACTER_QID in whitelist_types) \
-                and settings.TYPE_ORGANIZATION_QID not in whitelist_types:
-            # Don't do this if the entity also has type organization, since sometimes e.g. bands are
-            # of type person and organization and then something like this happens:
-            # The Blackeyed Susans: {'The B. Susans', 'The B Susans', 'The Susans'}
-            entity_name = self.entity_db.get_entity_name(entity_id)
-            name_parts = entity_name.split(" ")
-            if len(name_parts) > 2 and all([n[0].isupper() for n in name_parts if n]):
-                # Don't add name variants if the potential middle names are lowercase,
-                # since this is typically something like
-                # "Karl I of Austria" or "William Howe, 5th Viscount Howe"
-                middle_name_synonyms.add(" ".join([n[0] for n in name_parts[1:-1] if n]) + " ")
-                middle_name_synonyms.add("".join([n[0] + "." for n in name_parts[1:-1] if n]) + " ")
-                middle_name_synonyms.add(" ".join([n[0] + "." for n in name_parts[1:-1] if n]) + " ")
-                middle_name_synonyms.add("")
-                middle_name_synonyms = [name_parts[0] + " " + m + name_parts[-1] for m in middle_name_synonyms]
-        return middle_name_synonyms
+        return get_middle_name_synonyms(self.entity_db, entity_id)
+
+    def is_likely_entity_at_sentence_start(self, start_idx: int, token_index: TokenIndex) -> bool:
+        token = token_index.get_token(start_idx)
+        if token.doc.has_annotation("TAG") and token.doc.has_annotation("DEP"):
+            return is_likely_entity_at_sentence_start(token)
+        decision = self.sentence_start_lexicon.get(token.text)
+        if decision is not None:
+            return decision
+        # The word is ambiguous or unknown. Parse its sentence with the full model.
+        sentence = token_index.get_sentence(start_idx)
+        sentence_doc = self.full_model(sentence.text)
+        sentence_token = TokenIndex(sentence_doc).get_token(start_idx - sentence.start_char)
+        return is_likely_entity_at_sentence_start(sentence_token)
 
     def link_entities(self, article: Article, doc: Optional[Doc] = None):
         if doc is None:
@@ -94,7 +195,7 @@ class HyperlinkReferenceLinker:
 
         entity_links = dict()  # Mapping from mention text to entity ID for entities that are inferred from a hyperlink
         entity_synonyms = dict()  # Mapping from synonym to entity ID
-        covered_positions = set()  # Set of character indices in the text that belong to an already linked mention.
+        covered_positions = SpanCoverage()  # Character positions in the text that belong to an already linked mention
         entity_mentions = []  # List of EntityMentions that are produced by the linker
         bold_title_spans = []  # List of bold title spans as Tuple (start, end) and the article title
 
@@ -114,7 +215,7 @@ class HyperlinkReferenceLinker:
         # Link article hyperlinks to Wikidata ids
         for span, target in bold_title_spans + article.hyperlinks:
             # Overlaps are possible due to possible overlap between link and bold title synonym
-            if is_overlapping_span(covered_positions, (span[0], span[1])):
+            if covered_positions.overlaps((span[0], span[1])):
                 continue
 
             link_text = article.text[span[0]:span[1]]
@@ -140,7 +241,7 @@ class HyperlinkReferenceLinker:
                 while end_idx + 1 < len(article.text) and article.text[end_idx].isalpha():
                     end_idx += 1
 
-                covered_positions.update(range(span[0], end_idx))
+                covered_positions.add((span[0], end_idx))
 
                 entity_mention = EntityMention(span=(span[0], end_idx),
                                                recognized_by=self.LINKER_IDENTIFIER,
@@ -157,22 +258,20 @@ class HyperlinkReferenceLinker:
                 if first_name not in entity_synonyms:
                     entity_synonyms[first_name] = entity_id
 
-        # Link text that has been linked to an entity before, starting with the longest text
-        for link_text, entity_id in sorted(entity_links.items(), key=lambda x: len(x[0]), reverse=True) + \
-                sorted(entity_synonyms.items(), key=lambda x: len(x[0]), reverse=True):
+        # Link text that has been linked to an entity before, starting with the longest text.
+        # The occurrences of all link texts and synonyms are searched in a single pass over the text. Only
+        # occurrences at the beginning of a word are considered, since only those can be linked.
+        reference_texts = sorted(entity_links.items(), key=lambda x: len(x[0]), reverse=True) + \
+            sorted(entity_synonyms.items(), key=lambda x: len(x[0]), reverse=True)
+        matcher = PatternMatcher(link_text for link_text, _ in reference_texts)
+        token_index = get_token_index(doc)
+        sentence_start_decisions = {}  # Mapping from the start of a sentence to whether a mention can start there
+        occurrences = matcher.find_all(article.text, get_word_start_positions(article.text))
+        for link_text, entity_id in reference_texts:
             search_start_idx = 0
-            if not link_text:
-                continue
-            while True:
-                start_idx = article.text.find(link_text, search_start_idx)
-
-                # link text / synonym was not found in remaining article text
-                if start_idx == -1:
-                    break
-
-                # Only add entity if its first character is the beginning of a word
-                if start_idx != 0 and article.text[start_idx - 1].isalpha():
-                    search_start_idx = start_idx + 1
+            for start_idx in occurrences.get(link_text, []):
+                # Occurrence overlaps with the previously found occurrence of the link text
+                if start_idx < search_start_idx:
                     continue
 
                 # Expand entity span to end of word
@@ -190,22 +289,23 @@ class HyperlinkReferenceLinker:
                     continue
 
                 # Check if the found text span does overlap with an already linked entity
-                if is_overlapping_span(covered_positions, (start_idx, end_idx)):
+                if covered_positions.overlaps((start_idx, end_idx)):
                     search_start_idx = end_idx
                     continue
 
                 # Can't rely on case info at sentence start, therefore only link text at sentence start if it is likely
                 # to be an entity judging by its pos tag and dependency tag
-                tok_sent_idx = OffsetConverter.get_token_idx_in_sent(start_idx, doc)
+                tok_sent_idx = token_index.get_token_idx_in_sent(start_idx)
                 if tok_sent_idx == 0 and start_idx != 0 and " " not in link_text:
-                    token = OffsetConverter.get_token(start_idx, doc)
-                    if not token.tag_.startswith("NN") and not token.tag_.startswith("JJ") and \
-                            (not token.dep_.startswith("nsubj") or PronounFinder.is_pronoun(token.text)):
+                    if start_idx not in sentence_start_decisions:
+                        sentence_start_decisions[start_idx] = self.is_likely_entity_at_sentence_start(start_idx,
+                                                                                                     token_index)
+                    if not sentence_start_decisions[start_idx]:
                         search_start_idx = end_idx
                         continue
 
                 # Add text span to entity mentions
-                covered_positions.update(range(start_idx, end_idx))
+                covered_positions.add((start_idx, end_idx))
                 entity_mention = EntityMention(span=(start_idx, end_idx),
                                                recognized_by=self.LINKER_IDENTIFIER,
                                                entity_id=entity_id,
@@ -1,4 +1,5 @@
-from typing import Optional
+from array import array
+from typing import Optional, List
 from spacy.tokens import Doc
 
 from elevant.models.entity_mention import EntityMention
@@ -7,6 +8,40 @@ from elevant.models.article import Article
 from wiki_entity_linker.models.entity_database import EntityDatabase
 
 
+class HyperlinkMentionColumns:
+    """
+    Entity mentions of a batch of articles in columnar form: for each mention, the index of its article
+    in the batch, its start and end offset and the index of its entity ID in a list of distinct entity IDs.
+    EntityMention objects are only created when the mentions are added to the articles.
+    """
+    def __init__(self):
+        self.article_indices = array("i")
+        self.starts = array("i")
+        self.ends = array("i")
+        self.entity_indices = array("i")
+        self.entity_ids = []
+        self.entity_ids: List[str]
+
+    def __len__(self) -> int:
+        return len(self.article_indices)
+
+    def add_to_articles(self, articles: List[Article], linker_identifier: str):
+        """
+        Create the EntityMentions and add them to the articles of the batch.
+        """
+        article_mentions = [[] for _ in articles]
+        for article_index, start, end, entity_index in zip(self.article_indices, self.starts, self.ends,
+                                                            self.entity_indices):
+            entity_id = self.entity_ids[entity_index]
+            article_mentions[article_index].append(EntityMention(span=(start, end),
+                                                                 recognized_by=linker_identifier,
+                                                                 entity_id=entity_id,
+                                                                 linked_by=linker_identifier,
+                                                                 candidates={entity_id}))
+        for article, entity_mentions in zip(articles, article_mentions):
+            article.add_entity_mentions(entity_mentions)
+
+
 class HyperlinksOnlyLinker:
     LINKER_IDENTIFIER = "Hyperlinks Only"
 
@@ -15,14 +50,29 @@ class HyperlinksOnlyLinker:
         self.model = None
 
     def link_entities(self, article: Article, doc: Optional[Doc] = None):
-        entity_mentions = []
-        for span, target in article.hyperlinks:
-            entity_id = self.entity_db.link2id(target)
-            if entity_id:
-                entity_mention = EntityMention(span=span,
-                                               recognized_by=self.LINKER_IDENTIFIER,
-                                               entity_id=entity_id,
-                                               linked_by=self.LINKER_IDENTIFIER,
-                                               candidates={entity_id})
-                entity_mentions.append(entity_mention)
-        article.add_entity_mentions(entity_mentions)
+        self.link_entities_batch([article]).add_to_articles([article], self.LINKER_IDENTIFIER)
+
+    def link_entities_batch(self, articles: List[Article]) -> HyperlinkMentionColumns:
+        """
+        Link the hyperlinks of a batch of articles. Each distinct hyperlink target of the batch is
+        resolved once, with a single bulk lookup in the entity database.
+        The articles are not modified, the mentions are returned in columnar form.
+        """
+        targets = {target for article in articles for _, target in article.hyperlinks}
+        target_entity_ids = self.entity_db.link2ids(targets)
+
+        mentions = HyperlinkMentionColumns()
+        entity_indices = {}
+        for article_index, article in enumerate(articles):
+            for span, target in article.hyperlinks:
+                entity_id = target_entity_ids[target]
+                if not entity_id:
+                    continue
+                if entity_id not in entity_indices:
+                    entity_indices[entity_id] = len(mentions.entity_ids)
+                    mentions.entity_ids.append(entity_id)
+                mentions.article_indices.append(article_index)
+                mentions.starts.append(span[0])
+                mentions.ends.append(span[1])
+                mentions.entity_indices.append(entity_indices[entity_id])
+        return mentions
@@ -14,12 +14,14 @@ class Linkers(Enum):
     TRAINED_MODEL = "trained_model"
     POPULAR_ENTITIES = "popular-entities"
     POS_PRIOR = "pos-prior"
+    PREFIX_TRIE = "prefix-trie"
     NONE = "none"
 
 
 class HyperlinkLinkers(Enum):
     HYPERLINKS_ONLY = "hyperlinks-only"
     HYPERLINK_REFERENCE = "hyperlink-reference"
+    HYPERLINK_REFERENCE_FAST = "hyperlink-reference-fast"
 
 
 class CoreferenceLinkers(Enum):
@@ -1,18 +1,27 @@
-from typing import Optional, Tuple, Set
+import os
+from typing import Optional, Tuple, Set, List, Iterator
 
 import elevant.linkers.linking_system
+from spacy.language import Language
+from spacy.tokens import Doc
 
 from wiki_entity_linker.linkers.linkers import APILinkers
 from elevant.models.article import Article
 from elevant import settings
 
+from wiki_entity_linker.helpers import entity_database_reader
 from wiki_entity_linker.linkers.linkers import Linkers, HyperlinkLinkers, CoreferenceLinkers, PredictionFormats
-from wiki_entity_linker.models.entity_database import EntityDatabase, MappingName
+from wiki_entity_linker.models.entity_database import EntityDatabase, MappingName, DEFAULT_LAZY_CACHE_SIZE
+from wiki_entity_linker.utils.stage_timer import StageTimer, ArticleProfiler
+from wiki_entity_linker.utils.doc_cache import DocCache
+from wiki_entity_linker.utils import snapshot
 
 import logging
 
 logger = logging.getLogger("main." + __name__.split(".")[-1])
 
+DEFAULT_PIPE_BATCH_SIZE = 32  # Number of texts that the spaCy model processes as a single batch
+
 
 class LinkingSystem(elevant.linkers.linking_system.LinkingSystem):
     def __init__(self,
@@ -26,7 +35,13 @@ class LinkingSystem(elevant.linkers.linking_system.LinkingSystem):
                  min_score: Optional[int] = 0,
                  type_mapping_file: Optional[str] = settings.QID_TO_WHITELIST_TYPES_DB,
                  custom_kb: Optional[bool] = False,
-                 api_url: Optional[str] = None):
+                 api_url: Optional[str] = None,
+                 lazy_mappings: Optional[bool] = False,
+                 mapping_cache_size: Optional[int] = DEFAULT_LAZY_CACHE_SIZE):
+        """
+        If lazy_mappings is True, the mappings for which an on-disk database exists are not loaded into memory
+        but queried on demand, with a shared LRU cache of mapping_cache_size bytes (see EntityDatabase).
+        """
         self.linker = None
         self.prediction_reader = None
         self.prediction_name = prediction_name
@@ -38,6 +53,11 @@ class LinkingSystem(elevant.linkers.linking_system.LinkingSystem):
         self.type_mapping_file = type_mapping_file  # Only needed for pure prior linker
         self.linker_config = self.read_linker_config(linker_name, config_path) if linker_name else {}
         self.custom_kb = custom_kb
+        self.stage_timer = StageTimer()
+        self.profiler = None
+        self.doc_cache = None
+        self.lazy_mappings = lazy_mappings
+        self.mapping_cache_size = mapping_cache_size
 
         if (custom_kb and prediction_format and
                 prediction_format not in {PredictionFormats.NIF.value, PredictionFormats.SIMPLE_JSONL.value}):
@@ -53,10 +73,11 @@ class LinkingSystem(elevant.linkers.linking_system.LinkingSystem):
         # Linkers for which to load entities into the entity database, including their types and names.
         # The Wikipedia2Wikidata mapping that might be loaded in _initialize_linker()
         # remains unaffected by this.
-        db_linkers = (Linkers.BASELINE.value, Linkers.POPULAR_ENTITIES.value, Linkers.POS_PRIOR.value)
+        db_linkers = (Linkers.BASELINE.value, Linkers.POPULAR_ENTITIES.value, Linkers.POS_PRIOR.value,
+                      Linkers.PREFIX_TRIE.value)
         db_coref_linkers = (CoreferenceLinkers.KB_COREF.value,)
 
-        self.entity_db = EntityDatabase()
+        self.entity_db = EntityDatabase(lazy=self.lazy_mappings, cache_size=self.mapping_cache_size)
 
         # When a prediction_file is given linker_name is None
         if hyperlink_linker or coref_linker in db_coref_linkers or linker_name in db_linkers:
@@ -128,6 +149,27 @@ class LinkingSystem(elevant.linkers.linking_system.LinkingSystem):
                                         MappingName.NAME_TO_ENTITY_ID})
             self.linker = PopularEntitiesLinker(self.entity_db, self.linker_config)
             self.globally = True
+        elif linker_type == Linkers.PREFIX_TRIE.value:
+            from wiki_entity_linker.linkers.prefix_trie_linker import PrefixTrieLinker
+            from wiki_entity_linker.models.qid_mappings import StringToQidMapping, StringToQidSetMapping
+            from wiki_entity_linker.utils.token_trie import TokenTrie
+            if not TokenTrie.exists(PrefixTrieLinker.get_trie_dir(self.linker_config)):
+                # The name trie has to be built at startup
+                self.load_missing_mappings({MappingName.SITELINKS,
+                                            MappingName.NAME_TO_ENTITY_ID})
+            if not StringToQidMapping.exists(PrefixTrieLinker.get_best_entity_table_dir(self.linker_config)) or \
+                    not StringToQidSetMapping.exists(PrefixTrieLinker.get_candidate_table_dir(self.linker_config)):
+                # The best entity table or the candidate table has to be built at startup
+                self.load_missing_mappings({MappingName.FAMILY_NAME_ALIASES,
+                                            MappingName.WIKIDATA_ALIASES,
+                                            MappingName.ENTITY_ID_TO_ALIAS,
+                                            MappingName.ENTITY_ID_TO_FAMILY_NAME,
+                                            MappingName.DEMONYMS,
+                                            MappingName.SITELINKS,
+                                            MappingName.NAME_TO_ENTITY_ID})
+            self.load_missing_mappings({MappingName.LANGUAGES})
+            self.linker = PrefixTrieLinker(self.entity_db, self.linker_config)
+            self.globally = True
         elif linker_type == PredictionFormats.WIKIFIER.value:
             from elevant.prediction_readers.wikifier_prediction_reader import WikifierPredictionReader
             self.load_missing_mappings({MappingName.WIKIPEDIA_WIKIDATA,
@@ -199,20 +241,26 @@ class LinkingSystem(elevant.linkers.linking_system.LinkingSystem):
     def _initialize_hyperlink_linker(self, linker_type: str):
         logger.info("Initializing link linker %s ..." % linker_type)
         linker_exists = True
-        if linker_type == HyperlinkLinkers.HYPERLINK_REFERENCE.value:
+        if linker_type in (HyperlinkLinkers.HYPERLINK_REFERENCE.value, HyperlinkLinkers.HYPERLINK_REFERENCE_FAST.value):
             from wiki_entity_linker.linkers.hyperlink_reference_linker import HyperlinkReferenceLinker
-            self.load_missing_mappings({MappingName.WIKIPEDIA_WIKIDATA,
-                                        MappingName.REDIRECTS,
-                                        MappingName.ENTITY_ID_TO_ALIAS,
-                                        MappingName.ENTITY_ID_TO_FAMILY_NAME,
-                                        MappingName.NAMES,
-                                        MappingName.TITLE_SYNONYMS,
-                                        MappingName.AKRONYMS})
-            self.hyperlink_linker = HyperlinkReferenceLinker(self.entity_db)
+            fast = linker_type == HyperlinkLinkers.HYPERLINK_REFERENCE_FAST.value
+            if os.path.exists(entity_database_reader.QID_TO_SYNONYM_BUNDLE_DB):
+                # The synonyms of entities are precomputed, the alias mappings are not needed
+                self.load_missing_mappings({MappingName.RESOLVED_LINKS,
+                                            MappingName.NAMES})
+                self.hyperlink_linker = HyperlinkReferenceLinker(
+                    self.entity_db, synonym_bundles_file=entity_database_reader.QID_TO_SYNONYM_BUNDLE_DB, fast=fast)
+            else:
+                self.load_missing_mappings({MappingName.RESOLVED_LINKS,
+                                            MappingName.ENTITY_ID_TO_ALIAS,
+                                            MappingName.ENTITY_ID_TO_FAMILY_NAME,
+                                            MappingName.NAMES,
+                                            MappingName.TITLE_SYNONYMS,
+                                            MappingName.AKRONYMS})
+                self.hyperlink_linker = HyperlinkReferenceLinker(self.entity_db, fast=fast)
         elif linker_type == HyperlinkLinkers.HYPERLINKS_ONLY.value:
             from wiki_entity_linker.linkers.hyperlinks_only_linker import HyperlinksOnlyLinker
-            self.load_missing_mappings({MappingName.WIKIPEDIA_WIKIDATA,
-                                        MappingName.REDIRECTS})
+            self.load_missing_mappings({MappingName.RESOLVED_LINKS})
             self.hyperlink_linker = HyperlinksOnlyLinker(self.entity_db)
         else:
             linker_exists = False
@@ -258,44 +306,218 @@ class LinkingSystem(elevant.linkers.linking_system.LinkingSystem):
         else:
             logger.info("Coref linker type not found or not specified.")
 
+    def get_model(self) -> Optional[Language]:
+        """
+        Return the spaCy model that is used to process articles before they are
+        passed to the linking system components, or None if no component needs one.
+        """
+        if self.linker and self.linker.model:
+            # Processing the text takes a lot of time, so if several components of the linking_system rely on the
+            # processed document, only do this once. However, be aware the models of the different components might
+            # differ slightly or have different pipeline components.
+            return self.linker.model
+        elif self.hyperlink_linker and self.hyperlink_linker.model:
+            return self.hyperlink_linker.model
+        return None
+
+    def __getstate__(self):
+        # Profiler, doc cache and timings belong to a single run and are not part of a snapshot
+        state = self.__dict__.copy()
+        state["profiler"] = None
+        state["doc_cache"] = None
+        state["stage_timer"] = StageTimer()
+        return state
+
+    def save_snapshot(self, directory: str):
+        """
+        Write the fully initialized linking system, including all loaded mappings and models,
+        to the given snapshot directory. See utils/snapshot.py.
+        Linking systems with a prediction reader can't be saved, since the predictions are read from a file
+        as the articles are linked.
+        """
+        if self.prediction_reader or self.coref_prediction_iterator:
+            raise ValueError("A linking system with a prediction reader or coreference predictions can't be saved "
+                             "as a snapshot. Link without --save_snapshot.")
+        description = {"linker": self.linker.__class__.__name__ if self.linker else None,
+                       "prediction_reader": self.prediction_reader.__class__.__name__
+                       if self.prediction_reader else None,
+                       "hyperlink_linker": self.hyperlink_linker.__class__.__name__ if self.hyperlink_linker else None,
+                       "coref_linker": self.coref_linker.__class__.__name__ if self.coref_linker else None,
+                       "linker_config": self.linker_config}
+        snapshot.save_snapshot(self, directory, description)
+
+    @staticmethod
+    def load_snapshot(directory: str) -> "LinkingSystem":
+        """
+        Load a linking system from a snapshot directory written by save_snapshot().
+        """
+        linking_system = snapshot.load_snapshot(directory)
+        logger.info("Linking system components: %s" % snapshot.read_snapshot_meta(directory)["description"])
+        return linking_system
+
+    def is_hyperlinks_only(self) -> bool:
+        """
+        Check if the hyperlink linker is the only component of the linking system and can link entire batches.
+        """
+        return hasattr(self.hyperlink_linker, "link_entities_batch") and not self.linker and \
+            not self.prediction_reader and not self.coref_linker and not self.coref_prediction_iterator and \
+            not self.profiler
+
+    def enable_profiling(self, every_n: int, output_dir: str):
+        """
+        Profile the linking of every n-th article with cProfile and write the profiles to the given directory.
+        """
+        self.profiler = ArticleProfiler(every_n, output_dir)
+
+    def enable_doc_cache(self, cache_dir: str):
+        """
+        Reuse processed docs from the given cache directory instead of processing the article texts with the
+        model again and add newly processed docs to the cache. See DocCache.
+        """
+        model = self.get_model()
+        if model:
+            self.doc_cache = DocCache(cache_dir, model)
+        else:
+            logger.info("No component of the linking system uses a spaCy model. Doc cache is not used.")
+
     def link_entities(self,
                       article: Article,
                       uppercase: Optional[bool] = False,
                       only_pronouns: Optional[bool] = False,
-                      evaluation_span: Optional[Tuple[int, int]] = None):
-        if self.linker and self.linker.model:
-            # This takes a lot of time, so if several components of the linking_system rely on the processed
-            # document, only do this once. However, be aware the models of the different components might
-            # differ slightly or have different pipeline components.
-            doc = self.linker.model(article.text)
-        elif self.hyperlink_linker and self.hyperlink_linker.model:
-            doc = self.hyperlink_linker.model(article.text)
+                      evaluation_span: Optional[Tuple[int, int]] = None,
+                      doc: Optional[Doc] = None):
+        if self.profiler:
+            with self.profiler.profile():
+                self._link_entities(article, uppercase, only_pronouns, evaluation_span, doc)
         else:
-            doc = None
+            self._link_entities(article, uppercase, only_pronouns, evaluation_span, doc)
+
+    def _link_entities(self,
+                       article: Article,
+                       uppercase: bool,
+                       only_pronouns: bool,
+                       evaluation_span: Optional[Tuple[int, int]],
+                       doc: Optional[Doc]):
+        if doc is None:
+            model = self.get_model()
+            if model:
+                with self.stage_timer.measure("parse"):
+                    doc = self.doc_cache.parse(article.text) if self.doc_cache else model(article.text)
 
         if self.hyperlink_linker:
-            self.hyperlink_linker.link_entities(article, doc)
+            with self.stage_timer.measure("hyperlink"):
+                self.hyperlink_linker.link_entities(article, doc)
 
         if self.linker:
-            self.linker.link_entities(article, doc, uppercase=uppercase, globally=self.globally)
+            with self.stage_timer.measure("linker"):
+                self.linker.link_entities(article, doc, uppercase=uppercase, globally=self.globally)
         elif self.prediction_reader:
-            self.prediction_reader.link_entities(article, uppercase=uppercase)
+            with self.stage_timer.measure("linker"):
+                self.prediction_reader.link_entities(article, uppercase=uppercase)
+
+        self._link_coreferences(article, only_pronouns, evaluation_span, doc)
 
+    def _link_coreferences(self,
+                           article: Article,
+                           only_pronouns: bool,
+                           evaluation_span: Optional[Tuple[int, int]],
+                           doc: Optional[Doc]):
         if self.coref_linker:
             coref_eval_span = evaluation_span if evaluation_span else None
-            self.coref_linker.link_entities(article,
-                                            doc,
-                                            only_pronouns=only_pronouns,
-                                            evaluation_span=coref_eval_span)
+            with self.stage_timer.measure("coref"):
+                self.coref_linker.link_entities(article,
+                                                doc,
+                                                only_pronouns=only_pronouns,
+                                                evaluation_span=coref_eval_span)
         elif self.coref_prediction_iterator:
             predicted_coref_entities = next(self.coref_prediction_iterator)
             article.link_entities(predicted_coref_entities, "PREDICTION_READER_COREF", "PREDICTION_READER_COREF")
 
+    def link_entities_batch(self,
+                            articles: List[Article],
+                            uppercase: Optional[bool] = False,
+                            only_pronouns: Optional[bool] = False,
+                            evaluation_spans: Optional[List[Optional[Tuple[int, int]]]] = None,
+                            batch_size: Optional[int] = DEFAULT_PIPE_BATCH_SIZE,
+                            n_process: Optional[int] = 1):
+        """
+        Link entities in a batch of articles.
+        The article texts are processed with a single call to the model's pipe() method which is considerably
+        faster than processing each article separately. The resulting docs are then passed to the hyperlink
+        linker, the linker and the coreference linker in the same way as in link_entities().
+        The articles are modified in place.
+
+        The parse time of an article is the time until its doc is available, so the parse time of
+        an entire pipe batch is recorded for the first article of the batch.
+        If the hyperlinks-only linker is the only component, the entire batch is linked at once. Likewise, if
+        the linker can link batches of articles, each stage is applied to the entire batch before the next one.
+        In both cases, the time of the batch is recorded as the mean time per article for each article of the
+        batch, so all samples of a stage have the same granularity.
+        """
+        if self.is_hyperlinks_only():
+            # No component needs a doc, all hyperlinks of the batch are resolved at once
+            with self.stage_timer.measure("hyperlink", len(articles)):
+                mentions = self.hyperlink_linker.link_entities_batch(articles)
+                mentions.add_to_articles(articles, self.hyperlink_linker.LINKER_IDENTIFIER)
+            return
+
+        model = self.get_model()
+        texts = [article.text for article in articles]
+        if self.doc_cache:
+            docs = self.doc_cache.pipe(texts, batch_size=batch_size, n_process=n_process)
+        elif model:
+            docs = iter(model.pipe(texts, batch_size=batch_size, n_process=n_process))
+        else:
+            docs = None
+
+        if hasattr(self.linker, "link_entities_batch") and not self.profiler:
+            self._link_entities_stagewise(articles, docs, uppercase, only_pronouns, evaluation_spans)
+            return
+
+        for i, article in enumerate(articles):
+            doc = None
+            if docs:
+                with self.stage_timer.measure("parse"):
+                    doc = next(docs)
+            evaluation_span = evaluation_spans[i] if evaluation_spans else None
+            self.link_entities(article, uppercase, only_pronouns, evaluation_span, doc=doc)
+
+    def _link_entities_stagewise(self,
+                                 articles: List[Article],
+                                 docs: Optional[Iterator[Doc]],
+                                 uppercase: bool,
+                                 only_pronouns: bool,
+                                 evaluation_spans: Optional[List[Optional[Tuple[int, int]]]]):
+        """
+        Link a batch of articles stage by stage: the hyperlink linker links each article, then the linker links
+        the entire batch at once and finally the coreference linker links each article.
+        """
+        article_docs = []
+        for article in articles:
+            doc = None
+            if docs:
+                with self.stage_timer.measure("parse"):
+                    doc = next(docs)
+            article_docs.append(doc)
+            if self.hyperlink_linker:
+                with self.stage_timer.measure("hyperlink"):
+                    self.hyperlink_linker.link_entities(article, doc)
+
+        with self.stage_timer.measure("linker", len(articles)):
+            self.linker.link_entities_batch(articles, article_docs, uppercase=uppercase, globally=self.globally)
+
+        for i, (article, doc) in enumerate(zip(articles, article_docs)):
+            evaluation_span = evaluation_spans[i] if evaluation_spans else None
+            self._link_coreferences(article, only_pronouns, evaluation_span, doc)
+
     def load_missing_mappings(self, mappings: Set[MappingName]):
         if MappingName.WIKIPEDIA_WIKIDATA in mappings and not self.entity_db.is_wikipedia_to_wikidata_mapping_loaded():
             self.entity_db.load_wikipedia_to_wikidata_db()
         if MappingName.REDIRECTS in mappings and not self.entity_db.is_redirects_loaded():
             self.entity_db.load_redirects()
+        if MappingName.RESOLVED_LINKS in mappings and not self.entity_db.is_resolved_links_loaded():
+            # Only for components that map link targets with link2id() and don't access the underlying mappings
+            self.entity_db.load_resolved_links()
         if MappingName.LINK_FREQUENCIES in mappings and not self.entity_db.is_link_frequencies_loaded():
             self.entity_db.load_link_frequencies()
 
@@ -0,0 +1,316 @@
+import gc
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+from typing import Iterator, Iterable, List, Tuple, Optional, Callable, Any
+
+import logging
+
+from elevant.models.article import Article
+
+from wiki_entity_linker.linkers.linking_system import LinkingSystem
+from wiki_entity_linker.utils.batching import AdaptiveChunker
+from wiki_entity_linker.utils.stage_timer import StageTimer
+
+
+logger = logging.getLogger("main." + __name__.split(".")[-1])
+
+# The linking system of the worker processes. It is set in the parent process before the workers are forked
+# such that every worker inherits the already loaded linking system instead of loading its own copy.
+_linking_system = None
+_linking_system: Optional[LinkingSystem]
+
+WORKER_CHECK_INTERVAL = 5  # Seconds to wait for a result before checking whether all workers are still alive
+
+
+class ChunkStatistics:
+    """
+    Time a worker spent linking a chunk and the stage timings of the chunk.
+    """
+    def __init__(self, busy_time: float, stage_timer: StageTimer):
+        self.busy_time = busy_time
+        self.stage_timer = stage_timer
+
+
+class WorkerStatistics:
+    def __init__(self, worker_index: int):
+        self.worker_index = worker_index
+        self.n_chunks = 0
+        self.n_articles = 0
+        self.busy_time = 0
+        self.total_time = 0
+        self.max_chunk_time = 0
+        self.stage_timer = StageTimer()
+        self.doc_cache_hits = 0
+        self.doc_cache_misses = 0
+
+    def utilization(self) -> float:
+        return self.busy_time / self.total_time if self.total_time else 0
+
+
+def _worker_loop(worker_index: int,
+                 input_queue: multiprocessing.Queue,
+                 output_queue: multiprocessing.Queue,
+                 decode_line: Callable[[bytes, int], Article],
+                 encode_article: Callable[[Article], bytes],
+                 uppercase: bool,
+                 only_pronouns: bool,
+                 evaluation_span: bool):
+    """
+    Main loop of a worker process: decode a chunk of raw input lines, link the articles and
+    send back the encoded output lines and the statistics of the chunk until the end-of-input marker None is
+    received. Finally, send the worker statistics including the stage timings and doc cache counts with
+    sequence number None.
+    """
+    statistics = WorkerStatistics(worker_index)
+    start = time.time()
+    # The doc cache counts inherited from the parent process are not counted again
+    doc_cache = _linking_system.doc_cache
+    doc_cache_hits = doc_cache.n_hits if doc_cache else 0
+    doc_cache_misses = doc_cache.n_misses if doc_cache else 0
+    while True:
+        task = input_queue.get()
+        if task is None:
+            break
+        chunk_start = time.time()
+        sequence_number, lines, start_index, end_offset = task
+        # Each chunk gets its own stage timer, which is sent along with the chunk
+        _linking_system.stage_timer = StageTimer()
+        try:
+            articles = [decode_line(line, start_index + i) for i, line in enumerate(lines)]
+            evaluation_spans = [article.evaluation_span for article in articles] if evaluation_span else None
+            _linking_system.link_entities_batch(articles, uppercase, only_pronouns, evaluation_spans,
+                                                batch_size=len(articles))
+            output_lines = []
+            for article in articles:
+                with _linking_system.stage_timer.measure("serialization"):
+                    output_lines.append(encode_article(article))
+        except Exception:
+            output_queue.put((sequence_number, None, traceback.format_exc(), None, None))
+            return
+        chunk_time = time.time() - chunk_start
+        statistics.n_chunks += 1
+        statistics.n_articles += len(articles)
+        statistics.busy_time += chunk_time
+        statistics.max_chunk_time = max(statistics.max_chunk_time, chunk_time)
+        statistics.stage_timer.merge(_linking_system.stage_timer)
+        chunk_statistics = ChunkStatistics(chunk_time, _linking_system.stage_timer)
+        output_queue.put((sequence_number, output_lines, articles[-1].id, end_offset, chunk_statistics))
+    statistics.total_time = time.time() - start
+    if doc_cache:
+        statistics.doc_cache_hits = doc_cache.n_hits - doc_cache_hits
+        statistics.doc_cache_misses = doc_cache.n_misses - doc_cache_misses
+    output_queue.put((None, None, statistics, None, None))
+
+
+class LinkingWorkerPool:
+    """
+    Pipeline of worker processes that share a single linking system which is loaded once in the parent process.
+
+    The pipeline consists of three stages that are connected by bounded queues:
+        1) a reader thread in the parent process that puts chunks of raw input lines into the input queue.
+           If the queue is full, reading blocks until a worker takes the next chunk (backpressure).
+           Chunks are sized by the length of the lines, not by their number, and their target size shrinks
+           when the queue runs empty (see AdaptiveChunker). Since idle workers take the next chunk from
+           the shared queue, no worker waits behind a single long article while others have work queued.
+           The number of chunks in flight, i.e. chunks that were read but not yet consumed, is bounded as well,
+           so output chunks that finish while an earlier slow chunk is still being linked don't pile up in the
+           parent process.
+        2) worker processes that decode the input lines, link the articles and encode the linked articles.
+           Only raw byte lines are exchanged with the parent process, no Article objects.
+        3) the consumer of run() in the parent process that receives the encoded chunks in input order.
+
+    The workers are forked from the parent process after the linking system was loaded, so the memory pages of
+    the entity database and the models are shared copy-on-write between all workers. Before forking, all
+    objects are moved to the permanent generation of the garbage collector, such that garbage collection runs
+    in the workers do not write to (and thereby copy) the pages of the linking system.
+    Workers live for the entire lifetime of the pool and are not recycled.
+
+    Usage:
+        with LinkingWorkerPool(linking_system, n_processes, chunker, decode_line, encode_article) as pool:
+            for output_lines, last_article_id, end_offset, chunk_statistics in pool.run(input_lines):
+                ...
+        pool.log_worker_statistics()
+    """
+    def __init__(self,
+                 linking_system: LinkingSystem,
+                 n_processes: int,
+                 chunker: AdaptiveChunker,
+                 decode_line: Callable[[bytes, int], Article],
+                 encode_article: Callable[[Article], bytes],
+                 uppercase: Optional[bool] = False,
+                 only_pronouns: Optional[bool] = False,
+                 queue_size: Optional[int] = None,
+                 evaluation_span: Optional[bool] = False,
+                 max_chunks_in_flight: Optional[int] = None):
+        """
+        If evaluation_span is True, the coreference linker only refers to entities within the evaluation span
+        of each decoded article.
+        By default, as many chunks can be in flight as fit into the input queue, the workers and the output queue.
+        """
+        self.linking_system = linking_system
+        self.n_processes = n_processes
+        self.chunker = chunker
+        self.decode_line = decode_line
+        self.encode_article = encode_article
+        self.uppercase = uppercase
+        self.only_pronouns = only_pronouns
+        self.evaluation_span = evaluation_span
+        self.queue_size = queue_size if queue_size else 2 * n_processes
+        self.max_chunks_in_flight = max_chunks_in_flight if max_chunks_in_flight \
+            else 2 * self.queue_size + n_processes
+        self.chunks_in_flight = None
+        self.context = multiprocessing.get_context("fork")
+        self.input_queue = None
+        self.output_queue = None
+        self.workers = []
+        self.n_chunks = None
+        self.reader_exception = None
+        self.worker_statistics = []
+        self.worker_statistics: List[WorkerStatistics]
+
+    def __enter__(self) -> "LinkingWorkerPool":
+        global _linking_system
+        _linking_system = self.linking_system
+        self.input_queue = self.context.Queue(maxsize=self.queue_size)
+        self.output_queue = self.context.Queue(maxsize=self.queue_size)
+        gc.collect()
+        gc.freeze()
+        for worker_index in range(self.n_processes):
+            worker = self.context.Process(target=_worker_loop,
+                                          args=(worker_index, self.input_queue, self.output_queue, self.decode_line,
+                                                self.encode_article, self.uppercase, self.only_pronouns,
+                                                self.evaluation_span),
+                                          daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        logger.info("Started %d worker processes." % self.n_processes)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self._receive_worker_statistics()
+            # Merge the stage timings and doc cache counts of the workers into the parent's linking system
+            doc_cache = self.linking_system.doc_cache
+            for statistics in self.worker_statistics:
+                self.linking_system.stage_timer.merge(statistics.stage_timer)
+                if doc_cache:
+                    doc_cache.n_hits += statistics.doc_cache_hits
+                    doc_cache.n_misses += statistics.doc_cache_misses
+        else:
+            # Don't block at exit on data that is still buffered for queues nobody reads anymore
+            self.input_queue.cancel_join_thread()
+            self.output_queue.cancel_join_thread()
+        for worker in self.workers:
+            if exc_type is None:
+                worker.join()
+            else:
+                worker.terminate()
+        gc.unfreeze()
+
+    def _receive_worker_statistics(self):
+        """
+        Receive the statistics of the workers that did not send them during run(). Workers that died
+        without sending their statistics are logged instead of waited for.
+        """
+        while len(self.worker_statistics) < len(self.workers):
+            try:
+                _, _, statistics, _, _ = self.output_queue.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                reported = {statistics.worker_index for statistics in self.worker_statistics}
+                missing = [i for i in range(len(self.workers)) if i not in reported]
+                if all(not self.workers[i].is_alive() for i in missing):
+                    logger.warning("No statistics received from workers %s (exit codes %s)."
+                                   % (", ".join(str(i) for i in missing),
+                                      ", ".join(str(self.workers[i].exitcode) for i in missing)))
+                    return
+                continue
+            self.worker_statistics.append(statistics)
+
+    def _input_queue_fill(self) -> Optional[float]:
+        try:
+            return self.input_queue.qsize() / self.queue_size
+        except NotImplementedError:
+            # qsize() is not implemented on some platforms, e.g. macOS
+            return None
+
+    def _read(self,
+              input_lines: Iterable[Tuple[bytes, Tuple[int, int]]],
+              group: Optional[Callable[[Tuple[int, int]], Any]]):
+        """
+        Reader stage: put chunks of input lines into the bounded input queue, followed by one end-of-input
+        marker per worker. A chunk is only put into the queue while fewer chunks than the limit are in flight.
+        """
+        n_chunks = 0
+        try:
+            for chunk in self.chunker.chunks(input_lines, self._input_queue_fill, group):
+                self.chunks_in_flight.acquire()
+                lines = [line for line, _ in chunk]
+                start_index = chunk[0][1][0]
+                end_offset = chunk[-1][1][1]
+                self.input_queue.put((n_chunks, lines, start_index, end_offset))
+                n_chunks += 1
+        except Exception as e:
+            self.reader_exception = e
+        finally:
+            self.n_chunks = n_chunks
+            for _ in self.workers:
+                self.input_queue.put(None)
+
+    def run(self,
+            input_lines: Iterable[Tuple[bytes, Tuple[int, int]]],
+            group: Optional[Callable[[Tuple[int, int]], Any]] = None) \
+            -> Iterator[Tuple[List[bytes], Any, int, ChunkStatistics]]:
+        """
+        Link the articles of the given (raw_line, (line_index, input_offset_after_line)) tuples in the
+        worker processes. Yield (encoded_output_lines, last_article_id, input_offset_after_last_line,
+        chunk_statistics) for each chunk in the order of the input.
+        If group is given, it returns the group of a line for its (line_index, input_offset_after_line) and
+        a chunk never contains lines of different groups, see AdaptiveChunker.
+        """
+        self.chunks_in_flight = threading.Semaphore(self.max_chunks_in_flight)
+        reader = threading.Thread(target=self._read, args=(input_lines, group), daemon=True)
+        reader.start()
+
+        next_sequence_number = 0
+        pending = {}
+        while self.n_chunks is None or next_sequence_number < self.n_chunks:
+            try:
+                sequence_number, output_lines, info, end_offset, chunk_statistics = \
+                    self.output_queue.get(timeout=WORKER_CHECK_INTERVAL)
+            except queue.Empty:
+                if self.reader_exception:
+                    raise self.reader_exception
+                for worker in self.workers:
+                    if worker.exitcode:
+                        raise RuntimeError("Worker process %d died with exit code %d." % (worker.pid, worker.exitcode))
+                continue
+            if sequence_number is None:
+                self.worker_statistics.append(info)
+                continue
+            if output_lines is None:
+                raise RuntimeError("Linking chunk %d failed in a worker process:\n%s" % (sequence_number, info))
+            pending[sequence_number] = output_lines, info, end_offset, chunk_statistics
+            while next_sequence_number in pending:
+                chunk = pending.pop(next_sequence_number)
+                self.chunks_in_flight.release()
+                yield chunk
+                next_sequence_number += 1
+        reader.join()
+        if self.reader_exception:
+            raise self.reader_exception
+
+    def log_worker_statistics(self):
+        """
+        Log the utilization of each worker, i.e. the fraction of its lifetime it spent linking.
+        """
+        for statistics in sorted(self.worker_statistics, key=lambda s: s.worker_index):
+            logger.info("Worker %d: %d chunks, %d articles, busy %.1fs of %.1fs (%.1f%%), longest chunk %.2fs."
+                        % (statistics.worker_index, statistics.n_chunks, statistics.n_articles,
+                           statistics.busy_time, statistics.total_time, statistics.utilization() * 100,
+                           statistics.max_chunk_time))
+        if self.worker_statistics:
+            mean_utilization = sum(s.utilization() for s in self.worker_statistics) / len(self.worker_statistics)
+            logger.info("Mean worker utilization: %.1f%%" % (mean_utilization * 100))
@@ -1,37 +1,141 @@
-from typing import Dict, Tuple, List, Optional, Set, Any
+from typing import Dict, Tuple, List, Optional, Set, Any, Iterator, Sequence
 
 import logging
-import pygtrie
 import spacy
+from spacy.attrs import ORTH
+from spacy.tokenizer import Tokenizer
 from spacy.tokens import Doc
 
-from src.evaluation.groundtruth_label import GroundtruthLabel
-from src.linkers.abstract_entity_linker import AbstractEntityLinker
-from src.models.entity_mention import EntityMention
-from src.models.entity_prediction import EntityPrediction
-from src.ner.maximum_matching_ner import MaximumMatchingNER
-from src.settings import NER_IGNORE_TAGS
-from src.models.entity_database import EntityDatabase
-from src.utils.dates import is_date
-from src import settings
-from src.utils.offset_converter import OffsetConverter
-import src.ner.ner_postprocessing  # import is needed so Python finds the custom factory
-import src.utils.custom_sentencizer  # import is needed so Python finds the custom component
+from elevant.evaluation.groundtruth_label import GroundtruthLabel
+from elevant.models.article import Article
+from elevant.linkers.abstract_entity_linker import AbstractEntityLinker
+from elevant.models.entity_mention import EntityMention
+from elevant.models.entity_prediction import EntityPrediction
+from elevant.ner.maximum_matching_ner import MaximumMatchingNER
+from elevant.settings import NER_IGNORE_TAGS
+from elevant.utils.dates import is_date
+from elevant import settings
+from wiki_entity_linker.helpers import entity_database_reader
+from wiki_entity_linker.models.entity_database import EntityDatabase
+from wiki_entity_linker.models.qid_mappings import get_qid_number, StringToQidMapping, StringToQidSetMapping
+from wiki_entity_linker.utils.span_coverage import SpanCoverage
+from wiki_entity_linker.utils.token_index import get_token_index
+from wiki_entity_linker.utils.token_trie import TokenTrie
+import elevant.ner.ner_postprocessing  # import is needed so Python finds the custom factory
+import elevant.utils.custom_sentencizer  # import is needed so Python finds the custom component
 
 logger = logging.getLogger("main." + __name__.split(".")[-1])
 
+DEFAULT_MIN_SCORE = 15
 
-def overlaps_with_linked_entity(span: Tuple[int, int], linked_entities: Dict[Tuple[int, int], EntityMention]) -> bool:
-    for linked_span in sorted(linked_entities):
-        if linked_span[0] >= span[1]:
-            # linked spans are sorted so we can break the loop as soon as the start
-            # of a already linked span is >= the end of the predicted span
-            return False
-        if linked_span[1] > span[0]:
-            # Start of linked span is smaller than the end of the predicted span and
-            # the end of the linked span is greater than the start of the predicted span
-            return True
-    return False
+LinkedEntities = Dict[Tuple[int, int], EntityMention]
+
+
+def get_name_trie_items(entity_db: EntityDatabase, min_score: int, tokenizer: Tokenizer) \
+        -> Iterator[Tuple[Sequence[int], int]]:
+    """
+    Yield the key and the QID number of the winning entity for each entity name in the entity database.
+    The key of a name is the sequence of the token IDs (token.orth) of its tokens.
+    The winner of a name with several entities is the entity with the highest sitelink count if that count
+    is at least min_score. A name with a single entity is always included.
+    The plural form of each name (the name with an appended "s") is mapped to the same entity, unless the
+    plural form is a name itself.
+    """
+    winners = []
+    for entity_name, qids in entity_db.name_to_entities_db.items():
+        if len(qids) == 1:
+            entity_id = next(iter(qids))
+        else:
+            max_entity = None, min_score - 1
+            for qid in qids:
+                score = entity_db.get_sitelink_count(qid)
+                if score > max_entity[1]:
+                    max_entity = qid, score
+            entity_id = max_entity[0]
+        qid_number = get_qid_number(entity_id) if entity_id else -1
+        if qid_number >= 0:
+            winners.append((entity_name, qid_number))
+
+    # Later items overwrite earlier ones, so plural forms are yielded first
+    plurals = (entity_name + "s" for entity_name, _ in winners)
+    for doc, (_, qid_number) in zip(tokenizer.pipe(plurals, batch_size=10000), winners):
+        yield doc.to_array(ORTH), qid_number
+    names = (entity_name for entity_name, _ in winners)
+    for doc, (_, qid_number) in zip(tokenizer.pipe(names, batch_size=10000), winners):
+        yield doc.to_array(ORTH), qid_number
+
+
+def select_entity(entity_db: EntityDatabase,
+                  name_and_demonym_candidates: Set[str],
+                  candidates: Set[str],
+                  min_score: int) -> Optional[str]:
+    """
+    Select the entity from the set of candidates that has the highest sitelink count.
+    If none of the entities has a sitelink count >= min_score return None.
+    """
+    highest_sitelink_count_entity = None
+    highest_sitelink_count = 0
+    # Sort for reproducibility. Names and demonyms are preferred over aliases with same sitelink count
+    for entity_id in sorted(name_and_demonym_candidates) + sorted(candidates):
+        sitelink_count = entity_db.get_sitelink_count(entity_id)
+        if sitelink_count >= min_score and sitelink_count > highest_sitelink_count:
+            highest_sitelink_count_entity = entity_id
+            highest_sitelink_count = sitelink_count
+    return highest_sitelink_count_entity
+
+
+def get_uppercase_aliases(entity_db: EntityDatabase) -> List[str]:
+    """
+    Return all entity names, aliases, family names and demonyms that contain uppercase letters, sorted.
+    Lowercase snippets are not linked to named entities.
+    """
+    aliases = set(entity_db.name_to_entities_db)
+    aliases.update(entity_db.demonyms)
+    for entity_aliases in entity_db.entity_to_aliases_db.values():
+        aliases.update(entity_aliases)
+    aliases.update(entity_db.entity_to_family_name.values())
+    return sorted(alias for alias in aliases if not alias.islower())
+
+
+def get_alias_candidates(entity_db: EntityDatabase, alias: str) -> Tuple[Set[str], Set[str]]:
+    """
+    Return the entities whose name matches the alias or which belong to the alias as a demonym, and the
+    candidates of the alias.
+    """
+    name_and_demonym_candidates = set()
+    if entity_db.contains_entity_name(alias):
+        name_and_demonym_candidates.update(entity_db.get_entities_by_name(alias))
+    if entity_db.is_demonym(alias):
+        # Countries are preferred automatically, since they generally have
+        # a higher sitelink count than languages or ethnicities
+        name_and_demonym_candidates.update(entity_db.get_entities_for_demonym(alias))
+    candidates = set(entity_db.get_candidates(alias))
+    return name_and_demonym_candidates, candidates
+
+
+def get_best_entity_items(entity_db: EntityDatabase, min_score: int) -> Iterator[Tuple[str, str]]:
+    """
+    Yield each entity name, alias, family name and demonym that contains uppercase letters together with its
+    best entity as selected by select_entity(), if there is one.
+    Entities whose name matches the snippet and the entities of a demonym are preferred over entities
+    with a matching alias.
+    """
+    for alias in get_uppercase_aliases(entity_db):
+        name_and_demonym_candidates, candidates = get_alias_candidates(entity_db, alias)
+        entity_id = select_entity(entity_db, name_and_demonym_candidates, candidates, min_score)
+        if entity_id:
+            yield alias, entity_id
+
+
+def get_alias_candidate_items(entity_db: EntityDatabase) -> Iterator[Tuple[str, str]]:
+    """
+    Yield each entity name, alias, family name and demonym that contains uppercase letters together with
+    each of its candidate entities, i.e. its candidates and the entities of its name or demonym.
+    """
+    for alias in get_uppercase_aliases(entity_db):
+        name_and_demonym_candidates, candidates = get_alias_candidates(entity_db, alias)
+        for entity_id in sorted(candidates | name_and_demonym_candidates):
+            yield alias, entity_id
 
 
 class PrefixTrieLinker(AbstractEntityLinker):
@@ -40,7 +144,7 @@ class PrefixTrieLinker(AbstractEntityLinker):
 
         # Get config variables
         self.linker_identifier = config["linker_name"] if "linker_name" in config else "Popular Entities"
-        self.min_score = config["min_score"] if "min_score" in config else 15
+        self.min_score = config["min_score"] if "min_score" in config else DEFAULT_MIN_SCORE
         self.longest_alias_ner = config["longest_alias_ner"] if "longest_alias_ner" in config else False
         self.ner_identifier = "LongestAliasNER" if self.longest_alias_ner else "EnhancedSpacy"
 
@@ -51,25 +155,59 @@ class PrefixTrieLinker(AbstractEntityLinker):
         self.model.add_pipe("custom_sentencizer", before="parser")
         self.model.add_pipe("ner_postprocessor", after="ner")
 
-        # Create a prefix trie to speed up lowercase entity detection
-        logger.info("Building prefix trie for detection of entities...")
-        self.trie = pygtrie.StringTrie(separator=" ")
-        for i, (entity_name, qids) in enumerate(entity_db.name_to_entities_db.items()):
-            if entity_name == "United States of America":
-                print(f"Found {len(qids)} entities for United States of America")
-            if len(qids) == 1:
-                self.trie[entity_name] = qids.pop()
-            else:
-                max_entity = None, self.min_score - 1
-                for qid in qids:
-                    score = entity_db.get_sitelink_count(qid)
-                    if score > max_entity[1]:
-                        max_entity = qid, score
-                if max_entity[0]:
-                    self.trie[entity_name] = max_entity[0]
-                    if entity_name == "United States of America":
-                        print(f"Added USA to trie with score {max_entity[1]}")
-        logger.info(f"Built prefix trie with {len(self.trie)} entities.")
+        # Whether an entity found in the prefix trie is linked, for each entity found so far
+        self.entity_decisions = {}
+        self.entity_decisions: Dict[str, bool]
+
+        # The prefix trie to speed up lowercase entity detection is built offline by scripts/create_name_trie.py
+        trie_dir = self.get_trie_dir(config)
+        if TokenTrie.exists(trie_dir):
+            self.trie = TokenTrie.load(trie_dir)
+        else:
+            logger.info("Name trie %s not found. Building prefix trie for detection of entities..." % trie_dir)
+            self.trie = TokenTrie.from_items(get_name_trie_items(entity_db, self.min_score, self.model.tokenizer))
+            logger.info(f"Built prefix trie with {len(self.trie)} entities.")
+
+        # The best entity of each snippet that is recognized by the NER component is precomputed offline by
+        # scripts/create_best_entity_table.py
+        table_dir = self.get_best_entity_table_dir(config)
+        if StringToQidMapping.exists(table_dir):
+            self.best_entities = StringToQidMapping.load(table_dir)
+        else:
+            logger.info("Best entity table %s not found. Selecting the best entity of each alias..." % table_dir)
+            self.best_entities = StringToQidMapping.from_pairs(get_best_entity_items(entity_db, self.min_score))
+            logger.info(f"Selected the best entity of {len(self.best_entities)} aliases.")
+
+        # The candidates of each snippet, which are part of the predictions, are collected offline by
+        # scripts/create_best_entity_table.py as well
+        candidate_table_dir = self.get_candidate_table_dir(config)
+        if StringToQidSetMapping.exists(candidate_table_dir):
+            self.alias_candidates = StringToQidSetMapping.load(candidate_table_dir)
+        else:
+            logger.info("Candidate table %s not found. Collecting the candidates of each alias..."
+                        % candidate_table_dir)
+            self.alias_candidates = StringToQidSetMapping.from_pairs(get_alias_candidate_items(entity_db))
+            logger.info(f"Collected the candidates of {len(self.alias_candidates)} aliases.")
+
+    @staticmethod
+    def get_trie_dir(config: Dict[str, Any]) -> str:
+        if "name_trie" in config:
+            return config["name_trie"]
+        min_score = config["min_score"] if "min_score" in config else DEFAULT_MIN_SCORE
+        return entity_database_reader.NAME_TRIE_DIR % min_score
+
+    @staticmethod
+    def get_best_entity_table_dir(config: Dict[str, Any]) -> str:
+        if "best_entity_table" in config:
+            return config["best_entity_table"]
+        min_score = config["min_score"] if "min_score" in config else DEFAULT_MIN_SCORE
+        return entity_database_reader.BEST_ENTITY_TABLE_DIR % min_score
+
+    @staticmethod
+    def get_candidate_table_dir(config: Dict[str, Any]) -> str:
+        if "candidate_table" in config:
+            return config["candidate_table"]
+        return entity_database_reader.CANDIDATE_TABLE_DIR
 
     def entity_spans(self, text: str, doc: Optional[Doc]) -> List[Tuple[Tuple[int, int], bool, bool]]:
         """
@@ -79,13 +217,14 @@ class PrefixTrieLinker(AbstractEntityLinker):
         if self.longest_alias_ner:
             # Use own longest-alias-NER
             original_spans = self.ner.entity_mentions(text)
+            token_index = get_token_index(doc)
             for span in original_spans:
                 is_language = False
                 snippet = text[span[0]:span[1]]
                 if snippet.islower():
                     # Non-named entities are handled in get_lowercase_predictions
                     continue
-                token = OffsetConverter.get_token(span[0], doc)
+                token = token_index.get_token(span[0])
                 if self.entity_db.is_language(snippet) and token.dep_ == "pobj" and span[0] >= 3 and\
                         text[span[0] - 3:span[0] - 1].lower() == "in":
                     is_language = True
@@ -107,6 +246,53 @@ class PrefixTrieLinker(AbstractEntityLinker):
                 uppercase: Optional[bool] = False) -> Dict[Tuple[int, int], EntityPrediction]:
         return self.predict_globally(text, doc, uppercase, None)
 
+    def link_entities_batch(self,
+                            articles: List[Article],
+                            docs: List[Optional[Doc]],
+                            uppercase: Optional[bool] = False,
+                            globally: Optional[bool] = False):
+        """
+        Link entities in a batch of articles, like link_entities() for each article.
+        """
+        texts = [article.text for article in articles]
+        linked_entities_batch = [article.entity_mentions if globally else None for article in articles]
+        predictions_batch = self.predict_globally_batch(texts, docs, uppercase, linked_entities_batch)
+        for article, predictions in zip(articles, predictions_batch):
+            article.link_entities(predictions, self.ner_identifier, self.linker_identifier)
+
+    def predict_globally_batch(self,
+                               texts: List[str],
+                               docs: List[Optional[Doc]],
+                               uppercase: Optional[bool] = False,
+                               linked_entities_batch: Optional[List[Optional[LinkedEntities]]] = None) \
+            -> List[Dict[Tuple[int, int], EntityPrediction]]:
+        """
+        Predict entities in a batch of texts, like predict_globally() for each text.
+        The matches of all texts are collected first, so that the entity types of each distinct matched entity
+        are only looked up once. Whether an entity is linked is remembered for the entire run.
+        """
+        missing_doc_indices = [i for i, doc in enumerate(docs) if doc is None]
+        if missing_doc_indices:
+            docs = list(docs)
+            for i, doc in zip(missing_doc_indices, self.model.pipe(texts[i] for i in missing_doc_indices)):
+                docs[i] = doc
+        if linked_entities_batch is None:
+            linked_entities_batch = [None] * len(texts)
+
+        predictions_batch = []
+        matches = []
+        for text_index, (text, doc, linked_entities) in enumerate(zip(texts, docs, linked_entities_batch)):
+            linked_positions = SpanCoverage(linked_entities)
+            predictions_batch.append(self.get_uppercase_predictions(text, doc, linked_positions))
+            matches.extend((text_index, span, entity_id)
+                           for span, entity_id in self.get_lowercase_matches(linked_positions, doc))
+        self.resolve_entity_decisions({entity_id for _, _, entity_id in matches})
+
+        for text_index, span, entity_id in matches:
+            if self.entity_decisions[entity_id]:
+                predictions_batch[text_index][span] = EntityPrediction(span, entity_id, {entity_id})
+        return predictions_batch
+
     def predict_globally(self,
                          text: str,
                          doc: Optional[Doc] = None,
@@ -115,12 +301,23 @@ class PrefixTrieLinker(AbstractEntityLinker):
             -> Dict[Tuple[int, int], EntityPrediction]:
         if doc is None:
             doc = self.model(text)
-        predictions = {}
+        linked_positions = SpanCoverage(linked_entities)
+        predictions = self.get_uppercase_predictions(text, doc, linked_positions)
+        predictions.update(self.get_lowercase_predictions(linked_positions, doc))
+        return predictions
+
+    def get_uppercase_predictions(self, text: str, doc: Doc, linked_positions: SpanCoverage) \
+            -> Dict[Tuple[int, int], EntityPrediction]:
         """
+        Link the named entities recognized by the NER component. The best entity of each snippet is looked up
+        in the best entity table, see get_best_entity_items(), and its candidates in the candidate table,
+        see get_alias_candidate_items().
+        """
+        predictions = {}
         unknown_person_name_parts = set()
         prediction_cache = {}
         for span, is_language, is_person in self.entity_spans(text, doc):
-            if linked_entities and overlaps_with_linked_entity(span, linked_entities):
+            if linked_positions.overlaps(span):
                 continue
             snippet = text[span[0]:span[1]]
             if snippet in prediction_cache:
@@ -140,25 +337,14 @@ class PrefixTrieLinker(AbstractEntityLinker):
                 # Don't link parts of a person entity that was linked to unknown before
                 continue
 
-            candidates = set()
-            name_and_demonym_candidates = set()
             if is_language and self.entity_db.is_language(snippet):
                 # If NER component determined mention is a language, link to language if it
                 # exists in the database
                 entity_id = self.entity_db.get_entity_for_language(snippet)
+                candidates = set()
             else:
-                if self.entity_db.contains_entity_name(snippet):
-                    # Prefer entities where the name matches the mention instead of some alias
-                    name_and_demonym_candidates = self.entity_db.get_entities_by_name(snippet)
-                if self.entity_db.is_demonym(snippet):
-                    # If mention is a demonym, add corresponding entity to candidates
-                    # Countries are preferred automatically, since they generally have
-                    # a higher sitelink count than languages or ethnicities
-                    demonym_entities = self.entity_db.get_entities_for_demonym(snippet)
-                    name_and_demonym_candidates.update(demonym_entities)
-                candidates = self.entity_db.get_candidates(snippet)
-                entity_id = self.select_entity(name_and_demonym_candidates, candidates)
-            candidates.update(name_and_demonym_candidates)
+                entity_id = self.best_entities.get(snippet)
+                candidates = self.alias_candidates.get(snippet, set())
             predictions[span] = EntityPrediction(span, entity_id, candidates)
             prediction_cache[snippet] = (entity_id, candidates, is_language, is_person)
 
@@ -169,51 +355,44 @@ class PrefixTrieLinker(AbstractEntityLinker):
                 last_name = snippet.split()[-1]
                 unknown_person_name_parts.add(first_name)
                 unknown_person_name_parts.add(last_name)
-        """
-        predictions.update(self.get_lowercase_predictions(linked_entities, doc, text))
         return predictions
 
-    def get_lowercase_predictions(self, linked_entities, doc, text):
-        lowercase_predictions = {}
+    def get_lowercase_predictions(self, linked_positions: SpanCoverage, doc: Doc) \
+            -> Dict[Tuple[int, int], EntityPrediction]:
+        matches = self.get_lowercase_matches(linked_positions, doc)
+        self.resolve_entity_decisions({entity_id for _, entity_id in matches})
+        return {span: EntityPrediction(span, entity_id, {entity_id}) for span, entity_id in matches
+                if self.entity_decisions[entity_id]}
+
+    def get_lowercase_matches(self, linked_positions: SpanCoverage, doc: Doc) -> List[Tuple[Tuple[int, int], str]]:
+        """
+        Find the spans of non-named entities in the doc and the entity of each span.
+        Whether an entity is actually linked is determined afterwards by its types, see resolve_entity_decisions().
+        """
+        matches = []
+        # The longest name that starts at each token, found for all tokens at once
+        qid_numbers, ends = self.trie.find_longest_matches(doc.to_array(ORTH))
+        qid_numbers = qid_numbers.tolist()
+        ends = ends.tolist()
         i = 0
         while i < len(doc):
+            qid_number = qid_numbers[i]
+            if qid_number < 0:
+                i += 1
+                continue
+
             tok = doc[i]
             if tok.is_stop or tok.is_punct:
                 # First word of a non-named entity cannot be a stopword or punctuation
                 i += 1
                 continue
 
-            span_end = tok.idx + len(tok.text)
-            snippet = text[tok.idx:span_end]
-            last_snippet_in_trie = None
-            last_snippet_in_trie_j = -1
-            j = i + 1
-
-            while self.trie.has_subtrie(snippet) and j < len(doc):
-                new_tok = doc[j]
-                new_span_end = new_tok.idx + len(new_tok.text)
-                if self.is_snippet_variant_in_trie(snippet):
-                    last_snippet_in_trie = snippet
-                    last_snippet_in_trie_j = j
-                snippet += text[span_end:new_span_end]
-                span_end = new_span_end
-                j += 1
-            if self.is_snippet_variant_in_trie(snippet):
-                # has_subtrie(snippet) is False if the only key with the prefix snippet
-                # is snippet, so I need this check here
-                entity_id = self.get_entity_from_trie(snippet)
-            elif last_snippet_in_trie is not None:
-                entity_id = self.get_entity_from_trie(last_snippet_in_trie)
-                snippet = last_snippet_in_trie
-                j = last_snippet_in_trie_j
-            else:
-                i += 1
-                continue
+            j = ends[i]
 
-            span = tok.idx, tok.idx + len(snippet)
+            span = tok.idx, doc[j - 1].idx + len(doc[j - 1].text)
             tokens = [t for t in doc[i:j]]
 
-            if overlaps_with_linked_entity(span, linked_entities):
+            if linked_positions.overlaps(span):
                 i += 1
                 continue
 
@@ -222,42 +401,24 @@ class PrefixTrieLinker(AbstractEntityLinker):
                 i += 1
                 continue
 
-            if self.entity_db.get_entity_types(entity_id) != [GroundtruthLabel.OTHER]:
-                # This is not the same as simply excluding these entities from the prefix trie.
-                # This way, entities are skipped if they exist, but don't have the correct type
-                # or required min score. Otherwise, parts of the entity could be linked.
-                lowercase_predictions[span] = EntityPrediction(span, entity_id, {entity_id})
+            matches.append((span, "Q%d" % qid_number))
             i = j + 1
-        return lowercase_predictions
-
-    def is_snippet_variant_in_trie(self, snippet: str) -> bool:
-        """
-        Returns true if the snippet or a potential singular form of it is in
-        the trie.
-        """
-        return snippet in self.trie or (snippet[-1] == "s" and snippet[:-1] in self.trie)
+        return matches
 
-    def get_entity_from_trie(self, snippet: str) -> str:
+    def resolve_entity_decisions(self, entity_ids: Set[str]):
         """
-        Returns the entity ID for the given snippet (or its singular form)
-        from the trie
+        Decide for each of the given entities whether it is linked, if it was not decided before.
+        This is not the same as simply excluding these entities from the prefix trie.
+        This way, entities are skipped if they exist, but don't have the correct type
+        or required min score. Otherwise, parts of the entity could be linked.
         """
-        return self.trie[snippet] if snippet in self.trie else self.trie[snippet[:-1]]
+        for entity_id in entity_ids:
+            if entity_id not in self.entity_decisions:
+                self.entity_decisions[entity_id] = self.entity_db.get_entity_types(entity_id) != \
+                                                   [GroundtruthLabel.OTHER]
 
-    def select_entity(self, name_and_demonym_candidates: Set[str], candidates: Set[str]) -> str:
-        """
-        Select the entity from the set of candidates that has the highest sitelink count.
-        If none of the entities has a sitelink count > self.min_score return None.
-        """
-        highest_sitelink_count_entity = None
-        highest_sitelink_count = 0
-        # Sort for reproducibility. Names and demonyms are preferred over aliases with same sitelink count
-        for entity_id in sorted(name_and_demonym_candidates) + sorted(candidates):
-            sitelink_count = self.entity_db.get_sitelink_count(entity_id)
-            if sitelink_count >= self.min_score and sitelink_count > highest_sitelink_count:
-                highest_sitelink_count_entity = entity_id
-                highest_sitelink_count = sitelink_count
-        return highest_sitelink_count_entity
+    def select_entity(self, name_and_demonym_candidates: Set[str], candidates: Set[str]) -> Optional[str]:
+        return select_entity(self.entity_db, name_and_demonym_candidates, candidates, self.min_score)
 
     def has_entity(self, entity_id: str) -> bool:
         return self.entity_db.contains_entity(entity_id)
@@ -9,6 +9,7 @@ from spacy.vocab import Vocab
 from spacy.kb import KnowledgeBase, Candidate
 
 from elevant.linkers.abstract_entity_linker import AbstractEntityLinker
+from elevant.models.article import Article
 from elevant.models.entity_mention import EntityMention
 from elevant.models.entity_prediction import EntityPrediction
 from elevant.settings import NER_IGNORE_TAGS
@@ -19,10 +20,13 @@ from elevant import settings
 from wiki_entity_linker.models.neural_net import NeuralNet
 from wiki_entity_linker.utils.embeddings_extractor import EmbeddingsExtractor
 from wiki_entity_linker.models.entity_database import EntityDatabase
+from wiki_entity_linker.utils.token_index import get_token_index
 
 
 logger = logging.getLogger("main." + __name__.split(".")[-1])
 
+LinkedEntities = Dict[Tuple[int, int], EntityMention]
+
 
 class TrainedEntityLinker(AbstractEntityLinker):
     def __init__(self, entity_database: EntityDatabase, config: Dict[str, Any]):
@@ -85,62 +89,125 @@ class TrainedEntityLinker(AbstractEntityLinker):
                          doc: Optional[Doc] = None,
                          uppercase: Optional[bool] = False,
                          linked_entities: Optional[Dict[Tuple[int, int], EntityMention]] = None) -> Dict[Tuple[int, int], EntityPrediction]:
-        if doc is None:
-            doc = self.model(text)
-        predictions = {}
-        for ent in doc.ents:
-            if ent.label_ in NER_IGNORE_TAGS:
-                continue
-            span = (ent.start_char, ent.end_char)
-            snippet = text[span[0]:span[1]]
-            candidates = self.kb.get_candidates(snippet)
-            if not candidates:
-                continue
-            x = self.get_model_input(span, candidates, doc, linked_entities)
-            prediction = self.linker_model(x)
-            entity_idx = torch.argmax(prediction).item()
+        return self.predict_globally_batch([text], [doc], uppercase, [linked_entities])[0]
+
+    def link_entities_batch(self,
+                            articles: List[Article],
+                            docs: List[Optional[Doc]],
+                            uppercase: Optional[bool] = False,
+                            globally: Optional[bool] = False):
+        """
+        Link entities in a batch of articles, like link_entities() for each article.
+        """
+        texts = [article.text for article in articles]
+        linked_entities_batch = [article.entity_mentions if globally else None for article in articles]
+        predictions_batch = self.predict_globally_batch(texts, docs, uppercase, linked_entities_batch)
+        for article, predictions in zip(articles, predictions_batch):
+            article.link_entities(predictions, self.ner_identifier, self.linker_identifier)
+
+    def predict_globally_batch(self,
+                               texts: List[str],
+                               docs: List[Optional[Doc]],
+                               uppercase: Optional[bool] = False,
+                               linked_entities_batch: Optional[List[Optional[LinkedEntities]]] = None) \
+            -> List[Dict[Tuple[int, int], EntityPrediction]]:
+        """
+        Predict entities in a batch of texts, like predict_globally() for each text.
+        The candidates of all mentions in the batch are scored with a single forward pass of the linker model.
+        """
+        missing_doc_indices = [i for i, doc in enumerate(docs) if doc is None]
+        if missing_doc_indices:
+            docs = list(docs)
+            for i, doc in zip(missing_doc_indices, self.model.pipe(texts[i] for i in missing_doc_indices)):
+                docs[i] = doc
+        if linked_entities_batch is None:
+            linked_entities_batch = [None] * len(texts)
+
+        mentions = []
+        for text_index, (text, doc) in enumerate(zip(texts, docs)):
+            for ent in doc.ents:
+                if ent.label_ in NER_IGNORE_TAGS:
+                    continue
+                span = (ent.start_char, ent.end_char)
+                snippet = text[span[0]:span[1]]
+                if uppercase and snippet.islower():
+                    continue
+                if is_date(snippet):
+                    continue
+                candidates = self.kb.get_candidates(snippet)
+                if not candidates:
+                    continue
+                mentions.append((text_index, span, candidates))
+
+        predictions_batch = [{} for _ in texts]
+        if not mentions:
+            return predictions_batch
+
+        x, offsets = self.get_model_input(mentions, docs, linked_entities_batch)
+        with torch.inference_mode():
+            scores = self.linker_model(x)
+        for i, (text_index, span, candidates) in enumerate(mentions):
+            entity_idx = torch.argmax(scores[offsets[i]:offsets[i + 1]]).item()
             entity_id = candidates[entity_idx].entity_
-            if uppercase and snippet.islower():
-                continue
-            if is_date(snippet):
-                continue
-            candidates = {cand.entity_ for cand in candidates}
-            predictions[span] = EntityPrediction(span, entity_id, candidates)
-        return predictions
+            candidate_ids = {cand.entity_ for cand in candidates}
+            predictions_batch[text_index][span] = EntityPrediction(span, entity_id, candidate_ids)
+        return predictions_batch
 
     def get_model_input(self,
-                        span: Tuple[int, int],
-                        candidates: List[Candidate],
-                        doc: Doc,
-                        linked_entities: Optional[Dict[Tuple[int, int], EntityMention]] = None) -> torch.Tensor:
+                        mentions: List[Tuple[int, Tuple[int, int], List[Candidate]]],
+                        docs: List[Doc],
+                        linked_entities_batch: List[Optional[LinkedEntities]]) -> Tuple[torch.Tensor, List[int]]:
         """
-        Returns the input tensor for the trained model.
+        Returns the input tensor for the trained model with one row per candidate of each of the given
+        (text index, span, candidates) mentions, and the segment offsets of the mentions: the rows of the
+        i-th mention are located between offsets[i] and offsets[i + 1].
         """
-        # Get sentence vector
-        sentence_vector = self.embedding_extractor.get_sentence_vector(span, doc)
-
-        # Create empty input tensor
-        n_features = self.determine_n_features(sentence_vector.shape[1])
-        x = torch.empty(size=(len(candidates), n_features))
-
+        # Get sentence vectors. Mentions in the same sentence share the sentence vector.
+        sentence_vectors = {}
+        mention_sentence_vectors = []
+        for text_index, span, _ in mentions:
+            key = text_index, get_token_index(docs[text_index]).get_sentence(span[0]).start_char
+            if key not in sentence_vectors:
+                sentence_vectors[key] = self.embedding_extractor.get_sentence_vector(span, docs[text_index])
+            mention_sentence_vectors.append(sentence_vectors[key])
+
+        global_entity_vectors = {}
         if self.global_model:
-            if linked_entities:
-                linked_entity_ids = [em.entity_id for span, em in sorted(linked_entities.items())]
-            else:
-                linked_entity_ids = []
-            global_entity_vector = self.embedding_extractor.get_global_entity_vector(linked_entity_ids)
+            # The mean vector of the already linked entities is the same for all mentions of a text
+            for text_index in {text_index for text_index, _, _ in mentions}:
+                linked_entities = linked_entities_batch[text_index]
+                if linked_entities:
+                    linked_entity_ids = [em.entity_id for span, em in sorted(linked_entities.items())]
+                else:
+                    linked_entity_ids = []
+                global_entity_vectors[text_index] = \
+                    self.embedding_extractor.get_global_entity_vector(linked_entity_ids)
+
+        offsets = [0]
+        for _, _, candidates in mentions:
+            offsets.append(offsets[-1] + len(candidates))
+
+        # Create a single empty input tensor for the candidates of all mentions. The features of a candidate are
+        # the sentence vector, the entity vector, the global entity vector (optional) and the prior (optional).
+        token_vector_length = mention_sentence_vectors[0].shape[1]
+        n_features = self.determine_n_features(token_vector_length)
+        x = torch.empty(size=(offsets[-1], n_features))
+        entity_start = token_vector_length
+        global_start = entity_start + self.entity_vector_length
+        prior_column = n_features - 1
 
         # Build input data
-        for i, cand in enumerate(candidates):
-            entity_vector = self.embedding_extractor.get_entity_vector(cand.entity_)
-
-            input_vector = torch.cat((sentence_vector, entity_vector), dim=1)
+        for i, (text_index, span, candidates) in enumerate(mentions):
+            start, end = offsets[i], offsets[i + 1]
+            x[start:end, :entity_start] = mention_sentence_vectors[i]
+            x[start:end, entity_start:global_start] = \
+                torch.cat([self.embedding_extractor.get_entity_vector(cand.entity_) for cand in candidates])
             if self.global_model:
-                input_vector = torch.cat((input_vector, global_entity_vector), dim=1)
+                x[start:end, global_start:global_start + self.entity_vector_length] = \
+                    global_entity_vectors[text_index]
             if self.prior:
-                input_vector = torch.cat((input_vector, torch.Tensor([[cand.prior_prob]])), dim=1)
-            x[i] = input_vector
-        return x
+                x[start:end, prior_column] = torch.tensor([cand.prior_prob for cand in candidates])
+        return x, offsets
 
     def determine_n_features(self, token_vector_length: int) -> int:
         """
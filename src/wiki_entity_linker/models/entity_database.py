@@ -1,14 +1,21 @@
+import os
 from enum import Enum
-from typing import Dict, Set,Optional, Any
+from typing import Dict, Set, Optional, Any, Iterable, Union, Iterator, Tuple
 
 import logging
 
 import elevant.models.entity_database
 
+from wiki_entity_linker.helpers import entity_database_reader
 from wiki_entity_linker.helpers.entity_database_reader import EntityDatabaseReader
+from wiki_entity_linker.models.qid_mappings import QidToStringMapping, QidToStringSetMapping
+from wiki_entity_linker.models.lazy_database import LazyDatabase, LRUCache
 
 logger = logging.getLogger("main." + __name__.split(".")[-1])
 
+DEFAULT_LAZY_CACHE_SIZE = 2 * 1024 ** 3  # Memory budget in bytes for values cached from lazily loaded mappings
+RESOLVED_LINKS_CACHE_SIZE = 256 * 1024 ** 2  # Memory budget in bytes for resolved links cached in non-lazy mode
+
 
 class MappingName(Enum):
     WIKIDATA_ALIASES = "wikidata_aliases"
@@ -22,6 +29,7 @@ class MappingName(Enum):
     REDIRECTS = "redirects"
     LINK_FREQUENCIES = "link_frequencies"
     NAMES = "names"
+    RESOLVED_LINKS = "resolved_links"
     GENDER = "gender"
     COREFERENCE_TYPES = "coreference_types"
     LANGUAGES = "languages"
@@ -46,42 +54,204 @@ class LoadedInfo:
         self.info = info
 
 
+def parse_semicolon_separated_values(value: str) -> Set[str]:
+    return set(value.split(";"))
+
+
+def parse_tab_separated_values(value: str) -> Set[str]:
+    return set(value.split("\t"))
+
+
+def get_given_names(human_names: Iterable[Tuple[str, str]]) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (entity ID, given name) for each name that consists of several words. The given name is the first word.
+    Given names of a single character are skipped.
+    """
+    for entity_id, name in human_names:
+        if " " in name:
+            given_name = name.split()[0]
+            if len(given_name) > 1:
+                yield entity_id, given_name
+
+
 class EntityDatabase(elevant.models.entity_database.EntityDatabase):
-    def __init__(self):
+    def __init__(self, lazy: Optional[bool] = False, cache_size: Optional[int] = DEFAULT_LAZY_CACHE_SIZE):
+        """
+        In lazy mode, the mappings that are needed by the hyperlink reference linker are not loaded into memory.
+        Instead, the corresponding on-disk databases are opened and each key is queried on demand. All lazily
+        loaded mappings share a single LRU cache for the queried values with a memory budget of cache_size bytes.
+        Otherwise, the entity-keyed mappings are stored compactly with integer QID keys (see QidMapping).
+        """
         super().__init__()
         self.given_names = {}
-        self.given_names: Dict[str, str]
+        self.given_names: Union[Dict[str, str], QidToStringMapping]
         self.title_synonyms = {}
-        self.title_synonyms: Dict[str, Set[str]]
+        self.title_synonyms: Union[Dict[str, Set[str]], QidToStringSetMapping, LazyDatabase]
         self.akronyms = {}
-        self.akronyms: Dict[str, Set[str]]
+        self.akronyms: Union[Dict[str, Set[str]], QidToStringSetMapping, LazyDatabase]
+
+        self.lazy = lazy
+        self.lazy_cache = LRUCache(cache_size) if lazy else None
+        self.lazy_wikipedia_to_wikidata = None
+        self.lazy_wikipedia_to_wikidata: Optional[LazyDatabase]
+        self.lazy_redirects = None
+        self.lazy_redirects: Optional[LazyDatabase]
+        self.resolved_links = None
+        self.resolved_links: Optional[LazyDatabase]
+
+    def open_lazy_database(self, db_file: str, parse_value: Optional[Any] = None) -> LazyDatabase:
+        logger.info("Querying database %s on demand." % db_file)
+        return LazyDatabase(db_file, self.lazy_cache, parse_value)
+
+    def load_wikipedia_to_wikidata_db(self):
+        if not self.lazy:
+            super().load_wikipedia_to_wikidata_db()
+            return
+        self.lazy_wikipedia_to_wikidata = self.open_lazy_database(entity_database_reader.WIKIPEDIA_NAME_TO_QID_DB)
+
+    def is_wikipedia_to_wikidata_mapping_loaded(self) -> bool:
+        if not self.lazy:
+            return super().is_wikipedia_to_wikidata_mapping_loaded()
+        return self.lazy_wikipedia_to_wikidata is not None
+
+    def load_redirects(self):
+        if not self.lazy:
+            super().load_redirects()
+            return
+        self.lazy_redirects = self.open_lazy_database(entity_database_reader.REDIRECTS_DB)
+
+    def is_redirects_loaded(self) -> bool:
+        if not self.lazy:
+            return super().is_redirects_loaded()
+        return self.lazy_redirects is not None
+
+    def load_resolved_links(self):
+        """
+        Open the flattened link target to QID database created by scripts/create_link_database.py, in which
+        redirect chains are already resolved, so that link2id() is a single lookup. The database is memory-mapped
+        in both modes. If it does not exist, the Wikipedia to Wikidata mapping and the redirects are loaded instead.
+        """
+        if not os.path.exists(entity_database_reader.LINK_TO_QID_DB):
+            logger.info("Resolved links database %s not found. Loading Wikipedia to Wikidata mapping and redirects "
+                        "instead." % entity_database_reader.LINK_TO_QID_DB)
+            if not self.is_wikipedia_to_wikidata_mapping_loaded():
+                self.load_wikipedia_to_wikidata_db()
+            if not self.is_redirects_loaded():
+                self.load_redirects()
+            return
+        if self.lazy:
+            self.resolved_links = self.open_lazy_database(entity_database_reader.LINK_TO_QID_DB)
+        else:
+            # Frequent link targets are cached, so that they don't need a read transaction each
+            logger.info("Querying database %s on demand." % entity_database_reader.LINK_TO_QID_DB)
+            self.resolved_links = LazyDatabase(entity_database_reader.LINK_TO_QID_DB,
+                                               LRUCache(RESOLVED_LINKS_CACHE_SIZE))
+
+    def is_resolved_links_loaded(self) -> bool:
+        if self.resolved_links is not None:
+            return True
+        return self.is_wikipedia_to_wikidata_mapping_loaded() and self.is_redirects_loaded()
+
+    def link2id(self, link_target: str) -> Optional[str]:
+        if self.resolved_links is not None:
+            return self.resolved_links.get(link_target)
+        if not self.lazy:
+            return super().link2id(link_target)
+        entity_id = self.lazy_wikipedia_to_wikidata.get(link_target)
+        if entity_id is None and self.lazy_redirects is not None:
+            redirect_target = self.lazy_redirects.get(link_target)
+            if redirect_target is not None:
+                entity_id = self.lazy_wikipedia_to_wikidata.get(redirect_target)
+        return entity_id
+
+    def link2ids(self, link_targets: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Map each of the given link targets to its entity ID or None, like link2id().
+        In lazy mode or with resolved links, the targets are looked up in bulk with a single transaction
+        per database.
+        """
+        if self.resolved_links is not None:
+            return self.resolved_links.get_many(link_targets)
+        if not self.lazy:
+            return {link_target: self.link2id(link_target) for link_target in link_targets}
+        entity_ids = self.lazy_wikipedia_to_wikidata.get_many(link_targets)
+        missing_targets = [link_target for link_target, entity_id in entity_ids.items() if entity_id is None]
+        if missing_targets and self.lazy_redirects is not None:
+            redirects = self.lazy_redirects.get_many(missing_targets)
+            redirect_targets = {link_target: redirect_target for link_target, redirect_target in redirects.items()
+                                if redirect_target is not None}
+            redirect_entity_ids = self.lazy_wikipedia_to_wikidata.get_many(set(redirect_targets.values()))
+            for link_target, redirect_target in redirect_targets.items():
+                entity_ids[link_target] = redirect_entity_ids[redirect_target]
+        return entity_ids
+
+    def load_entity_to_aliases(self):
+        if not self.lazy:
+            # The dict loaded by elevant is converted afterwards, so the peak memory while loading is that of the
+            # dict. The compact mapping only reduces the memory afterwards.
+            super().load_entity_to_aliases()
+            self.entity_to_aliases_db = QidToStringSetMapping.from_dict(self.entity_to_aliases_db)
+            return
+        self.entity_to_aliases_db = self.open_lazy_database(entity_database_reader.QID_TO_ALIASES_DB,
+                                                            parse_semicolon_separated_values)
+        self.loaded_info[MappingName.ENTITY_ID_TO_ALIAS] = LoadedInfo(LoadingType.FULL)
+
+    def load_entity_to_family_name(self):
+        if not self.lazy:
+            # As for the aliases, the peak memory while loading is that of the dict loaded by elevant
+            super().load_entity_to_family_name()
+            self.entity_to_family_name = QidToStringMapping.from_dict(self.entity_to_family_name)
+            return
+        self.entity_to_family_name = self.open_lazy_database(entity_database_reader.QID_TO_FAMILY_NAME_DB)
+        self.loaded_info[MappingName.ENTITY_ID_TO_FAMILY_NAME] = LoadedInfo(LoadingType.FULL)
 
     def load_title_synonyms(self):
+        """
+        Memory-map the prebuilt entity-keyed title synonyms if they exist (in both modes). Otherwise, the
+        title-keyed title synonyms are inverted, or in lazy mode, the title synonyms database is opened.
+        """
+        if QidToStringSetMapping.exists(entity_database_reader.QID_TO_TITLE_SYNONYMS_DIR):
+            self.title_synonyms = QidToStringSetMapping.load(entity_database_reader.QID_TO_TITLE_SYNONYMS_DIR)
+            return
+        if self.lazy:
+            self.title_synonyms = self.open_lazy_database(entity_database_reader.QID_TO_TITLE_SYNONYMS_DB,
+                                                          parse_tab_separated_values)
+            return
         title_synonym_to_entities = EntityDatabaseReader.get_title_synonyms()
-        for synonym, entity_set in title_synonym_to_entities.items():
-            for entity_title in entity_set:
-                entity_id = self.link2id(entity_title)
-                if entity_id is not None:
-                    if entity_id not in self.title_synonyms:
-                        self.title_synonyms[entity_id] = set()
-                    self.title_synonyms[entity_id].add(synonym)
+        self.title_synonyms = QidToStringSetMapping.from_pairs(self.invert_title_mapping(title_synonym_to_entities))
 
     def is_title_synonyms_loaded(self) -> bool:
         return len(self.title_synonyms) > 0
 
     def load_akronyms(self):
+        """
+        Memory-map the prebuilt entity-keyed akronyms if they exist (in both modes). Otherwise, the
+        title-keyed akronyms are inverted, or in lazy mode, the akronyms database is opened.
+        """
+        if QidToStringSetMapping.exists(entity_database_reader.QID_TO_AKRONYMS_DIR):
+            self.akronyms = QidToStringSetMapping.load(entity_database_reader.QID_TO_AKRONYMS_DIR)
+            return
+        if self.lazy:
+            self.akronyms = self.open_lazy_database(entity_database_reader.QID_TO_AKRONYMS_DB,
+                                                    parse_tab_separated_values)
+            return
         akronym_to_entities = EntityDatabaseReader.get_akronyms()
-        for akronym, entity_set in akronym_to_entities.items():
-            for entity_title in entity_set:
-                entity_id = self.link2id(entity_title)
-                if entity_id is not None:
-                    if entity_id not in self.akronyms:
-                        self.akronyms[entity_id] = set()
-                    self.akronyms[entity_id].add(akronym)
+        self.akronyms = QidToStringSetMapping.from_pairs(self.invert_title_mapping(akronym_to_entities))
 
     def is_akronyms_loaded(self) -> bool:
         return len(self.akronyms) > 0
 
+    def invert_title_mapping(self, alias_to_titles: Dict[str, Set[str]]) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (entity ID, alias) for each Wikipedia title in the given mapping from alias to titles
+        that can be mapped to an entity.
+        """
+        for alias, titles in alias_to_titles.items():
+            for title in titles:
+                entity_id = self.link2id(title)
+                if entity_id is not None:
+                    yield entity_id, alias
+
     def get_entity_aliases(self, entity_id: str) -> Optional[Set[str]]:
         aliases = set()
         if entity_id in self.entity_name_db:
@@ -100,12 +270,15 @@ class EntityDatabase(elevant.models.entity_database.EntityDatabase):
         return aliases
 
     def load_names(self):
+        """
+        Memory-map the given names created by scripts/create_lazy_databases.py if they exist (in both modes).
+        Otherwise, the given names are extracted from the human names.
+        """
+        if QidToStringMapping.exists(entity_database_reader.GIVEN_NAMES_DIR):
+            self.given_names = QidToStringMapping.load(entity_database_reader.GIVEN_NAMES_DIR)
+            return
         logger.info("Loading family and given names into entity database ...")
-        for entity_id, name in EntityDatabaseReader.read_human_names():
-            if " " in name:
-                given_name = name.split()[0]
-                if len(given_name) > 1:
-                    self.given_names[entity_id] = given_name
+        self.given_names = QidToStringMapping.from_pairs(get_given_names(EntityDatabaseReader.read_human_names()))
         logger.info("-> Family and given names loaded.")
 
     def is_names_loaded(self) -> bool:
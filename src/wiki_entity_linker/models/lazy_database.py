@@ -0,0 +1,181 @@
+import os
+import sys
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Hashable, Iterator, Iterable, Dict
+
+import lmdb
+import logging
+
+
+logger = logging.getLogger("main." + __name__.split(".")[-1])
+
+ENTRY_OVERHEAD = 100  # Approximate number of bytes an entry of the OrderedDict costs in addition to key and value
+_NOT_FOUND = object()  # Cached marker for keys that are not contained in a database
+
+
+def encode_key(key: str, env: lmdb.Environment) -> Optional[bytes]:
+    """
+    Return the given key encoded as UTF-8 or None if LMDB can't store it, i.e. if it is empty or longer than the
+    maximum key size of the environment (511 bytes by default).
+    """
+    encoded_key = key.encode("utf8")
+    if not encoded_key or len(encoded_key) > env.max_key_size():
+        return None
+    return encoded_key
+
+
+def get_approximate_size(obj: Any) -> int:
+    """
+    Approximate memory size of the given object in bytes, including the (nested) elements of sets, lists and tuples.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (set, frozenset, list, tuple)):
+        size += sum(get_approximate_size(element) for element in obj)
+    return size
+
+
+class LRUCache:
+    """
+    Least-recently-used cache with a memory budget in bytes.
+    A single cache can be shared by several LazyDatabases so that all of them together stay within the budget.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.entries = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        if key in self.entries:
+            return
+        size = get_approximate_size(key) + get_approximate_size(value) + ENTRY_OVERHEAD
+        self.entries[key] = (value, size)
+        self.n_bytes += size
+        while self.n_bytes > self.max_bytes and self.entries:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.n_bytes -= evicted_size
+
+
+class LazyDatabase:
+    """
+    Read-only dict-like view of an LMDB database as created by scripts/create_databases.py.
+
+    The database is opened on first access and each key is looked up on demand. Looked up values (and misses)
+    are kept in an LRU cache. If no cache is given, each lookup queries the database. The values are stored as
+    strings in the database and converted with the given parse_value function. Since an LMDB environment must not
+    be used across a fork, the database is reopened in a forked process.
+    """
+    def __init__(self,
+                 db_file: str,
+                 cache: Optional[LRUCache] = None,
+                 parse_value: Optional[Callable[[str], Any]] = None):
+        self.db_file = db_file
+        self.name = os.path.basename(db_file)
+        self.cache = cache
+        self.parse_value = parse_value
+        self.env = None
+        self.pid = None
+
+    def __getstate__(self):
+        # The LMDB environment can't be pickled. It is reopened on first access.
+        state = self.__dict__.copy()
+        state["env"] = None
+        state["pid"] = None
+        return state
+
+    def _get_env(self) -> lmdb.Environment:
+        if self.env is None or self.pid != os.getpid():
+            logger.debug("Opening database %s" % self.db_file)
+            self.env = lmdb.open(self.db_file, readonly=True, lock=False, readahead=False, max_readers=1024)
+            self.pid = os.getpid()
+        return self.env
+
+    def _lookup(self, key: str) -> Any:
+        cache_key = (self.name, key)
+        value = self.cache.get(cache_key, _NOT_FOUND) if self.cache else _NOT_FOUND
+        if value is not _NOT_FOUND:
+            return value
+        env = self._get_env()
+        encoded_key = encode_key(key, env)
+        if encoded_key is None:
+            # Keys that LMDB can't store are not contained in the database
+            raw_value = None
+        else:
+            with env.begin() as txn:
+                raw_value = txn.get(encoded_key)
+        if raw_value is None:
+            value = None
+        else:
+            value = raw_value.decode("utf8")
+            if self.parse_value:
+                value = self.parse_value(value)
+        if self.cache:
+            self.cache.put(cache_key, value)
+        return value
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Look up several keys at once. Keys that are not cached are read in a single transaction.
+        Keys that are not contained in the database are mapped to None.
+        """
+        values = {}
+        missing_keys = []
+        for key in keys:
+            value = self.cache.get((self.name, key), _NOT_FOUND) if self.cache else _NOT_FOUND
+            if value is _NOT_FOUND:
+                missing_keys.append(key)
+            else:
+                values[key] = value
+        if missing_keys:
+            env = self._get_env()
+            with env.begin() as txn:
+                for key in missing_keys:
+                    encoded_key = encode_key(key, env)
+                    raw_value = txn.get(encoded_key) if encoded_key is not None else None
+                    if raw_value is None:
+                        value = None
+                    else:
+                        value = raw_value.decode("utf8")
+                        if self.parse_value:
+                            value = self.parse_value(value)
+                    if self.cache:
+                        self.cache.put((self.name, key), value)
+                    values[key] = value
+        return values
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._lookup(key)
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._lookup(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return key is not None and self._lookup(key) is not None
+
+    def __len__(self) -> int:
+        return self._get_env().stat()["entries"]
+
+    def __iter__(self) -> Iterator[str]:
+        with self._get_env().begin() as txn:
+            for key in txn.cursor().iternext(keys=True, values=False):
+                yield key.decode("utf8")
+
+    def items(self) -> Iterator:
+        with self._get_env().begin() as txn:
+            for key, value in txn.cursor():
+                value = value.decode("utf8")
+                yield key.decode("utf8"), self.parse_value(value) if self.parse_value else value
+
+    def values(self) -> Iterator:
+        for _, value in self.items():
+            yield value
@@ -0,0 +1,390 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+import logging
+from spacy.strings import hash_string
+
+
+logger = logging.getLogger("main." + __name__.split(".")[-1])
+
+FORMAT_FILE = "format.txt"
+
+
+def get_qid_number(entity_id: str) -> int:
+    """
+    Return the number of the given QID, e.g. 42 for "Q42", or -1 if the entity ID is not a QID.
+    """
+    if entity_id and entity_id[0] == "Q" and entity_id[1:].isdigit():
+        return int(entity_id[1:])
+    return -1
+
+
+class StringPool:
+    """
+    Strings stored as a single UTF-8 byte array with the start offset of each string.
+    A string is only decoded when it is accessed.
+    """
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @staticmethod
+    def from_strings(strings: List[str]) -> "StringPool":
+        encoded = [string.encode("utf8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return StringPool(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class MappedArrays(ABC):
+    """
+    Base class for read-only mappings that are stored in a set of numpy arrays.
+    All arrays can be written to a directory and memory-mapped from there, so loading takes no time and
+    processes share the pages of the mapping. Subclasses define the names of their arrays.
+    The directory also contains a format file with the class name and the format version, so that a directory
+    written in another format is not mistaken for the mapping. Increase FORMAT_VERSION when the arrays change.
+    """
+    ARRAY_NAMES = ()
+    FORMAT_VERSION = 1
+
+    def __init__(self, arrays: Dict[str, np.ndarray], directory: Optional[str] = None):
+        self.arrays = arrays
+        self.directory = directory
+
+    @classmethod
+    def load(cls, directory: str):
+        """
+        Memory-map the mapping from the given directory as written by save().
+        """
+        logger.info("Loading %s from %s ..." % (cls.__name__, directory))
+        arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r") for name in cls.ARRAY_NAMES}
+        mapping = cls(arrays, directory)
+        logger.info("-> %s loaded." % mapping.describe())
+        return mapping
+
+    @classmethod
+    def get_format(cls) -> str:
+        return "%s %d" % (cls.__name__, cls.FORMAT_VERSION)
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        """
+        Check if the given directory contains a mapping of this class in the current format as written by save().
+        """
+        if not os.path.exists(directory):
+            return False
+        format_file = os.path.join(directory, FORMAT_FILE)
+        if os.path.exists(format_file):
+            with open(format_file, "r", encoding="utf8") as file:
+                if file.read().strip() == cls.get_format():
+                    return True
+        logger.warning("%s does not contain a %s in the current format and is ignored. Create it again with the "
+                       "script that created it." % (directory, cls.get_format()))
+        return False
+
+    def describe(self) -> str:
+        return "Mapping with %d keys" % len(self)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAY_NAMES:
+            np.save(os.path.join(directory, name + ".npy"), self.arrays[name])
+        with open(os.path.join(directory, FORMAT_FILE), "w", encoding="utf8") as file:
+            file.write(self.get_format() + "\n")
+        self.directory = directory
+
+    def __getstate__(self):
+        # A memory-mapped mapping is pickled as its directory and mapped again when it is unpickled
+        if self.directory is None:
+            return self.__dict__.copy()
+        return {"directory": self.directory}
+
+    def __setstate__(self, state):
+        if "arrays" in state:
+            self.__dict__.update(state)
+        else:
+            self.__dict__.update(self.load(state["directory"]).__dict__)
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """
+        Return the number of keys of the mapping.
+        """
+
+
+class QidMapping(MappedArrays):
+    """
+    Read-only dict-like mapping keyed by QID.
+
+    Instead of "Q123" strings, the keys are stored as a sorted array of QID numbers, so an entity is looked up
+    with a binary search. Each distinct value string is stored once in a string pool and referenced by its index.
+    Subclasses define the arrays and how a value is assembled.
+    """
+    ARRAY_NAMES = ("qids", "pool_data", "pool_offsets")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], directory: Optional[str] = None):
+        super().__init__(arrays, directory)
+        self.qids = arrays["qids"]
+        self.pool = StringPool(arrays["pool_data"], arrays["pool_offsets"])
+
+    def describe(self) -> str:
+        return "Mapping for %d entities with %d distinct strings" % (len(self), len(self.pool))
+
+    def _find(self, entity_id: str) -> int:
+        """
+        Return the position of the given entity in the QID array or -1 if it is not contained.
+        """
+        qid_number = get_qid_number(entity_id)
+        if qid_number < 0:
+            return -1
+        i = int(np.searchsorted(self.qids, qid_number))
+        if i < len(self.qids) and self.qids[i] == qid_number:
+            return i
+        return -1
+
+    @abstractmethod
+    def _value(self, i: int) -> Any:
+        """
+        Return the value of the entity at the given position in the QID array.
+        """
+
+    def get(self, entity_id: str, default: Any = None) -> Any:
+        i = self._find(entity_id)
+        return default if i < 0 else self._value(i)
+
+    def __getitem__(self, entity_id: str) -> Any:
+        i = self._find(entity_id)
+        if i < 0:
+            raise KeyError(entity_id)
+        return self._value(i)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return self._find(entity_id) >= 0
+
+    def __len__(self) -> int:
+        return len(self.qids)
+
+    def __iter__(self) -> Iterator[str]:
+        for qid_number in self.qids:
+            yield "Q%d" % qid_number
+
+    def keys(self) -> Iterator[str]:
+        return iter(self)
+
+    def values(self) -> Iterator[Any]:
+        for i in range(len(self.qids)):
+            yield self._value(i)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for i, qid_number in enumerate(self.qids):
+            yield "Q%d" % qid_number, self._value(i)
+
+
+def _encode_pairs(pairs: Iterable[Tuple[str, str]]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Turn (entity ID, string) pairs into an array of QID numbers and an array of string codes, sorted by
+    QID number (stable), and the list of distinct strings. Pairs with an entity ID that is not a QID are skipped.
+    """
+    qids = []
+    codes = []
+    string_codes = {}
+    for entity_id, string in pairs:
+        qid_number = get_qid_number(entity_id)
+        if qid_number < 0:
+            continue
+        if string not in string_codes:
+            string_codes[string] = len(string_codes)
+        qids.append(qid_number)
+        codes.append(string_codes[string])
+    qids = np.array(qids, dtype=np.uint32)
+    codes = np.array(codes, dtype=np.uint32)
+    order = np.argsort(qids, kind="stable")
+    return qids[order], codes[order], list(string_codes)
+
+
+class QidToStringMapping(QidMapping):
+    """
+    Mapping from QID to a single string, e.g. a given name.
+    """
+    ARRAY_NAMES = QidMapping.ARRAY_NAMES + ("codes",)
+
+    def __init__(self, arrays: Dict[str, np.ndarray], directory: Optional[str] = None):
+        super().__init__(arrays, directory)
+        self.codes = arrays["codes"]
+
+    @staticmethod
+    def from_pairs(pairs: Iterable[Tuple[str, str]]) -> "QidToStringMapping":
+        """
+        Build the mapping from (entity ID, string) pairs. If an entity occurs several times, its last string is used.
+        """
+        qids, codes, strings = _encode_pairs(pairs)
+        is_last = np.append(qids[1:] != qids[:-1], True) if len(qids) else np.zeros(0, dtype=bool)
+        pool = StringPool.from_strings(strings)
+        return QidToStringMapping({"qids": qids[is_last], "codes": codes[is_last],
+                                   "pool_data": pool.data, "pool_offsets": pool.offsets})
+
+    @staticmethod
+    def from_dict(d: Dict[str, str]) -> "QidToStringMapping":
+        return QidToStringMapping.from_pairs(d.items())
+
+    def _value(self, i: int) -> str:
+        return self.pool[self.codes[i]]
+
+
+class QidToStringSetMapping(QidMapping):
+    """
+    Mapping from QID to a set of strings, e.g. aliases. The string codes of all entities are stored in a single
+    array in which the codes of the i-th entity are located between offsets[i] and offsets[i + 1] (CSR layout).
+    """
+    ARRAY_NAMES = QidMapping.ARRAY_NAMES + ("offsets", "codes")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], directory: Optional[str] = None):
+        super().__init__(arrays, directory)
+        self.offsets = arrays["offsets"]
+        self.codes = arrays["codes"]
+
+    @staticmethod
+    def from_pairs(pairs: Iterable[Tuple[str, str]]) -> "QidToStringSetMapping":
+        """
+        Build the mapping from (entity ID, string) pairs. The strings of all pairs of an entity form its set.
+        """
+        qids, codes, strings = _encode_pairs(pairs)
+        # Sort by QID number and code and remove duplicate pairs
+        order = np.lexsort((codes, qids))
+        qids = qids[order]
+        codes = codes[order]
+        if len(qids):
+            is_new = np.append(True, (qids[1:] != qids[:-1]) | (codes[1:] != codes[:-1]))
+            qids = qids[is_new]
+            codes = codes[is_new]
+        is_first = np.append(True, qids[1:] != qids[:-1]) if len(qids) else np.zeros(0, dtype=bool)
+        offsets = np.append(np.flatnonzero(is_first), len(qids)).astype(np.int64)
+        pool = StringPool.from_strings(strings)
+        return QidToStringSetMapping({"qids": qids[is_first], "offsets": offsets, "codes": codes,
+                                      "pool_data": pool.data, "pool_offsets": pool.offsets})
+
+    @staticmethod
+    def from_dict(d: Dict[str, Iterable[str]]) -> "QidToStringSetMapping":
+        return QidToStringSetMapping.from_pairs((entity_id, string) for entity_id, strings in d.items()
+                                                for string in strings)
+
+    def _value(self, i: int) -> Set[str]:
+        return {self.pool[code] for code in self.codes[self.offsets[i]:self.offsets[i + 1]]}
+
+
+class StringToQidMapping(MappedArrays):
+    """
+    Read-only mapping from string to QID, e.g. from an alias to its best entity.
+    The strings themselves are not stored. Instead, the keys are stored as a sorted array of the 64 bit hashes of
+    the strings (spacy.strings.hash_string), so a string is looked up with a binary search over its hash.
+    With 64 bit hashes, collisions between the keys are improbable enough to be ignored.
+    """
+    ARRAY_NAMES = ("hashes", "qids")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], directory: Optional[str] = None):
+        super().__init__(arrays, directory)
+        self.hashes = arrays["hashes"]
+        self.qids = arrays["qids"]
+
+    @staticmethod
+    def from_pairs(pairs: Iterable[Tuple[str, str]]) -> "StringToQidMapping":
+        """
+        Build the mapping from (string, entity ID) pairs. If a string occurs several times, its last entity is used.
+        Pairs with an entity ID that is not a QID are skipped.
+        """
+        hashes = []
+        qids = []
+        for string, entity_id in pairs:
+            qid_number = get_qid_number(entity_id)
+            if qid_number >= 0:
+                hashes.append(hash_string(string))
+                qids.append(qid_number)
+        hashes = np.array(hashes, dtype=np.uint64)
+        qids = np.array(qids, dtype=np.uint32)
+        order = np.argsort(hashes, kind="stable")
+        hashes = hashes[order]
+        qids = qids[order]
+        is_last = np.append(hashes[1:] != hashes[:-1], True) if len(hashes) else np.zeros(0, dtype=bool)
+        return StringToQidMapping({"hashes": hashes[is_last], "qids": qids[is_last]})
+
+    def get(self, string: str, default: Optional[str] = None) -> Optional[str]:
+        key = np.uint64(hash_string(string))
+        i = int(np.searchsorted(self.hashes, key))
+        if i < len(self.hashes) and self.hashes[i] == key:
+            return "Q%d" % self.qids[i]
+        return default
+
+    def __contains__(self, string: str) -> bool:
+        return self.get(string) is not None
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+
+class StringToQidSetMapping(MappedArrays):
+    """
+    Read-only mapping from string to a set of QIDs, e.g. from an alias to its candidate entities.
+    As in StringToQidMapping, the keys are stored as a sorted array of the 64 bit hashes of the strings.
+    The QID numbers of all keys are stored in a single array in which the QIDs of the i-th key are located
+    between offsets[i] and offsets[i + 1] (CSR layout).
+    """
+    ARRAY_NAMES = ("hashes", "offsets", "qids")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], directory: Optional[str] = None):
+        super().__init__(arrays, directory)
+        self.hashes = arrays["hashes"]
+        self.offsets = arrays["offsets"]
+        self.qids = arrays["qids"]
+
+    @staticmethod
+    def from_pairs(pairs: Iterable[Tuple[str, str]]) -> "StringToQidSetMapping":
+        """
+        Build the mapping from (string, entity ID) pairs. The entities of all pairs of a string form its set.
+        Pairs with an entity ID that is not a QID are skipped.
+        """
+        hashes = []
+        qids = []
+        for string, entity_id in pairs:
+            qid_number = get_qid_number(entity_id)
+            if qid_number >= 0:
+                hashes.append(hash_string(string))
+                qids.append(qid_number)
+        hashes = np.array(hashes, dtype=np.uint64)
+        qids = np.array(qids, dtype=np.uint32)
+        # Sort by hash and QID number and remove duplicate pairs
+        order = np.lexsort((qids, hashes))
+        hashes = hashes[order]
+        qids = qids[order]
+        if len(hashes):
+            is_new = np.append(True, (hashes[1:] != hashes[:-1]) | (qids[1:] != qids[:-1]))
+            hashes = hashes[is_new]
+            qids = qids[is_new]
+        is_first = np.append(True, hashes[1:] != hashes[:-1]) if len(hashes) else np.zeros(0, dtype=bool)
+        offsets = np.append(np.flatnonzero(is_first), len(hashes)).astype(np.int64)
+        return StringToQidSetMapping({"hashes": hashes[is_first], "offsets": offsets, "qids": qids})
+
+    @staticmethod
+    def from_dict(d: Dict[str, Iterable[str]]) -> "StringToQidSetMapping":
+        return StringToQidSetMapping.from_pairs((string, entity_id) for string, entity_ids in d.items()
+                                                for entity_id in entity_ids)
+
+    def get(self, string: str, default: Optional[Set[str]] = None) -> Optional[Set[str]]:
+        key = np.uint64(hash_string(string))
+        i = int(np.searchsorted(self.hashes, key))
+        if i < len(self.hashes) and self.hashes[i] == key:
+            return {"Q%d" % qid_number for qid_number in self.qids[self.offsets[i]:self.offsets[i + 1]]}
+        return default
+
+    def __contains__(self, string: str) -> bool:
+        return self.get(string) is not None
+
+    def __len__(self) -> int:
+        return len(self.hashes)
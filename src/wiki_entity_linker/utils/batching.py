@@ -0,0 +1,80 @@
+from typing import Iterable, Iterator, List, TypeVar, Optional, Tuple, Callable, Any
+
+T = TypeVar("T")
+
+DEFAULT_MAX_CHUNK_CHARS = 200000  # Target length of the input lines submitted to a worker process as a single task
+MIN_CHUNK_CHARS = 10000  # Lower bound for the target length when the chunk size is reduced to keep workers busy
+
+
+def batches(iterable: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    """
+    Yield lists of (at most) batch_size consecutive elements of the given iterable.
+    """
+    batch = []
+    for element in iterable:
+        batch.append(element)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class AdaptiveChunker:
+    """
+    Groups raw input lines into chunks by their length instead of by their number.
+    A single very long line forms a chunk of its own, many short lines are combined.
+
+    The target chunk size adapts to the fill level of the queue that the chunks are put into:
+    If the queue runs almost empty, i.e. workers are about to wait for input, the target size is halved,
+    so the remaining work is distributed across more, smaller chunks. If the queue is almost full,
+    the target size is doubled again (up to max_chars) to reduce the per-chunk overhead.
+    """
+    def __init__(self, max_chars: int, min_chars: int, max_lines: int):
+        self.max_chars = max_chars
+        self.min_chars = min(min_chars, max_chars)
+        self.max_lines = max_lines
+        self.target_chars = max_chars
+
+    def adapt(self, queue_fill: Optional[float]):
+        """
+        Adjust the target chunk size to the given queue fill level between 0 and 1.
+        """
+        if queue_fill is None:
+            return
+        if queue_fill < 0.25:
+            self.target_chars = max(self.min_chars, self.target_chars // 2)
+        elif queue_fill > 0.75:
+            self.target_chars = min(self.max_chars, self.target_chars * 2)
+
+    def chunks(self,
+               lines: Iterable[Tuple[bytes, T]],
+               queue_fill: Optional[Callable[[], Optional[float]]] = None,
+               group: Optional[Callable[[T], Any]] = None) -> Iterator[List[Tuple[bytes, T]]]:
+        """
+        Yield chunks of (line, info) tuples. queue_fill is called before a new chunk is started and
+        returns the current fill level of the target queue or None if it is unknown.
+        If group is given, it returns the group of a line for its info, and a chunk never contains lines
+        of different groups.
+        """
+        chunk = []
+        n_chars = 0
+        chunk_group = None
+        for line, info in lines:
+            if group:
+                line_group = group(info)
+                if chunk and line_group != chunk_group:
+                    yield chunk
+                    chunk = []
+                    n_chars = 0
+                chunk_group = line_group
+            chunk.append((line, info))
+            n_chars += len(line)
+            if n_chars >= self.target_chars or len(chunk) == self.max_lines:
+                yield chunk
+                chunk = []
+                n_chars = 0
+                if queue_fill:
+                    self.adapt(queue_fill())
+        if chunk:
+            yield chunk
@@ -0,0 +1,135 @@
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import os
+import sys
+from typing import Optional, List, Iterator, Dict
+
+import logging
+import spacy
+from spacy.language import Language
+from spacy.tokens import Doc, DocBin
+
+
+logger = logging.getLogger("main." + __name__.split(".")[-1])
+
+
+class DocCache:
+    """
+    On-disk cache of processed spaCy docs, keyed by a hash of the text.
+
+    Each doc is stored as a DocBin in <cache_dir>/<pipeline_key>/<hash[:2]>/<hash>.spacy.
+    The pipeline key is a hash of the model name, version, its pipeline components and their configuration,
+    the elevant version and the source code of custom components (e.g. elevant's custom sentencizer),
+    so docs are only reused by a model that runs exactly the same components with the same settings.
+    The description of the pipeline is written to <cache_dir>/<pipeline_key>/pipeline.json.
+    Docs with user data that can't be serialized are not cached.
+    """
+    def __init__(self, cache_dir: str, model: Language):
+        self.model = model
+        pipeline = DocCache.get_pipeline_description(model)
+        self.pipeline_key = hashlib.sha1(json.dumps(pipeline, sort_keys=True).encode("utf8")).hexdigest()[:16]
+        self.directory = os.path.join(cache_dir, self.pipeline_key)
+        os.makedirs(self.directory, exist_ok=True)
+        pipeline_file = os.path.join(self.directory, "pipeline.json")
+        if not os.path.exists(pipeline_file):
+            with open(pipeline_file, "w", encoding="utf8") as file:
+                json.dump(pipeline, file)
+        self.n_hits = 0
+        self.n_misses = 0
+        logger.info("Using doc cache at %s for pipeline %s" % (self.directory, pipeline["pipe_names"]))
+
+    @staticmethod
+    def get_pipeline_description(model: Language):
+        try:
+            elevant_version = importlib.metadata.version("elevant")
+        except importlib.metadata.PackageNotFoundError:
+            elevant_version = None
+        return {"spacy_version": spacy.__version__,
+                "elevant_version": elevant_version,
+                "lang": model.lang,
+                "name": model.meta.get("name"),
+                "version": model.meta.get("version"),
+                "pipe_names": model.pipe_names,
+                "config_hash": hashlib.sha1(model.config.to_str().encode("utf8")).hexdigest(),
+                "component_code_hashes": DocCache.get_component_code_hashes(model)}
+
+    @staticmethod
+    def get_component_code_hashes(model: Language) -> Dict[str, str]:
+        """
+        Return a hash of the source file of each pipeline component that is not part of spaCy.
+        spaCy's own components are covered by the spaCy version.
+        """
+        code_hashes = {}
+        for name, component in model.pipeline:
+            implementation = component if inspect.isfunction(component) else type(component)
+            module_name = implementation.__module__
+            module_file = getattr(sys.modules.get(module_name), "__file__", None)
+            if module_name.split(".")[0] in ("spacy", "thinc") or not module_file or not os.path.exists(module_file):
+                continue
+            with open(module_file, "rb") as file:
+                code_hashes[name] = hashlib.sha1(file.read()).hexdigest()
+        return code_hashes
+
+    def log_statistics(self):
+        logger.info("Doc cache: %d hits, %d misses." % (self.n_hits, self.n_misses))
+
+    def _get_path(self, text: str) -> str:
+        text_hash = hashlib.sha1(text.encode("utf8")).hexdigest()
+        return os.path.join(self.directory, text_hash[:2], text_hash + ".spacy")
+
+    def get(self, text: str) -> Optional[Doc]:
+        path = self._get_path(text)
+        if not os.path.exists(path):
+            return None
+        doc = next(DocBin().from_disk(path).get_docs(self.model.vocab))
+        if doc.text != text:
+            # Hash collision
+            return None
+        return doc
+
+    def put(self, doc: Doc):
+        path = self._get_path(doc.text)
+        try:
+            doc_bin = DocBin(docs=[doc], store_user_data=True).to_bytes()
+        except (TypeError, ValueError) as e:
+            # The user data of the doc can't be serialized with msgpack
+            logger.debug("Doc is not cached: %s" % e)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so parallel processes never read a partially written doc
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp_path, "wb") as file:
+            file.write(doc_bin)
+        os.replace(tmp_path, path)
+
+    def parse(self, text: str) -> Doc:
+        """
+        Return the cached doc for the given text or process the text with the model and cache the result.
+        """
+        doc = self.get(text)
+        if doc is not None:
+            self.n_hits += 1
+            return doc
+        self.n_misses += 1
+        doc = self.model(text)
+        self.put(doc)
+        return doc
+
+    def pipe(self, texts: List[str], batch_size: int, n_process: Optional[int] = 1) -> Iterator[Doc]:
+        """
+        Yield the docs for the given texts in order. Only texts that are not in the cache are processed
+        with the model, all of them in a single call to the model's pipe() method.
+        """
+        docs = [self.get(text) for text in texts]
+        missing_indices = [i for i, doc in enumerate(docs) if doc is None]
+        self.n_hits += len(texts) - len(missing_indices)
+        self.n_misses += len(missing_indices)
+        if missing_indices:
+            missing_texts = [texts[i] for i in missing_indices]
+            for i, doc in zip(missing_indices, self.model.pipe(missing_texts, batch_size=batch_size,
+                                                               n_process=n_process)):
+                self.put(doc)
+                docs[i] = doc
+        return iter(docs)
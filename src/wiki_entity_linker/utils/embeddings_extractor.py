@@ -7,7 +7,8 @@ from gensim.models.word2vec import Word2Vec
 import torch
 
 from elevant.models.entity_mention import EntityMention
-from elevant.utils.offset_converter import OffsetConverter
+
+from wiki_entity_linker.utils.token_index import get_token_index
 
 
 class EmbeddingsExtractor:
@@ -24,7 +25,7 @@ class EmbeddingsExtractor:
         """
         Get span embedding as average of tokens within the span (e.g. the sentence).
         """
-        sentence_tokens = OffsetConverter.get_tokens_in_span(span, doc)
+        sentence_tokens = get_token_index(doc).get_tokens_in_span(span)
         embedding_size = len(sentence_tokens[0].vector)
         sentence_vector = torch.zeros(1, embedding_size)
         for tok in sentence_tokens:
@@ -37,7 +38,7 @@ class EmbeddingsExtractor:
         Retrieve the vector representing the sentence that contains the entity
         mention.
         """
-        sentence_span = OffsetConverter.get_sentence(span[0], doc)
+        sentence_span = get_token_index(doc).get_sentence(span[0])
         sentence_span = sentence_span.start_char, sentence_span.end_char
         sentence_vector = EmbeddingsExtractor.get_span_embedding(sentence_span, doc)
         return sentence_vector
@@ -0,0 +1,61 @@
+from typing import Dict, Iterable, List
+
+PATTERN_KEY = None  # Key under which a trie node stores the pattern that ends at this node
+
+
+class PatternMatcher:
+    """
+    Finds the occurrences of many patterns in a text in a single pass over the given start positions.
+
+    The patterns are stored in a character trie. From each start position, the trie is walked along the text
+    until no pattern continues with the next character, so every pattern that starts at the position is found,
+    regardless of the number of patterns. Only the given start positions are considered, e.g. the beginnings
+    of words, which makes this cheaper than a full Aho-Corasick automaton that would report occurrences at
+    every position of the text.
+    """
+    def __init__(self, patterns: Iterable[str]):
+        self.root = {}
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str):
+        if not pattern:
+            return
+        node = self.root
+        for char in pattern:
+            if char not in node:
+                node[char] = {}
+            node = node[char]
+        node[PATTERN_KEY] = pattern
+
+    def find_all(self, text: str, start_positions: Iterable[int]) -> Dict[str, List[int]]:
+        """
+        Return a dictionary that maps each pattern that occurs at one of the given start positions
+        to the sorted list of these positions. The start positions must be in ascending order.
+        Occurrences may overlap.
+        """
+        occurrences = {}
+        root = self.root
+        text_length = len(text)
+        for start in start_positions:
+            node = root.get(text[start]) if start < text_length else None
+            i = start + 1
+            while node is not None:
+                pattern = node.get(PATTERN_KEY)
+                if pattern is not None:
+                    if pattern in occurrences:
+                        occurrences[pattern].append(start)
+                    else:
+                        occurrences[pattern] = [start]
+                if i == text_length:
+                    break
+                node = node.get(text[i])
+                i += 1
+        return occurrences
+
+
+def get_word_start_positions(text: str) -> List[int]:
+    """
+    Return the positions in the text that are not preceded by an alphabetic character, in ascending order.
+    """
+    return [0] + [i + 1 for i, char in enumerate(text[:-1]) if not char.isalpha()] if text else []
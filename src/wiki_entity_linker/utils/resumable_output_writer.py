@@ -0,0 +1,171 @@
+import glob
+import json
+import os
+from typing import List, Optional, Any, Dict
+
+import logging
+
+
+logger = logging.getLogger("main." + __name__.split(".")[-1])
+
+PROGRESS_FILE_SUFFIX = ".progress.json"
+DEFAULT_COMMIT_INTERVAL = 1000  # Minimum number of articles written between two commits
+
+
+def get_progress_filename(output_file: str) -> str:
+    return output_file + PROGRESS_FILE_SUFFIX
+
+
+def get_shard_filename(output_file: str, shard_index: int) -> str:
+    """
+    Return the name of the shard with the given index, e.g. "linked.00003.jsonl" for "linked.jsonl".
+    """
+    root, extension = os.path.splitext(output_file)
+    return "%s.%05d%s" % (root, shard_index, extension)
+
+
+class ResumableOutputWriter:
+    """
+    Writes linked articles (one JSON line per article) to a single output file or to a
+    sequence of output shards and keeps a sidecar progress index next to the output file.
+
+    The progress index is updated on every commit and contains the number of committed articles,
+    the ID of the last committed article, the byte offset in the input file up to which input
+    lines were consumed and, for each shard, the number of committed articles and bytes.
+    A job that was interrupted can be resumed by creating the writer with resume=True: all output
+    written after the last commit is truncated and linking continues at self.input_offset.
+    Without resume=True, the progress file and the shards of a previous job are removed.
+
+    The writer expects the articles in input order.
+    """
+    def __init__(self,
+                 output_file: str,
+                 input_file: str,
+                 shard_size: Optional[int] = 0,
+                 resume: Optional[bool] = False,
+                 commit_interval: Optional[int] = DEFAULT_COMMIT_INTERVAL):
+        self.output_file = output_file
+        self.input_file = input_file
+        self.shard_size = shard_size
+        self.commit_interval = commit_interval
+        self.progress_file = get_progress_filename(output_file)
+
+        self.n_articles = 0
+        self.input_offset = 0
+        self.last_article_id = None
+        self.shards = []
+        self.shards: List[Dict[str, Any]]
+        self.n_uncommitted = 0
+        self.file = None
+
+        if resume and os.path.exists(self.progress_file):
+            self._load_progress()
+            self._reopen_last_shard()
+            logger.info("Resuming after %d linked articles (last article ID: %s) at input byte offset %d."
+                        % (self.n_articles, self.last_article_id, self.input_offset))
+        else:
+            if resume:
+                logger.warning("No progress file found at %s. Starting from the beginning." % self.progress_file)
+            self._remove_previous_output()
+            self._open_new_shard()
+            # Record the empty state right away, so that resuming never continues a previous job
+            self.commit()
+
+    def _load_progress(self):
+        with open(self.progress_file, "r", encoding="utf8") as file:
+            progress = json.load(file)
+        if progress["input_file"] != self.input_file:
+            raise ValueError("Progress file %s belongs to input file %s, not to %s."
+                             % (self.progress_file, progress["input_file"], self.input_file))
+        if progress["shard_size"] != self.shard_size:
+            logger.warning("Using shard size %d of the interrupted job instead of %d."
+                           % (progress["shard_size"], self.shard_size))
+            self.shard_size = progress["shard_size"]
+        self.n_articles = progress["n_articles"]
+        self.input_offset = progress["input_offset"]
+        self.last_article_id = progress["last_article_id"]
+        self.shards = progress["shards"]
+
+    def _remove_previous_output(self):
+        """
+        Remove the progress file and the output shards of a previous job with the same output file.
+        """
+        root, extension = os.path.splitext(self.output_file)
+        shard_pattern = "%s.%s%s" % (glob.escape(root), "[0-9]" * 5, glob.escape(extension))
+        for filename in [self.progress_file] + sorted(glob.glob(shard_pattern)):
+            if os.path.exists(filename):
+                logger.info("Removing %s of a previous job." % filename)
+                os.remove(filename)
+
+    def _reopen_last_shard(self):
+        """
+        Open the last shard for appending after discarding everything that was written after the last commit.
+        """
+        shard = self.shards[-1]
+        if not os.path.exists(shard["file"]):
+            raise FileNotFoundError("Output shard %s listed in %s does not exist." % (shard["file"], self.progress_file))
+        self.file = open(shard["file"], "r+b")
+        self.file.truncate(shard["n_bytes"])
+        self.file.seek(shard["n_bytes"])
+
+    def _open_new_shard(self):
+        if self.file:
+            # The finished shard is only recorded as complete in the progress file with the next commit
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+        if self.shard_size:
+            filename = get_shard_filename(self.output_file, len(self.shards))
+        else:
+            filename = self.output_file
+        self.shards.append({"file": filename, "n_articles": 0, "n_bytes": 0})
+        self.file = open(filename, "wb")
+
+    def write_batch(self, lines: List[bytes], last_article_id: Any, input_offset: int):
+        """
+        Write the given UTF-8 encoded JSON lines (each terminated by a newline). input_offset is the byte offset in the
+        input file directly after the input line of the last article in the batch.
+        A commit is performed if at least self.commit_interval articles were written since the last commit.
+        """
+        for line in lines:
+            shard = self.shards[-1]
+            if self.shard_size and shard["n_articles"] == self.shard_size:
+                self._open_new_shard()
+                shard = self.shards[-1]
+            self.file.write(line)
+            shard["n_articles"] += 1
+            shard["n_bytes"] += len(line)
+        self.n_articles += len(lines)
+        self.n_uncommitted += len(lines)
+        self.input_offset = input_offset
+        self.last_article_id = last_article_id
+        if self.n_uncommitted >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        """
+        Make sure everything written so far is on disk and record the progress in the progress file.
+        The progress file is replaced atomically, so it always describes a consistent state.
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        progress = {"input_file": self.input_file,
+                    "input_offset": self.input_offset,
+                    "n_articles": self.n_articles,
+                    "last_article_id": self.last_article_id,
+                    "shard_size": self.shard_size,
+                    "shards": self.shards}
+        tmp_progress_file = self.progress_file + ".tmp"
+        with open(tmp_progress_file, "w", encoding="utf8") as file:
+            json.dump(progress, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_progress_file, self.progress_file)
+        self.n_uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.file.close()
+
+    def output_files(self) -> List[str]:
+        return [shard["file"] for shard in self.shards]
@@ -0,0 +1,126 @@
+import gc
+import importlib.metadata
+import json
+import mmap
+import os
+import pickle
+import platform
+import shutil
+import time
+from typing import Any, Dict, List
+
+import logging
+
+
+logger = logging.getLogger("main." + __name__.split(".")[-1])
+
+SNAPSHOT_FORMAT_VERSION = 1
+META_FILE = "meta.json"
+OBJECT_FILE = "object.pkl"
+BUFFERS_FILE = "buffers.bin"
+BUFFER_ALIGNMENT = 64  # Buffers start at multiples of this many bytes, so arrays mapped onto them are aligned
+
+
+def get_environment() -> Dict[str, str]:
+    """
+    Versions that must match between saving and loading a snapshot, since pickled objects of
+    different library versions are not guaranteed to be compatible.
+    """
+    environment = {"python": platform.python_version()}
+    try:
+        import spacy
+        environment["spacy"] = spacy.__version__
+    except ImportError:
+        pass
+    try:
+        environment["elevant"] = importlib.metadata.version("elevant")
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    return environment
+
+
+def save_snapshot(obj: Any, directory: str, description: Dict[str, Any]):
+    """
+    Write the given object to a snapshot directory.
+
+    The object is pickled with protocol 5. Large contiguous buffers that support out-of-band pickling
+    (e.g. numpy arrays and pickle.PickleBuffer objects) are not copied into the pickle stream but written
+    to a separate buffers file, which is memory-mapped when the snapshot is loaded. The snapshot is first
+    written to a temporary directory that replaces the target directory at the end, so an interrupted
+    run never leaves a partial snapshot behind.
+    """
+    start = time.time()
+    tmp_directory = directory.rstrip("/") + ".tmp"
+    if os.path.exists(tmp_directory):
+        shutil.rmtree(tmp_directory)
+    os.makedirs(tmp_directory)
+
+    buffer_ranges = []
+    with open(os.path.join(tmp_directory, BUFFERS_FILE), "wb") as buffers_file:
+        def write_buffer(buffer: pickle.PickleBuffer):
+            raw = buffer.raw()
+            offset = buffers_file.tell()
+            padding = -offset % BUFFER_ALIGNMENT
+            buffers_file.write(b"\0" * padding)
+            buffers_file.write(raw)
+            buffer_ranges.append((offset + padding, raw.nbytes))
+            return False  # Don't serialize the buffer in-band
+
+        with open(os.path.join(tmp_directory, OBJECT_FILE), "wb") as object_file:
+            pickle.dump(obj, object_file, protocol=5, buffer_callback=write_buffer)
+
+    meta = {"format_version": SNAPSHOT_FORMAT_VERSION,
+            "environment": get_environment(),
+            "description": description,
+            "buffers": buffer_ranges}
+    with open(os.path.join(tmp_directory, META_FILE), "w", encoding="utf8") as meta_file:
+        json.dump(meta, meta_file)
+
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    os.replace(tmp_directory, directory)
+    logger.info("Wrote snapshot to %s with %d out-of-band buffers in %.1fs."
+                % (directory, len(buffer_ranges), time.time() - start))
+
+
+def read_snapshot_meta(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, META_FILE), "r", encoding="utf8") as meta_file:
+        return json.load(meta_file)
+
+
+def load_snapshot(directory: str) -> Any:
+    """
+    Load the object of a snapshot written by save_snapshot().
+    The out-of-band buffers are memory-mapped read-only, i.e. their pages are only read from disk when they are
+    accessed and are shared between all processes that load the same snapshot.
+    """
+    start = time.time()
+    meta = read_snapshot_meta(directory)
+    if meta["format_version"] != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError("Snapshot %s has format version %d, but version %d is required. Please recreate it."
+                         % (directory, meta["format_version"], SNAPSHOT_FORMAT_VERSION))
+    environment = get_environment()
+    if meta["environment"] != environment:
+        raise ValueError("Snapshot %s was created with %s, but the current environment is %s. Please recreate it."
+                         % (directory, meta["environment"], environment))
+
+    buffers = []
+    buffers: List[memoryview]
+    buffers_filename = os.path.join(directory, BUFFERS_FILE)
+    if meta["buffers"]:
+        with open(buffers_filename, "rb") as buffers_file:
+            mapped = mmap.mmap(buffers_file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        buffers = [view[offset:offset + size] for offset, size in meta["buffers"]]
+
+    # Unpickling creates millions of objects that all survive. Collecting garbage in between is useless.
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(os.path.join(directory, OBJECT_FILE), "rb") as object_file:
+            obj = pickle.load(object_file, buffers=buffers)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    logger.info("Loaded snapshot from %s in %.1fs." % (directory, time.time() - start))
+    return obj
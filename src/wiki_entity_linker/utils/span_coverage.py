@@ -0,0 +1,50 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Optional, Tuple, List
+
+
+class SpanCoverage:
+    """
+    The set of character positions in a text that are covered by already linked spans.
+
+    Covered positions are stored as a sorted list of disjoint intervals [start, end), in which overlapping and
+    adjacent spans are merged. Thus, checking a span for overlap takes O(log n) for n intervals, independent of
+    the length of the spans.
+    """
+    def __init__(self, spans: Optional[Iterable[Tuple[int, int]]] = None):
+        self.starts = []
+        self.starts: List[int]
+        self.ends = []
+        self.ends: List[int]
+        if spans:
+            for span in spans:
+                self.add(span)
+
+    def add(self, span: Tuple[int, int]):
+        """
+        Mark the positions of the given span (start, end) as covered.
+        """
+        start, end = span
+        if start >= end:
+            return
+        # Intervals i to k - 1 overlap with or are adjacent to the span and are merged with it
+        i = bisect_left(self.ends, start)
+        k = bisect_right(self.starts, end)
+        if i < k:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[k - 1])
+        self.starts[i:k] = [start]
+        self.ends[i:k] = [end]
+
+    def overlaps(self, span: Tuple[int, int]) -> bool:
+        """
+        Check if any position of the given span (start, end) is covered.
+        """
+        start, end = span
+        if start >= end:
+            return False
+        # First interval that ends after the start of the span
+        i = bisect_right(self.ends, start)
+        return i < len(self.starts) and self.starts[i] < end
+
+    def __len__(self) -> int:
+        return len(self.starts)
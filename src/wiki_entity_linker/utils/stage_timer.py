@@ -0,0 +1,157 @@
+import cProfile
+import math
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Iterator
+
+import logging
+
+
+logger = logging.getLogger("main." + __name__.split(".")[-1])
+
+# Durations are counted in logarithmic buckets, such that the timer needs constant memory no matter
+# how many articles are linked. Bucket i covers durations up to MIN_DURATION * BUCKET_FACTOR ** i seconds.
+MIN_DURATION = 1e-6
+BUCKET_FACTOR = 1.1
+N_BUCKETS = 250  # The last bucket covers durations up to ~23000s
+PERCENTILES = (50, 90, 99)
+
+
+class StageStatistics:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = math.inf
+        self.max = 0
+        self.buckets = [0] * N_BUCKETS
+
+    def add(self, duration: float, count: Optional[int] = 1):
+        """
+        Record count samples of the given duration.
+        """
+        self.count += count
+        self.total += duration * count
+        self.min = min(self.min, duration)
+        self.max = max(self.max, duration)
+        self.buckets[StageStatistics.get_bucket(duration)] += count
+
+    def merge(self, other: "StageStatistics"):
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.buckets = [b1 + b2 for b1, b2 in zip(self.buckets, other.buckets)]
+
+    @staticmethod
+    def get_bucket(duration: float) -> int:
+        if duration <= MIN_DURATION:
+            return 0
+        return min(N_BUCKETS - 1, math.ceil(math.log(duration / MIN_DURATION, BUCKET_FACTOR)))
+
+    @staticmethod
+    def get_bucket_upper_bound(bucket: int) -> float:
+        return MIN_DURATION * BUCKET_FACTOR ** bucket
+
+    def percentile(self, percentile: float) -> float:
+        """
+        Return the given percentile of the durations. The result is the upper bound of the
+        bucket that contains the percentile, i.e. it overestimates by at most BUCKET_FACTOR.
+        """
+        rank = math.ceil(self.count * percentile / 100)
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(self.max, StageStatistics.get_bucket_upper_bound(bucket))
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        statistics = {"count": self.count,
+                      "total": self.total,
+                      "mean": self.total / self.count if self.count else 0,
+                      "min": self.min if self.count else 0,
+                      "max": self.max}
+        for percentile in PERCENTILES:
+            statistics["p%d" % percentile] = self.percentile(percentile)
+        statistics["histogram"] = [[StageStatistics.get_bucket_upper_bound(bucket), count]
+                                   for bucket, count in enumerate(self.buckets) if count]
+        return statistics
+
+
+class StageTimer:
+    """
+    Collects the durations of the stages of the linking system, e.g. parse, hyperlink, linker, coref and
+    serialization. For each stage, count, total, mean, min, max, percentiles and a histogram are recorded.
+    Timers of several worker processes can be merged.
+    All samples are durations per article. If a stage processes several articles at once, its duration is
+    recorded as one sample of the mean duration per article for each article.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.stages: Dict[str, StageStatistics]
+
+    @contextmanager
+    def measure(self, stage: str, n_articles: Optional[int] = 1) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, n_articles)
+
+    def add(self, stage: str, duration: float, n_articles: Optional[int] = 1):
+        """
+        Record the duration of the given stage for n_articles articles.
+        """
+        if n_articles < 1:
+            return
+        if stage not in self.stages:
+            self.stages[stage] = StageStatistics()
+        self.stages[stage].add(duration / n_articles, n_articles)
+
+    def merge(self, other: "StageTimer"):
+        for stage, statistics in other.stages.items():
+            if stage not in self.stages:
+                self.stages[stage] = StageStatistics()
+            self.stages[stage].merge(statistics)
+
+    def reset(self):
+        self.stages = {}
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {stage: statistics.to_dict() for stage, statistics in self.stages.items()}
+
+    def log_summary(self):
+        for stage, statistics in self.stages.items():
+            summary = statistics.to_dict()
+            logger.info("%-14s %8d calls, total %9.1fs, mean %.4fs, p50 %.4fs, p90 %.4fs, p99 %.4fs, max %.4fs"
+                        % (stage, summary["count"], summary["total"], summary["mean"], summary["p50"],
+                           summary["p90"], summary["p99"], summary["max"]))
+
+
+class ArticleProfiler:
+    """
+    Profiles the linking of every n-th article with cProfile and writes the profile to
+    <output_dir>/profile.<process_id>.<article_number>.prof, where it can be inspected e.g. with pstats or snakeviz.
+    """
+    def __init__(self, every_n: int, output_dir: str):
+        self.every_n = every_n
+        self.output_dir = output_dir
+        self.n_articles = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    @contextmanager
+    def profile(self) -> Iterator[Optional[cProfile.Profile]]:
+        self.n_articles += 1
+        if self.n_articles % self.every_n != 0:
+            yield None
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            filename = os.path.join(self.output_dir, "profile.%d.%d.prof" % (os.getpid(), self.n_articles))
+            profiler.dump_stats(filename)
+            logger.debug("Wrote profile to %s" % filename)
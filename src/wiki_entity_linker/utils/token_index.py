@@ -0,0 +1,76 @@
+from typing import List, Tuple
+
+import numpy as np
+from spacy.attrs import IDX, LENGTH, SENT_START
+from spacy.tokens import Doc, Span, Token
+
+
+class TokenIndex:
+    """
+    Maps character offsets of a doc to its tokens and sentences.
+
+    The end offsets of all tokens and the index of the first token of each token's sentence are
+    extracted from the doc once. A character offset is then mapped to a token with a binary search instead
+    of iterating over the tokens of the doc, and the sentence of a token is found with a single array lookup.
+    A character offset is mapped to the token that contains it or, if it does not belong to any token
+    (e.g. whitespace), to the next token. Offsets after the last token are mapped to the last token.
+    """
+    def __init__(self, doc: Doc):
+        self.doc = doc
+        n_tokens = len(doc)
+        if n_tokens:
+            attributes = doc.to_array([IDX, LENGTH, SENT_START]).astype(np.int64)
+            self.token_ends = attributes[:, 0] + attributes[:, 1]
+            is_sent_start = attributes[:, 2] == 1
+            is_sent_start[0] = True
+        else:
+            self.token_ends = np.zeros(0, dtype=np.int64)
+            is_sent_start = np.zeros(0, dtype=bool)
+        token_indices = np.arange(n_tokens)
+        # Index of the first token of the sentence of each token
+        self.sent_starts = np.maximum.accumulate(np.where(is_sent_start, token_indices, 0)) if n_tokens \
+            else token_indices
+        # Index after the last token of the sentence of each token
+        next_sent_starts = np.append(token_indices[is_sent_start][1:], n_tokens)
+        self.sent_ends = next_sent_starts[np.cumsum(is_sent_start) - 1] if n_tokens else token_indices
+
+    def get_token_idx(self, char_idx: int) -> int:
+        token_idx = int(np.searchsorted(self.token_ends, char_idx, side="right"))
+        return min(token_idx, len(self.token_ends) - 1)
+
+    def get_token(self, char_idx: int) -> Token:
+        return self.doc[self.get_token_idx(char_idx)]
+
+    def get_token_idx_in_sent(self, char_idx: int) -> int:
+        """
+        Return the index of the token at the given character offset within its sentence.
+        """
+        token_idx = self.get_token_idx(char_idx)
+        return token_idx - int(self.sent_starts[token_idx])
+
+    def get_sentence(self, char_idx: int) -> Span:
+        token_idx = self.get_token_idx(char_idx)
+        return self.doc[int(self.sent_starts[token_idx]):int(self.sent_ends[token_idx])]
+
+    def get_tokens_in_span(self, span: Tuple[int, int]) -> List[Token]:
+        """
+        Return the tokens that overlap with the given character span (start, end).
+        """
+        first_token_idx = self.get_token_idx(span[0])
+        last_token_idx = self.get_token_idx(max(span[0], span[1] - 1))
+        return [token for token in self.doc[first_token_idx:last_token_idx + 1]]
+
+
+# The index of the most recently used doc. Articles are processed one after the other, so the components of the
+# linking system that process the same doc share its index without keeping the indices of old docs alive.
+_last_token_index = None
+
+
+def get_token_index(doc: Doc) -> TokenIndex:
+    """
+    Return the token index of the given doc, which is only built once if several components ask for it.
+    """
+    global _last_token_index
+    if _last_token_index is None or _last_token_index.doc is not doc:
+        _last_token_index = TokenIndex(doc)
+    return _last_token_index
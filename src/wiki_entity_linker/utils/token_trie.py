@@ -0,0 +1,174 @@
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from spacy.strings import hash_string
+
+from wiki_entity_linker.models.qid_mappings import MappedArrays
+
+
+NO_VALUE = -1
+ROOT = 0
+
+
+def get_token_id(token_text: str) -> int:
+    """
+    Return the ID of a token, which is the spaCy hash of its text (as in token.orth), so that tokens of a
+    spaCy doc can be looked up without their strings.
+    """
+    return hash_string(token_text)
+
+
+class TokenTrie(MappedArrays):
+    """
+    Trie over sequences of token IDs with an integer value at each node that ends a key.
+
+    The trie is stored in four flat arrays: the outgoing edges of node n are located between child_offsets[n] and
+    child_offsets[n + 1] in edge_labels (sorted) and edge_children, and values[n] is the value of node n or -1.
+    """
+    ARRAY_NAMES = ("child_offsets", "edge_labels", "edge_children", "values")
+    # Version 2: names are keyed by the IDs of their spaCy tokens instead of their space-separated words
+    FORMAT_VERSION = 2
+
+    def __init__(self, arrays: Dict[str, np.ndarray], directory: Optional[str] = None):
+        super().__init__(arrays, directory)
+        self.child_offsets = arrays["child_offsets"]
+        self.edge_labels = arrays["edge_labels"]
+        self.edge_children = arrays["edge_children"]
+        self.values = arrays["values"]
+
+    @staticmethod
+    def from_items(items: Iterable[Tuple[Sequence[int], int]]) -> "TokenTrie":
+        """
+        Build the trie from (token IDs, value) pairs. Values must be non-negative. If a key occurs several times,
+        its last value is used.
+        """
+        children = {}
+        node_values = {}
+        n_nodes = 1
+        for token_ids, value in items:
+            node = ROOT
+            for token_id in token_ids:
+                child = children.get((node, token_id))
+                if child is None:
+                    child = n_nodes
+                    children[(node, token_id)] = child
+                    n_nodes += 1
+                node = child
+            node_values[node] = value
+
+        parents = np.fromiter((parent for parent, _ in children), dtype=np.int64, count=len(children))
+        labels = np.fromiter((label for _, label in children), dtype=np.uint64, count=len(children))
+        edge_children = np.fromiter(children.values(), dtype=np.int64, count=len(children))
+        del children
+        order = np.lexsort((labels, parents))
+        parents = parents[order]
+        child_offsets = np.searchsorted(parents, np.arange(n_nodes + 1)).astype(np.int64)
+        values = np.full(n_nodes, NO_VALUE, dtype=np.int64)
+        if node_values:
+            values[np.fromiter(node_values.keys(), dtype=np.int64)] = np.fromiter(node_values.values(), dtype=np.int64)
+        return TokenTrie({"child_offsets": child_offsets,
+                          "edge_labels": labels[order],
+                          "edge_children": edge_children[order],
+                          "values": values})
+
+    def describe(self) -> str:
+        return "Token trie with %d keys" % len(self)
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.values != NO_VALUE))
+
+    def get_child(self, node: int, token_id: int) -> int:
+        """
+        Return the child of the given node along the edge with the given token ID or -1 if there is none.
+        """
+        start = self.child_offsets[node]
+        end = self.child_offsets[node + 1]
+        if start == end:
+            return -1
+        i = start + int(np.searchsorted(self.edge_labels[start:end], np.uint64(token_id)))
+        if i < end and self.edge_labels[i] == token_id:
+            return int(self.edge_children[i])
+        return -1
+
+    def get_node(self, token_ids: Sequence[int]) -> int:
+        """
+        Return the node that is reached with the given token IDs from the root or -1 if there is none.
+        """
+        node = ROOT
+        for token_id in token_ids:
+            node = self.get_child(node, token_id)
+            if node < 0:
+                break
+        return node
+
+    def has_children(self, node: int) -> bool:
+        return self.child_offsets[node + 1] > self.child_offsets[node]
+
+    def get_value(self, node: int) -> int:
+        """
+        Return the value of the given node or -1 if no key ends at the node.
+        """
+        return int(self.values[node])
+
+    def get_children(self, nodes: np.ndarray, token_ids: np.ndarray) -> np.ndarray:
+        """
+        Vectorized get_child(): return the child of each of the given nodes along the edge with the respective
+        token ID or -1 if there is none. The edges of all nodes are binary searched at once, so the number of
+        numpy operations only depends on the largest number of children of a node, not on the number of nodes.
+        """
+        lo = self.child_offsets[nodes]
+        end = self.child_offsets[nodes + 1]
+        hi = end.copy()
+        last_edge = max(len(self.edge_labels) - 1, 0)
+        active = lo < hi
+        while active.any():
+            mid = (lo + hi) // 2
+            go_right = active & (self.edge_labels[np.minimum(mid, last_edge)] < token_ids)
+            lo = np.where(go_right, mid + 1, lo)
+            hi = np.where(active & ~go_right, mid, hi)
+            active = lo < hi
+        found = lo < end
+        found[found] = self.edge_labels[lo[found]] == token_ids[found]
+        children = np.full(len(nodes), -1, dtype=np.int64)
+        children[found] = self.edge_children[lo[found]]
+        return children
+
+    def find_longest_matches(self, token_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the longest key in the trie that starts at each position of the given token IDs.
+        Returns an array with the value of the key at each start position and an array with the index after the
+        last token of the key, or -1 and the start position if no key starts there.
+
+        The trie is walked from all start positions at once, one level per step, so a text is scanned with
+        a number of numpy operations that only depends on the length of the longest match.
+        The children of the root, which are looked up for every token, are found with a single searchsorted().
+        """
+        token_ids = np.asarray(token_ids, dtype=np.uint64)
+        n_tokens = len(token_ids)
+        values = np.full(n_tokens, NO_VALUE, dtype=np.int64)
+        ends = np.arange(n_tokens)
+        if n_tokens == 0 or len(self.edge_labels) == 0:
+            return values, ends
+
+        root_labels = self.edge_labels[self.child_offsets[ROOT]:self.child_offsets[ROOT + 1]]
+        i = np.minimum(np.searchsorted(root_labels, token_ids), max(len(root_labels) - 1, 0))
+        found = root_labels[i] == token_ids if len(root_labels) else np.zeros(n_tokens, dtype=bool)
+        starts = np.flatnonzero(found)
+        nodes = self.edge_children[self.child_offsets[ROOT] + i[found]].astype(np.int64)
+        length = 1
+        while len(starts):
+            node_values = self.values[nodes]
+            has_value = node_values != NO_VALUE
+            values[starts[has_value]] = node_values[has_value]
+            ends[starts[has_value]] = starts[has_value] + length
+            # Continue from the nodes with children that are not at the end of the text
+            next_positions = starts + length
+            can_continue = (next_positions < n_tokens) & \
+                (self.child_offsets[nodes + 1] > self.child_offsets[nodes])
+            starts = starts[can_continue]
+            nodes = self.get_children(nodes[can_continue], token_ids[next_positions[can_continue]])
+            found = nodes >= 0
+            starts = starts[found]
+            nodes = nodes[found]
+            length += 1
+        return values, ends
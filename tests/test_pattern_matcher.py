@@ -0,0 +1,64 @@
+import random
+
+from wiki_entity_linker.utils.pattern_matcher import PatternMatcher, get_word_start_positions
+
+
+def find_all_reference(text, patterns):
+    """
+    The previous implementation: search each pattern with str.find and keep the occurrences
+    that are not preceded by an alphabetic character.
+    """
+    occurrences = {}
+    for pattern in patterns:
+        if not pattern:
+            continue
+        start_idx = text.find(pattern)
+        while start_idx != -1:
+            if start_idx == 0 or not text[start_idx - 1].isalpha():
+                occurrences.setdefault(pattern, []).append(start_idx)
+            start_idx = text.find(pattern, start_idx + 1)
+    return occurrences
+
+
+def find_all(text, patterns):
+    return PatternMatcher(patterns).find_all(text, get_word_start_positions(text))
+
+
+def test_examples():
+    text = "New York, New York City and Newark. York"
+    patterns = ["New York", "New York City", "York", "ew", "Newark", "City and", ""]
+    assert find_all(text, patterns) == {
+        "New York": [0, 10],
+        "New York City": [10],
+        "York": [4, 14, 36],
+        "Newark": [28],
+        "City and": [19],
+    }
+    assert find_all(text, patterns) == find_all_reference(text, patterns)
+
+
+def test_empty():
+    assert find_all("", ["a"]) == {}
+    assert find_all("abc", []) == {}
+    assert get_word_start_positions("") == []
+
+
+def test_overlapping_occurrences():
+    text = "aa aa-aa"
+    patterns = ["aa", "aa aa", "a aa", "aa-aa"]
+    assert find_all(text, patterns) == find_all_reference(text, patterns)
+
+
+def test_random_texts():
+    rng = random.Random(42)
+    alphabet = "ab -.1ä"
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        patterns = set()
+        for _ in range(rng.randint(0, 10)):
+            if text and rng.random() < 0.7:
+                start = rng.randrange(len(text))
+                patterns.add(text[start:start + rng.randint(1, 6)])
+            else:
+                patterns.add("".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))))
+        assert find_all(text, patterns) == find_all_reference(text, patterns), (text, patterns)
@@ -0,0 +1,112 @@
+import os
+import pickle
+import random
+
+import pytest
+
+from wiki_entity_linker.models.qid_mappings import FORMAT_FILE, QidMapping, QidToStringMapping, \
+    QidToStringSetMapping, StringToQidMapping, StringToQidSetMapping, get_qid_number
+
+STRINGS = ["Angela", "Barack", "", "Åsa", "李", "Angela Merkel"]
+
+
+def random_pairs(rng, n):
+    entity_ids = ["Q%d" % rng.randint(0, 50) for _ in range(20)] + ["P31", "", "Q", "Qx"]
+    return [(rng.choice(entity_ids), rng.choice(STRINGS)) for _ in range(n)]
+
+
+def assert_same_mapping(mapping, reference):
+    assert len(mapping) == len(reference)
+    assert sorted(mapping.items(), key=lambda item: int(item[0][1:])) == \
+        sorted(reference.items(), key=lambda item: int(item[0][1:]))
+    for entity_id in list(reference) + ["Q1000", "P31", "", "Q", "Qx"]:
+        assert (entity_id in mapping) == (entity_id in reference)
+        assert mapping.get(entity_id) == reference.get(entity_id)
+        if entity_id in reference:
+            assert mapping[entity_id] == reference[entity_id]
+        else:
+            with pytest.raises(KeyError):
+                _ = mapping[entity_id]
+
+
+def test_qid_to_string_mapping():
+    rng = random.Random(42)
+    for n in (0, 1, 10, 100):
+        pairs = random_pairs(rng, n)
+        reference = {entity_id: string for entity_id, string in pairs if get_qid_number(entity_id) >= 0}
+        assert_same_mapping(QidToStringMapping.from_pairs(pairs), reference)
+        assert_same_mapping(QidToStringMapping.from_dict(reference), reference)
+
+
+def test_qid_to_string_set_mapping():
+    rng = random.Random(42)
+    for n in (0, 1, 10, 100):
+        pairs = random_pairs(rng, n)
+        reference = {}
+        for entity_id, string in pairs:
+            if get_qid_number(entity_id) >= 0:
+                reference.setdefault(entity_id, set()).add(string)
+        assert_same_mapping(QidToStringSetMapping.from_pairs(pairs), reference)
+        assert_same_mapping(QidToStringSetMapping.from_dict(reference), reference)
+
+
+def test_save_and_load(tmp_path):
+    reference = {"Q1": {"a", "b"}, "Q42": {"c"}, "Q7": {"a"}}
+    directory = str(tmp_path / "mapping")
+    assert not QidToStringSetMapping.exists(directory)
+    QidToStringSetMapping.from_dict(reference).save(directory)
+    assert QidToStringSetMapping.exists(directory)
+    assert not QidToStringMapping.exists(directory)
+    mapping = QidToStringSetMapping.load(directory)
+    assert_same_mapping(mapping, reference)
+    # A memory-mapped mapping is pickled as its directory
+    assert_same_mapping(pickle.loads(pickle.dumps(mapping)), reference)
+    assert_same_mapping(pickle.loads(pickle.dumps(QidToStringSetMapping.from_dict(reference))), reference)
+
+
+def test_outdated_format(tmp_path):
+    directory = str(tmp_path / "mapping")
+    QidToStringMapping.from_dict({"Q1": "a"}).save(directory)
+    os.remove(os.path.join(directory, FORMAT_FILE))
+    assert not QidToStringMapping.exists(directory)
+
+
+def test_abstract():
+    with pytest.raises(TypeError):
+        QidMapping({"qids": [], "pool_data": [], "pool_offsets": [0]})
+
+
+def test_string_to_qid_mapping(tmp_path):
+    rng = random.Random(42)
+    for n in (0, 1, 10, 100):
+        pairs = [(string, entity_id) for entity_id, string in random_pairs(rng, n)]
+        reference = {string: entity_id for string, entity_id in pairs if get_qid_number(entity_id) >= 0}
+        directory = str(tmp_path / ("mapping%d" % n))
+        StringToQidMapping.from_pairs(pairs).save(directory)
+        assert StringToQidMapping.exists(directory)
+        for mapping in (StringToQidMapping.from_pairs(pairs), StringToQidMapping.load(directory)):
+            assert len(mapping) == len(reference)
+            for string in STRINGS + ["unknown", "angela"]:
+                assert mapping.get(string) == reference.get(string)
+                assert (string in mapping) == (string in reference)
+            assert mapping.get("unknown", "Q0") == "Q0"
+
+
+def test_string_to_qid_set_mapping(tmp_path):
+    rng = random.Random(42)
+    for n in (0, 1, 10, 100):
+        pairs = [(string, entity_id) for entity_id, string in random_pairs(rng, n)]
+        reference = {}
+        for string, entity_id in pairs:
+            if get_qid_number(entity_id) >= 0:
+                reference.setdefault(string, set()).add(entity_id)
+        directory = str(tmp_path / ("mapping%d" % n))
+        StringToQidSetMapping.from_pairs(pairs).save(directory)
+        assert StringToQidSetMapping.exists(directory)
+        for mapping in (StringToQidSetMapping.from_pairs(pairs), StringToQidSetMapping.from_dict(reference),
+                        StringToQidSetMapping.load(directory)):
+            assert len(mapping) == len(reference)
+            for string in STRINGS + ["unknown", "angela"]:
+                assert mapping.get(string) == reference.get(string)
+                assert (string in mapping) == (string in reference)
+            assert mapping.get("unknown", set()) == set()
@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from wiki_entity_linker.utils.resumable_output_writer import ResumableOutputWriter, get_progress_filename, \
+    get_shard_filename
+
+
+def get_lines(start, end):
+    return [("{\"id\": %d}\n" % i).encode("utf8") for i in range(start, end)]
+
+
+def read_output(writer):
+    output = b""
+    for filename in writer.output_files():
+        with open(filename, "rb") as file:
+            output += file.read()
+    return output
+
+
+@pytest.fixture
+def output_file(tmp_path):
+    return str(tmp_path / "linked.jsonl")
+
+
+def test_fresh_start(output_file):
+    writer = ResumableOutputWriter(output_file, "input.jsonl", commit_interval=3)
+    writer.write_batch(get_lines(0, 2), 1, 20)
+    writer.write_batch(get_lines(2, 5), 4, 50)
+    writer.close()
+    assert writer.output_files() == [output_file]
+    assert read_output(writer) == b"".join(get_lines(0, 5))
+    with open(get_progress_filename(output_file), "r", encoding="utf8") as file:
+        progress = json.load(file)
+    assert (progress["n_articles"], progress["last_article_id"], progress["input_offset"]) == (5, 4, 50)
+
+
+@pytest.mark.parametrize("shard_size", [0, 2])
+def test_resume(output_file, shard_size):
+    writer = ResumableOutputWriter(output_file, "input.jsonl", shard_size=shard_size, commit_interval=3)
+    writer.write_batch(get_lines(0, 3), 2, 30)
+    # Not committed, so discarded on resume
+    writer.write_batch(get_lines(3, 5), 4, 50)
+    writer.file.flush()
+
+    writer = ResumableOutputWriter(output_file, "input.jsonl", shard_size=shard_size, resume=True,
+                                   commit_interval=3)
+    assert (writer.n_articles, writer.last_article_id, writer.input_offset) == (3, 2, 30)
+    writer.write_batch(get_lines(3, 7), 6, 70)
+    writer.close()
+    assert read_output(writer) == b"".join(get_lines(0, 7))
+
+
+def test_resume_other_input(output_file):
+    ResumableOutputWriter(output_file, "input.jsonl").close()
+    with pytest.raises(ValueError):
+        ResumableOutputWriter(output_file, "other_input.jsonl", resume=True)
+
+
+def test_shard_rollover(output_file):
+    writer = ResumableOutputWriter(output_file, "input.jsonl", shard_size=2, commit_interval=1)
+    writer.write_batch(get_lines(0, 5), 4, 50)
+    writer.close()
+    assert writer.output_files() == [get_shard_filename(output_file, i) for i in range(3)]
+    assert [shard["n_articles"] for shard in writer.shards] == [2, 2, 1]
+    for i, filename in enumerate(writer.output_files()):
+        with open(filename, "rb") as file:
+            assert file.read() == b"".join(get_lines(2 * i, min(2 * i + 2, 5)))
+
+
+def test_fresh_start_removes_previous_job(output_file):
+    writer = ResumableOutputWriter(output_file, "input.jsonl", shard_size=2, commit_interval=1)
+    writer.write_batch(get_lines(0, 5), 4, 50)
+    writer.close()
+
+    # A fresh job that is interrupted before its first regular commit
+    writer = ResumableOutputWriter(output_file, "input.jsonl", shard_size=2, commit_interval=1000)
+    writer.write_batch(get_lines(0, 1), 0, 10)
+    writer.file.flush()
+    assert not os.path.exists(get_shard_filename(output_file, 1))
+    assert not os.path.exists(get_shard_filename(output_file, 2))
+
+    writer = ResumableOutputWriter(output_file, "input.jsonl", shard_size=2, resume=True)
+    assert (writer.n_articles, writer.last_article_id, writer.input_offset) == (0, None, 0)
+    writer.write_batch(get_lines(0, 3), 2, 30)
+    writer.close()
+    assert read_output(writer) == b"".join(get_lines(0, 3))
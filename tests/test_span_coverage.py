@@ -0,0 +1,41 @@
+import random
+
+from wiki_entity_linker.utils.span_coverage import SpanCoverage
+
+
+def test_examples():
+    coverage = SpanCoverage([(5, 10), (20, 25)])
+    assert len(coverage) == 2
+    assert coverage.overlaps((9, 12))
+    assert coverage.overlaps((0, 30))
+    assert not coverage.overlaps((10, 20))
+    assert not coverage.overlaps((0, 5))
+    assert not coverage.overlaps((7, 7))
+    coverage.add((10, 20))
+    assert len(coverage) == 1
+    assert coverage.overlaps((15, 16))
+    coverage.add((3, 3))
+    assert len(coverage) == 1
+
+
+def test_random_spans():
+    """
+    Compare with the set of covered character positions.
+    """
+    rng = random.Random(42)
+    for _ in range(200):
+        coverage = SpanCoverage()
+        covered = set()
+        for _ in range(30):
+            start = rng.randint(0, 60)
+            span = (start, start + rng.randint(-2, 8))
+            positions = set(range(*span))
+            assert coverage.overlaps(span) == bool(positions & covered), (span, covered)
+            if rng.random() < 0.5:
+                coverage.add(span)
+                covered |= positions
+        # The intervals are disjoint, sorted, not adjacent and cover exactly the added positions
+        intervals = list(zip(coverage.starts, coverage.ends))
+        assert all(start < end for start, end in intervals)
+        assert all(end < next_start for (_, end), (next_start, _) in zip(intervals, intervals[1:]))
+        assert set(p for start, end in intervals for p in range(start, end)) == covered
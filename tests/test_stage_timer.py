@@ -0,0 +1,29 @@
+import pytest
+
+from wiki_entity_linker.utils.stage_timer import StageTimer
+
+
+def test_batch_samples_per_article():
+    timer = StageTimer()
+    timer.add("linker", 0.5)
+    timer.add("linker", 2.0, n_articles=4)
+    timer.add("linker", 1.0, n_articles=0)
+    statistics = timer.to_dict()["linker"]
+    assert statistics["count"] == 5
+    assert statistics["total"] == pytest.approx(2.5)
+    assert statistics["max"] == pytest.approx(0.5)
+    assert statistics["p50"] <= 0.5 * 1.1
+    assert sum(count for _, count in statistics["histogram"]) == 5
+
+
+def test_merge():
+    timer = StageTimer()
+    with timer.measure("parse", n_articles=2):
+        pass
+    other = StageTimer()
+    other.add("parse", 0.1)
+    other.add("coref", 0.2)
+    timer.merge(other)
+    statistics = timer.to_dict()
+    assert statistics["parse"]["count"] == 3
+    assert statistics["coref"]["count"] == 1
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+import spacy
+
+from wiki_entity_linker.utils.token_index import TokenIndex, get_token_index
+
+TEXTS = [
+    "Angela Merkel visited Paris. She met the president.  Then she flew back to Berlin!",
+    "One sentence without end",
+    "  Leading and trailing whitespace.  Two sentences.  ",
+    "A. B. C.",
+]
+
+
+@pytest.fixture(scope="module")
+def nlp():
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    return nlp
+
+
+def get_token_idx_reference(doc, char_idx):
+    """
+    Iterate over the tokens to find the first token that ends after the character offset.
+    """
+    for token in doc:
+        if char_idx < token.idx + len(token):
+            return token.i
+    return len(doc) - 1
+
+
+def test_tokens_and_sentences(nlp):
+    for text in TEXTS:
+        doc = nlp(text)
+        token_index = TokenIndex(doc)
+        for char_idx in range(len(text) + 2):
+            token_idx = get_token_idx_reference(doc, char_idx)
+            token = doc[token_idx]
+            assert token_index.get_token_idx(char_idx) == token_idx
+            assert token_index.get_token(char_idx) == token
+            assert token_index.get_token_idx_in_sent(char_idx) == token_idx - token.sent.start
+            sentence = token_index.get_sentence(char_idx)
+            assert (sentence.start, sentence.end) == (token.sent.start, token.sent.end)
+
+
+def test_tokens_in_span(nlp):
+    rng = random.Random(42)
+    for text in TEXTS:
+        doc = nlp(text)
+        token_index = TokenIndex(doc)
+        # Spans of whole tokens map to exactly these tokens
+        for start_token in doc:
+            for end_token in doc[start_token.i:]:
+                span = (start_token.idx, end_token.idx + len(end_token))
+                assert token_index.get_tokens_in_span(span) == list(doc[start_token.i:end_token.i + 1])
+        for _ in range(100):
+            start = rng.randint(0, len(text))
+            end = rng.randint(start, len(text))
+            first = get_token_idx_reference(doc, start)
+            last = get_token_idx_reference(doc, max(start, end - 1))
+            assert token_index.get_tokens_in_span((start, end)) == list(doc[first:last + 1])
+
+
+def test_shared_index(nlp):
+    doc = nlp(TEXTS[0])
+    other_doc = nlp(TEXTS[1])
+    assert get_token_index(doc) is get_token_index(doc)
+    assert get_token_index(other_doc).doc is other_doc
@@ -0,0 +1,105 @@
+import os
+import pickle
+import random
+
+import numpy as np
+
+from wiki_entity_linker.models.qid_mappings import FORMAT_FILE
+from wiki_entity_linker.utils.token_trie import NO_VALUE, ROOT, TokenTrie, get_token_id
+
+
+def random_items(rng, n):
+    token_ids = [get_token_id(text) for text in ("the", "new", "york", "times", "s", "city")]
+    return [(tuple(rng.choice(token_ids) for _ in range(rng.randint(1, 4))), rng.randint(0, 10 ** 9))
+            for _ in range(n)]
+
+
+def assert_same_trie(trie, items):
+    """
+    Compare the trie with a dict of its keys and a set of the prefixes of its keys.
+    """
+    reference = dict(items)
+    prefixes = {key[:i] for key in reference for i in range(len(key) + 1)}
+    assert len(trie) == len(reference)
+    token_ids = {token_id for key in reference for token_id in key} | {get_token_id("unknown")}
+    candidates = prefixes | {prefix + (token_id,) for prefix in prefixes for token_id in token_ids}
+    for key in candidates:
+        node = trie.get_node(key)
+        assert (node >= 0) == (key in prefixes)
+        if node >= 0:
+            assert trie.get_value(node) == reference.get(key, NO_VALUE)
+            assert trie.has_children(node) == any(len(prefix) > len(key) and prefix[:len(key)] == key
+                                                  for prefix in prefixes)
+
+
+def test_random_tries():
+    rng = random.Random(42)
+    for n in (0, 1, 10, 100):
+        items = random_items(rng, n)
+        assert_same_trie(TokenTrie.from_items(items), items)
+
+
+def test_get_child():
+    new, york = get_token_id("New"), get_token_id("York")
+    trie = TokenTrie.from_items([((new, york), 1), ((new,), 2)])
+    node = trie.get_child(ROOT, new)
+    assert trie.get_value(node) == 2
+    assert trie.get_value(trie.get_child(node, york)) == 1
+    assert trie.get_child(node, new) == -1
+    assert trie.get_child(ROOT, york) == -1
+
+
+def test_save_and_load(tmp_path):
+    items = random_items(random.Random(42), 50)
+    directory = str(tmp_path / "trie")
+    assert not TokenTrie.exists(directory)
+    TokenTrie.from_items(items).save(directory)
+    assert TokenTrie.exists(directory)
+    trie = TokenTrie.load(directory)
+    assert_same_trie(trie, items)
+    # A memory-mapped trie is pickled as its directory
+    assert_same_trie(pickle.loads(pickle.dumps(trie)), items)
+    assert_same_trie(pickle.loads(pickle.dumps(TokenTrie.from_items(items))), items)
+
+
+def test_outdated_format(tmp_path):
+    directory = str(tmp_path / "trie")
+    TokenTrie.from_items(random_items(random.Random(42), 10)).save(directory)
+    with open(os.path.join(directory, FORMAT_FILE), "w", encoding="utf8") as file:
+        file.write("TokenTrie 1\n")
+    assert not TokenTrie.exists(directory)
+
+
+def find_longest_match_reference(reference, token_ids, start):
+    """
+    Probe the dict with all token sequences that start at the given position, from the longest to the shortest.
+    """
+    for end in range(len(token_ids), start, -1):
+        key = tuple(token_ids[start:end])
+        if key in reference:
+            return reference[key], end
+    return NO_VALUE, start
+
+
+def test_find_longest_matches():
+    rng = random.Random(42)
+    for n in (0, 1, 10, 100):
+        items = random_items(rng, n)
+        reference = dict(items)
+        trie = TokenTrie.from_items(items)
+        for n_keys in (0, 1, 20):
+            token_ids = [token_id for key, _ in random_items(rng, n_keys) for token_id in key]
+            values, ends = trie.find_longest_matches(token_ids)
+            assert list(zip(values.tolist(), ends.tolist())) == \
+                [find_longest_match_reference(reference, token_ids, start) for start in range(len(token_ids))]
+
+
+def test_get_children():
+    items = random_items(random.Random(42), 100)
+    trie = TokenTrie.from_items(items)
+    nodes = [trie.get_node(key[:i]) for key, _ in items for i in range(len(key))]
+    token_ids = [get_token_id(text) for text in ("the", "new", "york", "times", "s", "city", "unknown")]
+    pairs = [(node, token_id) for node in nodes for token_id in token_ids]
+    children = trie.get_children(np.array([node for node, _ in pairs], dtype=np.int64),
+                                 np.array([token_id for _, token_id in pairs], dtype=np.uint64))
+    assert children.tolist() == [trie.get_child(node, token_id) for node, token_id in pairs]
@@ -0,0 +1,125 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("gensim")
+pytest.importorskip("elevant")
+
+import spacy  # noqa: E402
+from spacy.tokens import Span  # noqa: E402
+
+from wiki_entity_linker.linkers.trained_entity_linker import TrainedEntityLinker  # noqa: E402
+from wiki_entity_linker.models.neural_net import NeuralNet  # noqa: E402
+from wiki_entity_linker.utils.embeddings_extractor import EmbeddingsExtractor  # noqa: E402
+
+TOKEN_VECTOR_LENGTH = 6
+ENTITY_VECTOR_LENGTH = 4
+TEXTS = ["Paris is in France. Paris Hilton visited Paris.",
+         "Berlin is the capital of Germany.",
+         "Nothing to link here."]
+# Entity mentions as (text index, token start, token end)
+MENTIONS = [(0, 0, 1), (0, 3, 4), (0, 5, 7), (0, 8, 9), (1, 0, 1), (1, 5, 6)]
+ALIASES = {
+    "Paris": ["Q90", "Q663094", "Q47899"],
+    "France": ["Q142"],
+    "Paris Hilton": ["Q47899"],
+    "Berlin": ["Q64", "Q821244"],
+    "Germany": ["Q183", "Q43287"],
+}
+
+
+class StubKnowledgeBase:
+    def __init__(self, rng):
+        entity_ids = sorted({entity_id for entity_ids in ALIASES.values() for entity_id in entity_ids})
+        self.vectors = {entity_id: rng.uniform(-1, 1, ENTITY_VECTOR_LENGTH).astype(np.float32)
+                        for entity_id in entity_ids}
+        self.priors = {(alias, entity_id): float(rng.uniform(0, 1))
+                       for alias, entity_ids in ALIASES.items() for entity_id in entity_ids}
+
+    def get_vector(self, entity_id):
+        return self.vectors[entity_id]
+
+    def get_candidates(self, alias):
+        return [SimpleNamespace(entity_=entity_id, prior_prob=self.priors[alias, entity_id])
+                for entity_id in ALIASES.get(alias, [])]
+
+
+def get_docs(rng):
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+    docs = list(nlp.pipe(TEXTS))
+    for word in {token.text for doc in docs for token in doc}:
+        nlp.vocab.set_vector(word, rng.uniform(-1, 1, TOKEN_VECTOR_LENGTH).astype(np.float32))
+    for text_index, doc in enumerate(docs):
+        doc.ents = [Span(doc, start, end, label="LOC") for i, start, end in MENTIONS if i == text_index]
+    return docs
+
+
+def get_linker(global_model, prior):
+    torch.manual_seed(42)
+    rng = np.random.default_rng(42)
+    linker = object.__new__(TrainedEntityLinker)
+    linker.kb = StubKnowledgeBase(rng)
+    linker.global_model = global_model
+    linker.prior = prior
+    linker.entity_vector_length = ENTITY_VECTOR_LENGTH
+    linker.embedding_extractor = EmbeddingsExtractor(ENTITY_VECTOR_LENGTH, linker.kb)
+    linker.linker_model = NeuralNet(linker.determine_n_features(TOKEN_VECTOR_LENGTH), 8, 1)
+    linker.linker_model.eval()
+    return linker, get_docs(rng)
+
+
+def get_model_input_reference(linker, span, candidates, doc, linked_entities):
+    """
+    The previous implementation: build the input tensor of a single mention by concatenating the
+    feature vectors of each candidate.
+    """
+    sentence_vector = linker.embedding_extractor.get_sentence_vector(span, doc)
+    x = torch.empty(size=(len(candidates), linker.determine_n_features(sentence_vector.shape[1])))
+    if linker.global_model:
+        linked_entity_ids = [em.entity_id for span, em in sorted(linked_entities.items())]
+        global_entity_vector = linker.embedding_extractor.get_global_entity_vector(linked_entity_ids)
+    for i, cand in enumerate(candidates):
+        entity_vector = linker.embedding_extractor.get_entity_vector(cand.entity_)
+        input_vector = torch.cat((sentence_vector, entity_vector), dim=1)
+        if linker.global_model:
+            input_vector = torch.cat((input_vector, global_entity_vector), dim=1)
+        if linker.prior:
+            input_vector = torch.cat((input_vector, torch.Tensor([[cand.prior_prob]])), dim=1)
+        x[i] = input_vector
+    return x
+
+
+@pytest.mark.parametrize("global_model, prior", list(itertools.product([False, True], repeat=2)))
+def test_batched_scores_match_per_mention_scores(global_model, prior):
+    linker, docs = get_linker(global_model, prior)
+    # Non-empty linked entities, since the global entity vector of a text without linked entities is random
+    linked_entities_batch = [{(0, 5): SimpleNamespace(entity_id="Q90"), (20, 32): SimpleNamespace(entity_id="Q47899")},
+                             {(0, 6): SimpleNamespace(entity_id="Q64")},
+                             {(0, 7): SimpleNamespace(entity_id="Q183")}]
+    mentions = []
+    for text_index, doc in enumerate(docs):
+        for ent in doc.ents:
+            mentions.append(((ent.start_char, ent.end_char), linker.kb.get_candidates(ent.text), text_index))
+    assert len(mentions) == len(MENTIONS)
+
+    x, offsets = linker.get_model_input([(text_index, span, candidates) for span, candidates, text_index in mentions],
+                                        docs, linked_entities_batch)
+    assert offsets == list(itertools.accumulate([len(candidates) for _, candidates, _ in mentions], initial=0))
+    predictions_batch = linker.predict_globally_batch(TEXTS, docs, linked_entities_batch=linked_entities_batch)
+    assert predictions_batch[2] == {}
+    with torch.inference_mode():
+        scores = linker.linker_model(x)
+    for i, (span, candidates, text_index) in enumerate(mentions):
+        x_reference = get_model_input_reference(linker, span, candidates, docs[text_index],
+                                                linked_entities_batch[text_index])
+        assert torch.allclose(x[offsets[i]:offsets[i + 1]], x_reference)
+        with torch.inference_mode():
+            scores_reference = linker.linker_model(x_reference)
+        assert torch.allclose(scores[offsets[i]:offsets[i + 1]], scores_reference)
+        prediction = predictions_batch[text_index][span]
+        assert prediction.entity_id == candidates[torch.argmax(scores_reference).item()].entity_
+        assert prediction.candidates == {cand.entity_ for cand in candidates}